@@ -1,32 +1,341 @@
 import json
-from datetime import datetime, timedelta
-from typing import Dict, List, Any
+import hashlib
+import itertools
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Any, Hashable, Optional, Sequence, Tuple
 from statistics import mean, stdev
 
+import numpy as np
+
+from ttl_cache import TTLCache
+
+
+# Weekly averages cover the WINDOW_DAYS calendar days ending at the latest
+# transaction ("calendar"), or the latest WINDOW_TXNS transactions on each
+# side ("rows", the original row-count approximation)
+AGGREGATION_MODES = ("calendar", "rows")
+WINDOW_DAYS = 28
+WINDOW_TXNS = 28
+FORECAST_DAYS = 30
+
+# predict results cached per (user, history, balance, horizon)
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TTL_SECONDS = 300
+
+
+def to_day_index(dates: Sequence[Any]) -> np.ndarray:
+    """
+    Days since 1970-01-01 for ISO date / datetime values. Missing or
+    unparseable dates are placed one day before the earliest valid date,
+    i.e. they sort as the oldest history (as an empty date string did).
+    """
+    heads = [str(d)[:10] if d else '' for d in dates]
+    try:
+        parsed = np.array(heads, dtype='datetime64[D]')
+    except ValueError:
+        parsed = np.array([_parse_day(head) for head in heads], dtype='datetime64[D]')
+
+    missing = np.isnat(parsed)
+    days = parsed.astype(np.int64)
+    if missing.any():
+        days[missing] = days[~missing].min() - 1 if not missing.all() else 0
+    return days
+
+
+def _parse_day(value: str) -> np.datetime64:
+    try:
+        return np.datetime64(value, 'D')
+    except ValueError:
+        return np.datetime64('NaT', 'D')
+
+
+def _latest_sums_by_segment(
+    abs_amounts: np.ndarray,
+    days: np.ndarray,
+    segments: np.ndarray,
+    num_segments: int,
+    limit: int = WINDOW_TXNS
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-segment sum and count of the `limit` most recent transactions.
+    Rows are ordered by (segment, newest day first) with a stable sort, so
+    same-day ties keep input order.
+    """
+    order = np.lexsort((-days, segments))
+    ordered_segments = segments[order]
+    counts = np.bincount(ordered_segments, minlength=num_segments)
+    starts = np.cumsum(counts) - counts
+    keep = np.arange(len(order)) - starts[ordered_segments] < limit
+
+    sums = np.bincount(ordered_segments[keep], weights=abs_amounts[order][keep], minlength=num_segments)
+    return sums, np.minimum(counts, limit)
+
+
+def calendar_window(latest_day: int, first_day: int, window_days: int = WINDOW_DAYS) -> Tuple[int, int]:
+    """
+    (start_day, length) of the averaging window: the window_days days
+    ending at the latest transaction, cut short if history starts later.
+    """
+    start = max(latest_day - window_days + 1, first_day)
+    return start, latest_day - start + 1
+
+
+def fetched_window(
+    dates_desc: Sequence[Any],
+    truncated: bool,
+    window_days: int = WINDOW_DAYS
+) -> Tuple[int, Optional[str]]:
+    """
+    For a user's newest transaction dates (newest first, fetched with a row
+    limit): how many fall inside the averaging window, and the first day
+    that window covers (predict's history_start).
+
+    `truncated` means the limit was hit, so older rows may not have been
+    fetched. If the fetched rows do not reach past the window start, the
+    window is cut back to the last day whose rows were all fetched.
+    """
+    if not dates_desc:
+        return 0, None
+    days = [str(d)[:10] for d in dates_desc]
+    window_start = (date.fromisoformat(days[0]) - timedelta(days=window_days - 1)).isoformat()
+    count = next((i for i, day in enumerate(days) if day < window_start), len(days))
+    if count < len(days):
+        return count, window_start
+    if not truncated:
+        return count, days[-1]
+
+    # The oldest fetched day may be missing rows; drop it unless it is all there is
+    oldest = days[-1]
+    partial_from = next(i for i, day in enumerate(days) if day == oldest)
+    if partial_from == 0:
+        return count, oldest
+    return partial_from, (date.fromisoformat(oldest) + timedelta(days=1)).isoformat()
+
+
+def _history_fingerprint(
+    amounts: np.ndarray,
+    days: np.ndarray,
+    is_credit: np.ndarray,
+    is_debit: np.ndarray,
+    history_start_day: Optional[int]
+) -> bytes:
+    """Content hash of a columnar history (order-sensitive, like predict)"""
+    digest = hashlib.blake2b(digest_size=16)
+    for column in (amounts, days, is_credit, is_debit):
+        digest.update(np.ascontiguousarray(column).tobytes())
+    digest.update(str(history_start_day).encode())
+    return digest.digest()
+
+
+def _rows_fingerprint(rows: Tuple, history_start_day: Optional[int]) -> bytes:
+    """Content hash of predict's (amounts, types, dates) columns, before array conversion"""
+    digest = hashlib.blake2b(digest_size=16)
+    for column in rows:
+        digest.update(repr(column).encode())
+    digest.update(str(history_start_day).encode())
+    return digest.digest()
+
+
+def round_cents(values: np.ndarray) -> np.ndarray:
+    """
+    Elementwise round(v, 2), exactly as `predict` rounds.
+
+    np.round(v, 2) rounds v * 100, whose own rounding error can carry a
+    value sitting just below a half-cent over it (0.01 off round()). Away
+    from a half-cent both agree, so only values within a hair of one are
+    rounded in Python.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scaled = values * 100
+    rounded = np.rint(scaled) / 100
+    # v * 100 is within an ulp of exact; allow a few
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) <= 4 * np.spacing(np.abs(scaled))
+    near_half |= np.abs(scaled) >= 2.0 ** 52
+    if near_half.any():
+        flat = rounded.reshape(-1)
+        for i in np.flatnonzero(near_half.reshape(-1)).tolist():
+            flat[i] = round(float(values.flat[i]), 2)
+    return rounded
+
+
+def forecast_balances(current_balance: float, net_weekly_change: float, days: int) -> np.ndarray:
+    """Predicted balance for days 1..days in one vectorized pass"""
+    daily_change = net_weekly_change / 7
+    steps = np.full(days + 1, daily_change)
+    steps[0] = current_balance
+    balance = np.cumsum(steps)[1:]
+
+    variance = daily_change * 0.05
+    day = np.arange(1, days + 1)
+    return balance + np.where(day % 3 == 0, variance, -variance)
+
+
+def forecast_dates(days: int) -> List[str]:
+    """YYYY-MM-DD for today + 1 .. today + days"""
+    today = np.datetime64(date.today(), 'D')
+    return (today + np.arange(1, days + 1)).astype(str).tolist()
+
 
 class CashflowOracle:
     
     
-    def __init__(self):
-        self.analysis_cache = {}
+    def __init__(
+        self,
+        aggregation: str = "calendar",
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        cache_ttl_seconds: Optional[float] = DEFAULT_CACHE_TTL_SECONDS
+    ):
+        if aggregation not in AGGREGATION_MODES:
+            raise ValueError(f"aggregation must be one of {AGGREGATION_MODES}")
+        self.aggregation = aggregation
+
+        # Results for callers that pass user_id. The key includes a hash of
+        # the history, so a changed history never hits; invalidate() also
+        # retires a user's entries by bumping their generation.
+        self.analysis_cache = TTLCache(maxsize=cache_size, ttl_seconds=cache_ttl_seconds)
+        self._generations: Dict[Hashable, int] = {}
+        self._generation_counter = itertools.count(1)
+
+    def invalidate(self, user_id: Hashable) -> None:
+        """Drop every cached forecast for user_id (e.g. after a new transaction)"""
+        if len(self._generations) >= self.analysis_cache.maxsize:
+            # Forgetting a generation could revive old entries, so start over
+            self.analysis_cache.clear()
+            self._generations.clear()
+        self._generations[user_id] = next(self._generation_counter)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.analysis_cache.stats()
+
+    def _cache_key(self, user_id: Hashable, fingerprint: Hashable, current_balance: float, horizon_days: int) -> Tuple:
+        return (
+            user_id,
+            self._generations.get(user_id, 0),
+            fingerprint,
+            float(current_balance),
+            horizon_days,
+            date.today().toordinal()  # forecast dates move at midnight
+        )
     
     def predict(
         self, 
         transactions: List[Dict[str, Any]], 
-        current_balance: float
+        current_balance: float,
+        horizon_days: int = FORECAST_DAYS,
+        history_start: Optional[str] = None,
+        user_id: Optional[Hashable] = None
+    ) -> Dict[str, Any]:
+        """
+        Forecast from transaction dicts (date, amount, type).
+
+        history_start (ISO date) is the first day the history covers; pass
+        it when `transactions` is a date-range query so a quiet start of the
+        range is not mistaken for a shorter history.
+
+        With user_id the result is cached (see predict_arrays); the rows are
+        fingerprinted before any array conversion, so a hit skips it.
+        """
+        start_day = int(to_day_index([history_start])[0]) if history_start else None
+        if not transactions:
+            return self.predict_arrays([], [], current_balance, horizon_days=horizon_days, user_id=user_id)
+
+        columns = tuple(zip(*[(t.get('amount', 0), t.get('type'), t.get('date')) for t in transactions]))
+        amounts, types, dates = columns
+
+        cache_key = None
+        if user_id is not None:
+            cache_key = self._cache_key(user_id, _rows_fingerprint(columns, start_day), current_balance, horizon_days)
+            cached = self.analysis_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        amounts = np.array(amounts, dtype=np.float64)
+        types = np.array(types, dtype=object)
+        is_credit = (types == 'credit') | (amounts > 0)
+        is_debit = (types == 'debit') | (amounts < 0)
+        day_index = to_day_index(dates)
+
+        result = self.predict_arrays(
+            amounts, day_index, current_balance,
+            is_credit=is_credit, is_debit=is_debit, horizon_days=horizon_days,
+            history_start_day=start_day
+        )
+        if cache_key is not None:
+            self.analysis_cache.set(cache_key, result)
+        return result
+
+    def predict_arrays(
+        self,
+        amounts: Sequence[float],
+        day_index: Sequence[int],
+        current_balance: float,
+        is_credit: Optional[Sequence[bool]] = None,
+        is_debit: Optional[Sequence[bool]] = None,
+        horizon_days: int = FORECAST_DAYS,
+        history_start_day: Optional[int] = None,
+        user_id: Optional[Hashable] = None
+    ) -> Dict[str, Any]:
+        """
+        Columnar forecast: amounts and integer day numbers (e.g. from
+        to_day_index) as parallel arrays. Credit / debit masks default to
+        the sign of the amount; history_start_day is as in `predict`.
+
+        With user_id the result is served from / stored in analysis_cache,
+        keyed by a hash of the history plus balance, horizon and today's
+        date. Cached results are shared: treat them as read-only.
+
+        One forecast of max(horizon_days, 30) days is generated; the 7- and
+        30-day forecasts are prefixes of it, and any other horizon is
+        returned as "<horizon_days>_day_forecast".
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        days = np.asarray(day_index, dtype=np.int64)
+        is_credit = amounts > 0 if is_credit is None else np.asarray(is_credit, dtype=bool)
+        is_debit = amounts < 0 if is_debit is None else np.asarray(is_debit, dtype=bool)
+
+        cache_key = None
+        if user_id is not None:
+            fingerprint = _history_fingerprint(amounts, days, is_credit, is_debit, history_start_day)
+            cache_key = self._cache_key(user_id, fingerprint, current_balance, horizon_days)
+            cached = self.analysis_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        avg_weekly_income, avg_weekly_expense = self._weekly_averages(
+            np.abs(amounts), days, is_credit, is_debit, history_start_day
+        )
+        result = self._forecast_result(current_balance, avg_weekly_income, avg_weekly_expense, horizon_days)
+        if cache_key is not None:
+            self.analysis_cache.set(cache_key, result)
+        return result
+
+    def predict_from_state(
+        self,
+        state: Any,
+        current_balance: Optional[float] = None,
+        horizon_days: int = FORECAST_DAYS
+    ) -> Dict[str, Any]:
+        """
+        Forecast from an incrementally maintained CashflowState (no history
+        scan). current_balance defaults to the state's last-known balance.
+        """
+        if current_balance is None:
+            current_balance = state.balance if state.balance is not None else 0.0
+        avg_weekly_income, avg_weekly_expense = state.weekly_averages()
+        return self._forecast_result(current_balance, avg_weekly_income, avg_weekly_expense, horizon_days)
+
+    def _forecast_result(
+        self,
+        current_balance: float,
+        avg_weekly_income: float,
+        avg_weekly_expense: float,
+        horizon_days: int
     ) -> Dict[str, Any]:
-       
-        credits = [t for t in transactions if t.get('type') == 'credit' or t.get('amount', 0) > 0]
-        debits = [t for t in transactions if t.get('type') == 'debit' or t.get('amount', 0) < 0]
-        
-        avg_weekly_income = self._calculate_weekly_average(credits)
-        avg_weekly_expense = self._calculate_weekly_average(debits)
-        
-        
         net_weekly = avg_weekly_income - abs(avg_weekly_expense)
         
-        forecast_7d = self._generate_forecast(current_balance, net_weekly, days=7)
-        forecast_30d = self._generate_forecast(current_balance, net_weekly, days=30)
+        forecast = self._generate_forecast(current_balance, net_weekly, days=max(horizon_days, FORECAST_DAYS))
+        forecast_7d = forecast[:7]
+        forecast_30d = forecast[:FORECAST_DAYS]
         
         min_balance_7d = min([f['predicted_balance'] for f in forecast_7d])
         min_balance_30d = min([f['predicted_balance'] for f in forecast_30d])
@@ -45,7 +354,7 @@ class CashflowOracle:
         
         risks = self._identify_risks(forecast_30d, avg_weekly_expense)
         
-        return {
+        result = {
             "current_balance": current_balance,
             "7_day_forecast": forecast_7d,
             "30_day_forecast": forecast_30d,
@@ -57,21 +366,157 @@ class CashflowOracle:
             "risks": risks,
             "analysis_timestamp": datetime.now().isoformat()
         }
+        if horizon_days not in (7, FORECAST_DAYS):
+            result[f"{horizon_days}_day_forecast"] = forecast[:horizon_days]
+        return result
     
-    def _calculate_weekly_average(self, transactions: List[Dict]) -> float:
-        """Calculate average weekly transaction amount"""
-        if not transactions:
-            return 0.0
-        
-        recent_txns = sorted(transactions, key=lambda x: x.get('date', ''), reverse=True)[:28]
-        
-        if not recent_txns:
-            return 0.0
-        
-        total = sum(abs(t.get('amount', 0)) for t in recent_txns)
-        weeks = len(recent_txns) / 7 if len(recent_txns) > 0 else 1
-        
-        return total / weeks if weeks > 0 else 0.0
+    def predict_many(
+        self,
+        user_ids: Sequence[Any],
+        offsets: Sequence[int],
+        amounts: Sequence[float],
+        day_index: Sequence[int],
+        current_balances: Sequence[float],
+        is_credit: Optional[Sequence[bool]] = None,
+        is_debit: Optional[Sequence[bool]] = None,
+        horizon_days: int = FORECAST_DAYS,
+        history_start_days: Optional[Sequence[int]] = None
+    ) -> Dict[str, Any]:
+        """
+        Bulk forecast for many users from one grouped, columnar history.
+
+        User i owns rows offsets[i]:offsets[i + 1] of the flat amounts /
+        day_index / mask arrays (len(offsets) == len(user_ids) + 1). Weekly
+        averages are segment reductions over all users at once and the
+        forecasts are one (users x days) matrix, so there is no per-user
+        Python work. Insights and risks are left to `predict`.
+        history_start_days optionally gives each user's history_start_day.
+
+        Returns arrays aligned with user_ids: avg_weekly_income,
+        avg_weekly_expense, net_weekly_change, min_balance_7d,
+        min_balance_30d, cashflow_stress, plus "forecast" (predicted
+        balances, users x horizon_days) and "forecast_dates".
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        num_users = len(user_ids)
+        if len(offsets) != num_users + 1:
+            raise ValueError("offsets must have len(user_ids) + 1 entries")
+
+        amounts = np.asarray(amounts, dtype=np.float64)[offsets[0]:offsets[-1]]
+        days = np.asarray(day_index, dtype=np.int64)[offsets[0]:offsets[-1]]
+        is_credit = amounts > 0 if is_credit is None else np.asarray(is_credit, dtype=bool)[offsets[0]:offsets[-1]]
+        is_debit = amounts < 0 if is_debit is None else np.asarray(is_debit, dtype=bool)[offsets[0]:offsets[-1]]
+        segments = np.repeat(np.arange(num_users), np.diff(offsets))
+        abs_amounts = np.abs(amounts)
+
+        if self.aggregation == "rows":
+            weekly = []
+            for mask in (is_credit, is_debit):
+                sums, counts = _latest_sums_by_segment(abs_amounts[mask], days[mask], segments[mask], num_users)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    weekly.append(np.where(counts > 0, sums / (counts / 7), 0.0))
+        else:
+            weekly = self._calendar_averages_by_segment(
+                abs_amounts, days, is_credit, is_debit, segments, offsets - offsets[0], history_start_days
+            )
+        avg_weekly_income, avg_weekly_expense = weekly
+        net_weekly = avg_weekly_income - avg_weekly_expense
+
+        horizon = max(horizon_days, FORECAST_DAYS)
+        daily_change = net_weekly / 7
+        steps = np.repeat(daily_change[:, None], horizon + 1, axis=1)
+        steps[:, 0] = np.asarray(current_balances, dtype=np.float64)
+        balance = np.cumsum(steps, axis=1)[:, 1:]
+        variance = (daily_change * 0.05)[:, None]
+        every_third = (np.arange(1, horizon + 1) % 3 == 0)[None, :]
+        forecast = round_cents(balance + np.where(every_third, variance, -variance))
+
+        min_balance_7d = forecast[:, :7].min(axis=1)
+        min_balance_30d = forecast[:, :FORECAST_DAYS].min(axis=1)
+        stress = np.select(
+            [min_balance_30d < avg_weekly_expense * 0.5, min_balance_30d < avg_weekly_expense * 2],
+            ["high", "medium"],
+            default="low"
+        )
+
+        return {
+            "user_ids": list(user_ids),
+            "avg_weekly_income": round_cents(avg_weekly_income),
+            "avg_weekly_expense": round_cents(avg_weekly_expense),
+            "net_weekly_change": round_cents(net_weekly),
+            "min_balance_7d": min_balance_7d,
+            "min_balance_30d": min_balance_30d,
+            "cashflow_stress": stress,
+            "forecast": forecast[:, :horizon_days],
+            "forecast_dates": forecast_dates(horizon_days),
+            "analysis_timestamp": datetime.now().isoformat()
+        }
+
+    def _calendar_averages_by_segment(
+        self,
+        abs_amounts: np.ndarray,
+        days: np.ndarray,
+        is_credit: np.ndarray,
+        is_debit: np.ndarray,
+        segments: np.ndarray,
+        offsets: np.ndarray,
+        history_start_days: Optional[Sequence[int]]
+    ) -> List[np.ndarray]:
+        """calendar_window per user via reduceat, then one bincount per side"""
+        num_users = len(offsets) - 1
+        nonempty = np.diff(offsets) > 0
+        latest = np.zeros(num_users, dtype=np.int64)
+        first = np.zeros(num_users, dtype=np.int64)
+        if nonempty.any():
+            starts = offsets[:-1][nonempty]
+            latest[nonempty] = np.maximum.reduceat(days, starts)
+            first[nonempty] = np.minimum.reduceat(days, starts)
+        if history_start_days is not None:
+            first = np.minimum(first, np.asarray(history_start_days, dtype=np.int64))
+
+        window_start = np.maximum(latest - WINDOW_DAYS + 1, first)
+        span = np.where(nonempty, latest - window_start + 1, 0)
+        in_window = days >= window_start[segments]
+
+        weekly = []
+        for mask in (is_credit, is_debit):
+            selected = mask & in_window
+            sums = np.bincount(segments[selected], weights=abs_amounts[selected], minlength=num_users)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                weekly.append(np.where(span > 0, sums / (span / 7), 0.0))
+        return weekly
+
+    def _weekly_averages(
+        self,
+        abs_amounts: np.ndarray,
+        days: np.ndarray,
+        is_credit: np.ndarray,
+        is_debit: np.ndarray,
+        history_start_day: Optional[int] = None
+    ) -> Tuple[float, float]:
+        """
+        Average weekly income and expense in the configured aggregation mode.
+
+        Runs the predict_many kernels on a single segment, so the sums are
+        accumulated in the same order and the two APIs agree to the bit.
+        """
+        if not len(days):
+            return 0.0, 0.0
+        segments = np.zeros(len(days), dtype=np.int64)
+
+        if self.aggregation == "rows":
+            weekly = []
+            for mask in (is_credit, is_debit):
+                sums, counts = _latest_sums_by_segment(abs_amounts[mask], days[mask], segments[mask], 1)
+                weekly.append(float(sums[0]) / (int(counts[0]) / 7) if counts[0] else 0.0)
+            return tuple(weekly)
+
+        income, expense = self._calendar_averages_by_segment(
+            abs_amounts, days, is_credit, is_debit, segments,
+            np.array([0, len(days)], dtype=np.int64),
+            None if history_start_day is None else [history_start_day]
+        )
+        return float(income[0]), float(expense[0])
     
     def _generate_forecast(
         self, 
@@ -80,24 +525,17 @@ class CashflowOracle:
         days: int
     ) -> List[Dict]:
         """Generate day-by-day balance forecast"""
-        forecast = []
-        balance = current_balance
-        daily_change = net_weekly_change / 7
-        
-        for day in range(1, days + 1):
-            balance += daily_change
-            
-            variance = daily_change * 0.05
-            predicted = balance + (variance if day % 3 == 0 else -variance)
-            
-            forecast.append({
+        predicted = forecast_balances(current_balance, net_weekly_change, days).tolist()
+        dates = forecast_dates(days)
+        return [
+            {
                 "day": day,
-                "date": (datetime.now() + timedelta(days=day)).strftime("%Y-%m-%d"),
-                "predicted_balance": round(predicted, 2),
+                "date": dates[day - 1],
+                "predicted_balance": round(predicted[day - 1], 2),
                 "confidence": self._calculate_confidence(day)
-            })
-        
-        return forecast
+            }
+            for day in range(1, days + 1)
+        ]
     
     def _calculate_confidence(self, days_ahead: int) -> str:
         """ forecast confidence depending on how far ahead"""
@@ -0,0 +1,374 @@
+"""
+CashflowState - incrementally maintained per-user cashflow accumulator
+Part of MoneyFyi AI Intelligence Layer
+"""
+
+import bisect
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+from cashflow_oracle import AGGREGATION_MODES, WINDOW_DAYS, WINDOW_TXNS, calendar_window, to_day_index
+
+
+STATE_VERSION = 2
+
+
+class _RollingWindow:
+    """
+    Latest transactions on one side (credits or debits), newest first.
+
+    Entries are (-day, seq, abs_amount, txn_id); seq is insertion order, so
+    same-day ties rank like input order in CashflowOracle.predict. The sum
+    of the first `window` entries is updated by delta on every insert and
+    delete. Up to `capacity` entries are retained so a delete inside the
+    window can pull the next-older entry in.
+    """
+
+    def __init__(self, window: int, capacity: int):
+        self.window = window
+        self.capacity = capacity
+        self.entries: List[Tuple[int, int, float, Any]] = []
+        self.total = 0.0
+        # Newest entry ever evicted past `capacity`: retained entries older
+        # than it may be missing neighbours, so they cannot be ranked
+        self.evicted_from: Optional[Tuple[int, int, float, Any]] = None
+
+    def insert(self, entry: Tuple[int, int, float, Any]) -> None:
+        pos = bisect.bisect_left(self.entries, entry)
+        self.entries.insert(pos, entry)
+        if pos < self.window:
+            self.total += entry[2]
+            if len(self.entries) > self.window:
+                self.total -= self.entries[self.window][2]
+        if len(self.entries) > self.capacity:
+            evicted = self.entries.pop()
+            if self.evicted_from is None or evicted < self.evicted_from:
+                self.evicted_from = evicted
+
+    def remove(self, entry: Tuple[int, int, float, Any]) -> bool:
+        pos = bisect.bisect_left(self.entries, entry)
+        if pos == len(self.entries) or self.entries[pos][:2] != entry[:2]:
+            return False
+        del self.entries[pos]
+        if pos < self.window:
+            self.total -= entry[2]
+            if len(self.entries) >= self.window:
+                self.total += self.entries[self.window - 1][2]
+        return True
+
+    @property
+    def count(self) -> int:
+        return min(len(self.entries), self.window)
+
+    @property
+    def complete(self) -> bool:
+        """True while the window is exactly the latest `window` transactions"""
+        if self.evicted_from is None:
+            return True
+        return len(self.entries) >= self.window and self.entries[self.window - 1] < self.evicted_from
+
+    def weekly_average(self) -> float:
+        if self.count == 0:
+            return 0.0
+        return self.total / (self.count / 7)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "entries": [[-neg_day, seq, amount, txn_id] for neg_day, seq, amount, txn_id in self.entries],
+            "total": self.total,
+            "evicted_from": list(self.evicted_from) if self.evicted_from is not None else None
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], window: int, capacity: int) -> "_RollingWindow":
+        side = cls(window, capacity)
+        side.entries = [(-day, seq, amount, txn_id) for day, seq, amount, txn_id in data["entries"]]
+        side.total = data["total"]
+        side.evicted_from = tuple(data["evicted_from"]) if data["evicted_from"] is not None else None
+        return side
+
+
+class _RowsAccumulator:
+    """"rows" mode: a _RollingWindow each for credits and debits"""
+
+    def __init__(self, window: int, capacity: int):
+        self.credits = _RollingWindow(window, capacity)
+        self.debits = _RollingWindow(window, capacity)
+
+    def _find(self, txn_id: Any) -> Optional[Tuple[int, int, float, Any]]:
+        for side in (self.credits, self.debits):
+            for entry in side.entries:
+                if entry[3] == txn_id:
+                    return entry
+        return None
+
+    def contains(self, txn_id: Any) -> bool:
+        return self._find(txn_id) is not None
+
+    def insert(self, txn_id: Any, day: int, seq: int, size: float, is_credit: bool, is_debit: bool) -> None:
+        if is_credit:
+            self.credits.insert((-day, seq, size, txn_id))
+        if is_debit:
+            self.debits.insert((-day, seq, size, txn_id))
+
+    def delete(self, txn_id: Any) -> bool:
+        entry = self._find(txn_id)
+        if entry is None:
+            return False
+        self.credits.remove(entry)
+        self.debits.remove(entry)
+        return True
+
+    def oldest_day(self) -> Optional[int]:
+        tails = [-side.entries[-1][0] for side in (self.credits, self.debits) if side.entries]
+        return min(tails) if tails else None
+
+    def weekly_averages(self) -> Tuple[float, float]:
+        return self.credits.weekly_average(), self.debits.weekly_average()
+
+    @property
+    def complete(self) -> bool:
+        return self.credits.complete and self.debits.complete
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"credits": self.credits.to_dict(), "debits": self.debits.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], window: int, capacity: int) -> "_RowsAccumulator":
+        acc = cls(window, capacity)
+        acc.credits = _RollingWindow.from_dict(data["credits"], window, capacity)
+        acc.debits = _RollingWindow.from_dict(data["debits"], window, capacity)
+        return acc
+
+
+class _CalendarAccumulator:
+    """
+    "calendar" mode: per-day credit / debit totals. Days more than
+    `capacity` days before the latest transaction are pruned; the rest are
+    kept so deleting the latest transactions can move the window back.
+    """
+
+    def __init__(self, window: int, capacity: int):
+        self.window = window
+        self.capacity = capacity
+        self.days: Dict[int, List[float]] = {}  # day -> [credit_total, debit_total, count]
+        self.txns: Dict[Any, Tuple[int, float, float]] = {}  # txn_id -> (day, credit, debit)
+        self.first_day: Optional[int] = None  # first day the history covers
+        self.pruned_through: Optional[int] = None  # newest day dropped from `days`
+        self.pruned_count = 0  # transactions on dropped days
+
+    def contains(self, txn_id: Any) -> bool:
+        return txn_id in self.txns
+
+    def insert(self, txn_id: Any, day: int, seq: int, size: float, is_credit: bool, is_debit: bool) -> None:
+        credit = size if is_credit else 0.0
+        debit = size if is_debit else 0.0
+        self.first_day = day if self.first_day is None else min(self.first_day, day)
+        if self.pruned_through is not None and day <= self.pruned_through:
+            self.pruned_count += 1  # older than every retained day: only the history start moves
+            return
+        bucket = self.days.setdefault(day, [0.0, 0.0, 0])
+        bucket[0] += credit
+        bucket[1] += debit
+        bucket[2] += 1
+        self.txns[txn_id] = (day, credit, debit)
+        self._prune()
+
+    def _prune(self) -> None:
+        cutoff = max(self.days) - self.capacity
+        if min(self.days) > cutoff:
+            return
+        for day in [day for day in self.days if day <= cutoff]:
+            self.pruned_count += self.days.pop(day)[2]
+        self.txns = {txn_id: entry for txn_id, entry in self.txns.items() if entry[0] > cutoff}
+        self.pruned_through = cutoff if self.pruned_through is None else max(self.pruned_through, cutoff)
+
+    def delete(self, txn_id: Any) -> bool:
+        entry = self.txns.pop(txn_id, None)
+        if entry is None:
+            if self.pruned_count:
+                # Deleting pruned history; once all of it is gone, every
+                # remaining transaction is retained again
+                self.pruned_count -= 1
+                if not self.pruned_count:
+                    self.pruned_through = None
+                    self.first_day = min(self.days) if self.days else None
+            return False
+        day, credit, debit = entry
+        bucket = self.days[day]
+        bucket[0] -= credit
+        bucket[1] -= debit
+        bucket[2] -= 1
+        if bucket[2] == 0:
+            del self.days[day]
+            if self.pruned_through is None:
+                self.first_day = min(self.days) if self.days else None
+        return True
+
+    def oldest_day(self) -> Optional[int]:
+        return self.first_day
+
+    def set_history_start(self, day: int) -> None:
+        self.first_day = day if self.first_day is None else min(self.first_day, day)
+
+    def weekly_averages(self) -> Tuple[float, float]:
+        if not self.days:
+            return 0.0, 0.0
+        start, span = calendar_window(max(self.days), self.first_day, self.window)
+        credit = sum(bucket[0] for day, bucket in self.days.items() if day >= start)
+        debit = sum(bucket[1] for day, bucket in self.days.items() if day >= start)
+        return credit / (span / 7), debit / (span / 7)
+
+    @property
+    def complete(self) -> bool:
+        """True while every day of the window is still retained"""
+        if self.pruned_through is None:
+            return True
+        return bool(self.days) and max(self.days) - self.window + 1 > self.pruned_through
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "days": [[day] + bucket for day, bucket in self.days.items()],
+            "txns": [[txn_id, day, credit, debit] for txn_id, (day, credit, debit) in self.txns.items()],
+            "first_day": self.first_day,
+            "pruned_through": self.pruned_through,
+            "pruned_count": self.pruned_count
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], window: int, capacity: int) -> "_CalendarAccumulator":
+        acc = cls(window, capacity)
+        acc.days = {day: [credit, debit, count] for day, credit, debit, count in data["days"]}
+        acc.txns = {txn_id: (day, credit, debit) for txn_id, day, credit, debit in data["txns"]}
+        acc.first_day = data["first_day"]
+        acc.pruned_through = data["pruned_through"]
+        acc.pruned_count = data["pruned_count"]
+        return acc
+
+
+_ACCUMULATORS = {"rows": _RowsAccumulator, "calendar": _CalendarAccumulator}
+
+
+class CashflowState:
+    """
+    Per-user accumulator behind CashflowOracle.predict_from_state.
+
+    Keeps the weekly-average windows for credits and debits in the same
+    aggregation mode as the oracle (the last 28 days by default, or the
+    latest 28 transactions per side in "rows" mode) and the last-known
+    balance. Each insert or delete is applied as a delta over a bounded
+    buffer, so updating the state and reading the weekly averages cost the
+    same at 10 or 10 million transactions of history. to_dict / from_dict
+    give a JSON-safe form for persisting the state between workers.
+
+    If deletes reach back past what the buffer retained, `stale` becomes
+    True and the state should be rebuilt with from_transactions.
+    """
+
+    def __init__(self, mode: str = "calendar", window: Optional[int] = None, capacity: Optional[int] = None):
+        if mode not in AGGREGATION_MODES:
+            raise ValueError(f"mode must be one of {AGGREGATION_MODES}")
+        self.mode = mode
+        self.window = window or (WINDOW_DAYS if mode == "calendar" else WINDOW_TXNS)
+        self.capacity = max(capacity or self.window * 2, self.window)
+        self.windows = _ACCUMULATORS[mode](self.window, self.capacity)
+        self.balance: Optional[float] = None
+        self.next_seq = 0
+
+    @classmethod
+    def from_transactions(
+        cls,
+        transactions: Iterable[Dict[str, Any]],
+        balance: Optional[float] = None,
+        mode: str = "calendar",
+        history_start: Optional[str] = None
+    ) -> "CashflowState":
+        """
+        Build a state from transaction dicts (id, date, amount, type).
+        history_start is as in CashflowOracle.predict.
+        """
+        state = cls(mode=mode)
+        for txn in transactions:
+            state.insert_transaction(txn)
+        if history_start and mode == "calendar":
+            state.windows.set_history_start(int(to_day_index([history_start])[0]))
+        if balance is not None:
+            state.balance = balance
+        return state
+
+    def insert_transaction(self, txn: Dict[str, Any], balance: Optional[float] = None) -> bool:
+        """insert() for a transaction dict, using the same credit/debit rules as predict"""
+        amount = txn.get('amount', 0)
+        if txn.get('date'):
+            day = int(to_day_index([txn['date']])[0])
+        else:
+            # Undated transactions count as the oldest history, as in predict
+            oldest = self.windows.oldest_day()
+            day = oldest - 1 if oldest is not None else 0
+        return self.insert(
+            txn.get('id', self.next_seq),
+            amount,
+            day,
+            is_credit=txn.get('type') == 'credit' or amount > 0,
+            is_debit=txn.get('type') == 'debit' or amount < 0,
+            balance=balance
+        )
+
+    def insert(
+        self,
+        txn_id: Any,
+        amount: float,
+        day: int,
+        is_credit: Optional[bool] = None,
+        is_debit: Optional[bool] = None,
+        balance: Optional[float] = None
+    ) -> bool:
+        """
+        Add a transaction on integer day `day`. Credit / debit default to the
+        sign of the amount. Returns False if txn_id is already held (so a
+        retried task does not count a transaction twice).
+        """
+        if balance is not None:
+            self.balance = balance
+        if self.windows.contains(txn_id):
+            return False
+
+        is_credit = amount > 0 if is_credit is None else is_credit
+        is_debit = amount < 0 if is_debit is None else is_debit
+        self.windows.insert(txn_id, int(day), self.next_seq, abs(float(amount)), bool(is_credit), bool(is_debit))
+        self.next_seq += 1
+        return True
+
+    def delete(self, txn_id: Any, balance: Optional[float] = None) -> bool:
+        """Remove a transaction; False if it is not (or no longer) retained"""
+        if balance is not None:
+            self.balance = balance
+        return self.windows.delete(txn_id)
+
+    def weekly_averages(self) -> Tuple[float, float]:
+        """(avg_weekly_income, avg_weekly_expense)"""
+        return self.windows.weekly_averages()
+
+    @property
+    def stale(self) -> bool:
+        return not self.windows.complete
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": STATE_VERSION,
+            "mode": self.mode,
+            "window": self.window,
+            "capacity": self.capacity,
+            "balance": self.balance,
+            "next_seq": self.next_seq,
+            "windows": self.windows.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CashflowState":
+        if data.get("version") != STATE_VERSION:
+            raise ValueError(f"Unsupported cashflow state version: {data.get('version')}")
+        state = cls(mode=data["mode"], window=data["window"], capacity=data["capacity"])
+        state.balance = data["balance"]
+        state.next_seq = data["next_seq"]
+        state.windows = _ACCUMULATORS[state.mode].from_dict(data["windows"], state.window, state.capacity)
+        return state
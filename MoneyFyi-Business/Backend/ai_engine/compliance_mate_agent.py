@@ -6,7 +6,46 @@ Part of MoneyFyi AI Intelligence Layer
 import re
 import json
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, NamedTuple, Optional
+
+from ttl_cache import TTLCache
+from purchase_index import PurchaseIndex
+from gstin_validator import GSTINValidator
+
+
+# Category keyword -> TDS section, first match wins. 194Q additionally
+# depends on the vendor's purchase volume.
+TDS_CATEGORY_RULES = (
+    (("contract", "construction"), "194C"),
+    (("professional", "consultant", "service"), "194J"),
+    (("rent", "lease"), "194I"),
+    (("commission", "brokerage"), "194H"),
+    (("goods", "purchase"), "194Q"),
+)
+
+# ITC blocked under Section 17(5)
+ITC_BLOCKED_CATEGORIES = ("food", "entertainment", "personal", "club", "health")
+
+DEFAULT_GST_RATE = 18
+
+CRITICAL_FLAGS = ('FAKE_GSTIN', 'TDS_REQUIRED', 'MSME_45DAY_VIOLATION')
+
+# Dummy / test GSTIN shapes, merged into one alternation
+FAKE_GSTIN = re.compile("|".join((
+    r'00AAAAA0000A',
+    r'99[A-Z]{5}9999',
+    r'(\d)\1{10}',
+    r'12345',
+    r'ABCDE',
+)))
+
+
+class CategoryRule(NamedTuple):
+    """Every category-dependent rule, resolved once per category string"""
+    tds_section: Optional[str]
+    expected_gst_rate: int
+    itc_blocked: bool
+    is_salary: bool
 
 
 class ComplianceMateAgent:
@@ -20,14 +59,18 @@ class ComplianceMateAgent:
     """
     
     def __init__(self):
-        self.gstin_pattern = re.compile(r'\d{2}[A-Z]{5}\d{4}[A-Z]{1}[A-Z\d]{1}[Z]{1}[A-Z\d]{1}')
+        self.gstin_validator = GSTINValidator()
         
+        # annual_threshold: aggregate per vendor per financial year, checked
+        # when the purchase history is known. on_excess: TDS only applies to
+        # the part of the aggregate above the threshold.
         self.tds_thresholds = {
-            "194C": {"threshold": 30000, "rate": 1, "description": "Contractors"},
+            "194C": {"threshold": 30000, "annual_threshold": 100000, "rate": 1, "description": "Contractors"},
             "194J": {"threshold": 30000, "rate": 10, "description": "Professional/Technical Services"},
             "194I": {"threshold": 240000, "rate": 10, "description": "Rent"},
             "194H": {"threshold": 15000, "rate": 5, "description": "Commission"},
-            "194Q": {"threshold": 5000000, "rate": 0.1, "description": "Purchase of Goods"},
+            "194Q": {"threshold": 5000000, "annual_threshold": 5000000, "on_excess": True,
+                     "rate": 0.1, "description": "Purchase of Goods"},
         }
         
         self.gst_rates = {
@@ -38,12 +81,50 @@ class ComplianceMateAgent:
             "food": 5,
             "medicines": 12,
         }
+        
+        # Category string -> CategoryRule; call compile_rules() after
+        # editing gst_rates so memoized rules pick the change up
+        self._category_rules = TTLCache(maxsize=4096)
+    
+    def compile_rules(self) -> None:
+        """Forget memoized per-category rules (after changing the rule tables)"""
+        self._category_rules.clear()
+    
+    def _rule_for(self, category: Optional[str]) -> CategoryRule:
+        """Memoized TDS / GST / ITC / payroll rule for a category"""
+        rule = self._category_rules.get(category)
+        if rule is None:
+            rule = self._compile_rule(category)
+            self._category_rules.set(category, rule)
+        return rule
+    
+    def _compile_rule(self, category: Optional[str]) -> CategoryRule:
+        if not category:
+            return CategoryRule(None, DEFAULT_GST_RATE, False, False)
+        
+        category_lower = category.lower()
+        tds_section = next(
+            (section for keywords, section in TDS_CATEGORY_RULES
+             if any(keyword in category_lower for keyword in keywords)),
+            None
+        )
+        expected_gst_rate = next(
+            (rate for cat, rate in self.gst_rates.items() if cat in category_lower),
+            DEFAULT_GST_RATE
+        )
+        return CategoryRule(
+            tds_section=tds_section,
+            expected_gst_rate=expected_gst_rate,
+            itc_blocked=any(blocked in category_lower for blocked in ITC_BLOCKED_CATEGORIES),
+            is_salary='salary' in category_lower
+        )
     
     def check_compliance(
         self,
         transaction: Dict[str, Any],
         vendor_history: Dict[str, Any],
-        all_transactions: Optional[List[Dict]] = None
+        all_transactions: Optional[List[Dict]] = None,
+        purchase_index: Optional[PurchaseIndex] = None
     ) -> Dict[str, Any]:
         """
         Main compliance check function
@@ -52,10 +133,46 @@ class ComplianceMateAgent:
             transaction: Normalized transaction
             vendor_history: Historical vendor data
             all_transactions: All transactions for aggregate checks
+            purchase_index: Prebuilt per-vendor financial-year totals
+                (built from all_transactions when omitted)
             
         Returns:
             Compliance analysis with flags, warnings, and severity
         """
+        if purchase_index is None and all_transactions:
+            purchase_index = PurchaseIndex.from_transactions(all_transactions)
+        now = datetime.now()
+        return self._check_one(transaction, vendor_history, now, now.isoformat(), purchase_index)
+    
+    def check_compliance_batch(
+        self,
+        transactions: List[Dict[str, Any]],
+        vendor_history: Dict[str, Any],
+        all_transactions: Optional[List[Dict]] = None,
+        purchase_index: Optional[PurchaseIndex] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        check_compliance for many transactions in one call. Rules are looked
+        up per category, the clock is read once and the purchase index is
+        built once for the whole batch.
+        """
+        if purchase_index is None and all_transactions:
+            purchase_index = PurchaseIndex.from_transactions(all_transactions)
+        now = datetime.now()
+        timestamp = now.isoformat()
+        return [
+            self._check_one(transaction, vendor_history, now, timestamp, purchase_index)
+            for transaction in transactions
+        ]
+    
+    def _check_one(
+        self,
+        transaction: Dict[str, Any],
+        vendor_history: Dict[str, Any],
+        now: datetime,
+        timestamp: str,
+        purchase_index: Optional[PurchaseIndex] = None
+    ) -> Dict[str, Any]:
         flags = []
         warnings = []
         details = []
@@ -65,33 +182,35 @@ class ComplianceMateAgent:
         txn_date = transaction.get('date', '')
         gst_info = transaction.get('gst', {})
         category = transaction.get('category', '')
+        rule = self._rule_for(category)
         
         vendor_data = vendor_history.get(vendor, {})
+        fy_purchases = purchase_index.total_with(transaction) if purchase_index is not None else None
         
-        gst_check = self._check_gst_compliance(transaction, gst_info, category)
+        gst_check = self._check_gst_compliance(transaction, gst_info, category, rule)
         if gst_check['flags']:
             flags.extend(gst_check['flags'])
             warnings.extend(gst_check['warnings'])
             details.extend(gst_check['details'])
         
-        tds_check = self._check_tds_compliance(transaction, vendor_data, category)
+        tds_check = self._check_tds_compliance(transaction, vendor_data, category, rule, fy_purchases)
         if tds_check['flags']:
             flags.extend(tds_check['flags'])
             warnings.extend(tds_check['warnings'])
             details.extend(tds_check['details'])
         
-        msme_check = self._check_msme_compliance(transaction, vendor_data, txn_date)
+        msme_check = self._check_msme_compliance(transaction, vendor_data, txn_date, now)
         if msme_check['flags']:
             flags.extend(msme_check['flags'])
             warnings.extend(msme_check['warnings'])
             details.extend(msme_check['details'])
         
-        itc_check = self._check_itc_eligibility(transaction, gst_info)
+        itc_check = self._check_itc_eligibility(transaction, gst_info, rule)
         if itc_check['warnings']:
             warnings.extend(itc_check['warnings'])
             details.extend(itc_check['details'])
         
-        if 'salary' in category.lower() if category else False:
+        if rule.is_salary:
             payroll_check = self._check_payroll_compliance(transaction, amount)
             if payroll_check['flags']:
                 flags.extend(payroll_check['flags'])
@@ -108,14 +227,15 @@ class ComplianceMateAgent:
             "warnings": warnings,
             "details": details,
             "severity": severity,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": timestamp
         }
     
     def _check_gst_compliance(
         self,
         transaction: Dict,
         gst_info: Optional[Dict],
-        category: Optional[str]
+        category: Optional[str],
+        rule: Optional[CategoryRule] = None
     ) -> Dict[str, Any]:
         """Check GST-related compliance"""
         flags = []
@@ -132,19 +252,27 @@ class ComplianceMateAgent:
             else:
                 gstin = gst_info.get('gstin')
                 if gstin:
-                    if not self.gstin_pattern.match(gstin):
+                    verdict = self.gstin_validator.validate(gstin)
+                    if verdict == "INVALID_FORMAT":
                         flags.append("INVALID_GSTIN")
                         warnings.append(f"Invalid GSTIN format: {gstin}")
                         details.append("GSTIN must be in format: 22AAAAA0000A1Z5")
-                    else:
-                        if self._is_fake_gstin(gstin):
-                            flags.append("FAKE_GSTIN")
-                            warnings.append(f" Suspected fake GSTIN: {gstin}")
-                            details.append("GSTIN appears to be dummy/test number")
+                    elif self._is_fake_gstin(gstin):
+                        flags.append("FAKE_GSTIN")
+                        warnings.append(f" Suspected fake GSTIN: {gstin}")
+                        details.append("GSTIN appears to be dummy/test number")
+                    elif verdict == "INVALID_STATE_CODE":
+                        flags.append("INVALID_GSTIN")
+                        warnings.append(f"Invalid GSTIN state code: {gstin}")
+                        details.append(f"State code {gstin[:2]} is not assigned")
+                    elif verdict == "INVALID_CHECKSUM":
+                        flags.append("INVALID_GSTIN")
+                        warnings.append(f"Invalid GSTIN check digit: {gstin}")
+                        details.append("Last character does not match the GSTIN checksum")
                 
                 gst_rate = gst_info.get('rate')
                 if gst_rate:
-                    expected_rate = self._get_expected_gst_rate(category)
+                    expected_rate = rule.expected_gst_rate if rule else self._get_expected_gst_rate(category)
                     if expected_rate and abs(gst_rate - expected_rate) > 0:
                         flags.append("GST_MISMATCH")
                         warnings.append(f" GST rate {gst_rate}% doesn't match expected {expected_rate}% for {category}")
@@ -166,9 +294,11 @@ class ComplianceMateAgent:
         self,
         transaction: Dict,
         vendor_data: Dict,
-        category: Optional[str]
+        category: Optional[str],
+        rule: Optional[CategoryRule] = None,
+        fy_purchases: Optional[float] = None
     ) -> Dict[str, Any]:
-        """Check TDS requirements"""
+        """Check TDS requirements (fy_purchases: vendor's financial-year total incl. this transaction)"""
         flags = []
         warnings = []
         details = []
@@ -179,15 +309,29 @@ class ComplianceMateAgent:
         if txn_type != 'debit':
             return {"flags": flags, "warnings": warnings, "details": details}
         
-        tds_section = self._determine_tds_section(category, vendor_data)
+        tds_section = self._determine_tds_section(category, vendor_data, rule, fy_purchases)
         
         if tds_section and tds_section in self.tds_thresholds:
             threshold_info = self.tds_thresholds[tds_section]
             threshold = threshold_info['threshold']
             rate = threshold_info['rate']
             description = threshold_info['description']
+            annual_threshold = threshold_info.get('annual_threshold')
+            on_excess = threshold_info.get('on_excess', False)
+            aggregate_known = annual_threshold is not None and fy_purchases is not None
             
-            if amount >= threshold:
+            if aggregate_known and fy_purchases > annual_threshold:
+                taxable = min(amount, fy_purchases - annual_threshold) if on_excess else amount
+                expected_tds = taxable * (rate / 100)
+                
+                flags.append(f"TDS_REQUIRED_{tds_section}")
+                warnings.append(f" TDS deduction required under section {tds_section}")
+                details.append(
+                    f"Financial-year total ₹{fy_purchases:,.0f} exceeds aggregate threshold ₹{annual_threshold:,.0f}"
+                )
+                details.append(f"Expected TDS @ {rate}% on ₹{taxable:,.0f}: ₹{expected_tds:,.2f}")
+                details.append(f"Category: {description}")
+            elif amount >= threshold and not (aggregate_known and on_excess):
                 expected_tds = amount * (rate / 100)
                 
                 flags.append(f"TDS_REQUIRED_{tds_section}")
@@ -202,7 +346,8 @@ class ComplianceMateAgent:
         self,
         transaction: Dict,
         vendor_data: Dict,
-        txn_date: str
+        txn_date: str,
+        now: Optional[datetime] = None
     ) -> Dict[str, Any]:
         """Check MSME 45-day payment rule"""
         flags = []
@@ -215,7 +360,7 @@ class ComplianceMateAgent:
         if is_msme or msme_number:
             try:
                 txn_dt = datetime.fromisoformat(txn_date.replace('Z', '+00:00'))
-                days_passed = (datetime.now() - txn_dt).days
+                days_passed = ((now or datetime.now()) - txn_dt).days
                 
                 if days_passed > 45:
                     flags.append("MSME_45DAY_VIOLATION")
@@ -233,7 +378,8 @@ class ComplianceMateAgent:
     def _check_itc_eligibility(
         self,
         transaction: Dict,
-        gst_info: Optional[Dict]
+        gst_info: Optional[Dict],
+        rule: Optional[CategoryRule] = None
     ) -> Dict[str, Any]:
         """Check Input Tax Credit eligibility"""
         warnings = []
@@ -242,11 +388,11 @@ class ComplianceMateAgent:
         if not gst_info:
             return {"warnings": warnings, "details": details}
         
-        category = transaction.get('category', '').lower()
-        
-        blocked_categories = ['food', 'entertainment', 'personal', 'club', 'health']
+        category = (transaction.get('category') or '').lower()
+        if rule is None:
+            rule = self._rule_for(transaction.get('category'))
         
-        if any(blocked in category for blocked in blocked_categories):
+        if rule.itc_blocked:
             warnings.append(f"ITC may not be available for {category}")
             details.append(f"ITC blocked under Section 17(5) for {category}")
         
@@ -280,63 +426,37 @@ class ComplianceMateAgent:
         
         return {"flags": flags, "warnings": warnings, "details": details}
     
-    def _determine_tds_section(self, category: Optional[str], vendor_data: Dict) -> Optional[str]:
+    def _determine_tds_section(
+        self,
+        category: Optional[str],
+        vendor_data: Dict,
+        rule: Optional[CategoryRule] = None,
+        fy_purchases: Optional[float] = None
+    ) -> Optional[str]:
         """Determine applicable TDS section"""
-        if not category:
-            return None
-        
-        category_lower = category.lower()
-        
-        if 'contract' in category_lower or 'construction' in category_lower:
-            return "194C"
-        elif 'professional' in category_lower or 'consultant' in category_lower or 'service' in category_lower:
-            return "194J"
-        elif 'rent' in category_lower or 'lease' in category_lower:
-            return "194I"
-        elif 'commission' in category_lower or 'brokerage' in category_lower:
-            return "194H"
-        elif 'goods' in category_lower or 'purchase' in category_lower:
+        section = (rule or self._rule_for(category)).tds_section
+        if section == "194Q":
             annual_purchases = vendor_data.get('annual_purchase_value', 0)
-            if annual_purchases >= 5000000:
-                return "194Q"
-        
-        return None
+            if fy_purchases is not None:
+                annual_purchases = max(annual_purchases, fy_purchases)
+            if annual_purchases < 5000000:
+                return None
+        return section
     
     def _get_expected_gst_rate(self, category: Optional[str]) -> Optional[int]:
         """Get expected GST rate for category"""
-        if not category:
-            return 18  
-        
-        category_lower = category.lower()
-        
-        for cat, rate in self.gst_rates.items():
-            if cat in category_lower:
-                return rate
-        
-        return 18  
+        return self._rule_for(category).expected_gst_rate
     
     def _is_fake_gstin(self, gstin: str) -> bool:
         """Detect fake/dummy GSTIN patterns"""
-        fake_patterns = [
-            r'00AAAAA0000A',  
-            r'99[A-Z]{5}9999',  
-            r'(\d)\1{10}',  
-            r'12345', 
-            r'ABCDE',  
-        ]
-        
-        for pattern in fake_patterns:
-            if re.search(pattern, gstin):
-                return True
-        
-        return False
+        return FAKE_GSTIN.search(gstin) is not None
     
     def _calculate_severity(self, flags: List[str], warnings: List[str]) -> str:
         """Calculate overall compliance severity"""
-        critical = ['FAKE_GSTIN', 'TDS_REQUIRED', 'MSME_45DAY_VIOLATION']
-        
-        if any(flag in ' '.join(flags) for flag in critical):
-            return "high"
+        if flags:
+            joined = ' '.join(flags)
+            if any(flag in joined for flag in CRITICAL_FLAGS):
+                return "high"
         
         if len(flags) >= 2:
             return "medium"
@@ -360,7 +480,7 @@ if __name__ == "__main__":
         "gst": {
             "rate": 18,
             "amount": 9000,
-            "gstin": "27AABCU9603R1ZM"
+            "gstin": "27AABCU9603R1ZN"
         }
     }
     
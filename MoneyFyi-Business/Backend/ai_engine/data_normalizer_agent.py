@@ -1,11 +1,65 @@
 
 
+import io
 import re
+import csv
 import json
+import logging
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, IO, Iterator, Callable, Tuple, Iterable
 import uuid
 
+try:
+    from .text_scanner import TextScanner, UTR, GSTIN
+    from .date_parser import DateParser
+    from .ttl_cache import TTLCache
+except ImportError:
+    # Run from inside ai_engine (scripts, tests, integration.py)
+    from text_scanner import TextScanner, UTR, GSTIN
+    from date_parser import DateParser
+    from ttl_cache import TTLCache
+
+
+logger = logging.getLogger("moneyfyi.ai_engine.normalizer")
+
+
+# Field aliases for dict input, in priority order
+ID_KEYS = ("id", "transaction_id", "txn_id", "ref_no", "reference")
+VENDOR_KEYS = ("vendor", "party", "supplier", "merchant", "payee", "to", "beneficiary", "name")
+AMOUNT_KEYS = ("amount", "value", "total", "sum", "debit", "credit", "txn_amount")
+UTR_KEYS = ("utr", "ref", "reference", "txn_ref", "transaction_ref", "ref_no")
+DATE_KEYS = ("date", "txn_date", "transaction_date", "timestamp", "datetime")
+MODE_KEYS = ("mode", "payment_mode", "method", "type", "channel")
+TYPE_KEYS = ("type", "txn_type", "transaction_type", "cr_dr")
+TYPE_AMOUNT_KEYS = ("amount", "value")
+GST_RATE_KEYS = ("gst_rate", "gst", "tax_rate", "igst", "cgst", "sgst")
+GST_AMOUNT_KEYS = ("gst_amount", "tax_amount", "gst_value", "tax")
+GSTIN_KEYS = ("gstin", "gst_number", "gst_no")
+CATEGORY_KEYS = ("category", "type", "purpose", "description", "narration")
+
+
+# Bank-statement / export column headers mapped onto the keys _normalize_json
+# understands. Headers are compared lowercased with punctuation collapsed.
+STATEMENT_COLUMNS = {
+    "id": ["id", "transaction id", "txn id", "sr no", "s no"],
+    "date": ["date", "txn date", "transaction date", "value date", "value dt", "posting date", "tran date"],
+    "vendor": ["vendor", "party", "payee", "beneficiary", "merchant", "name", "counterparty"],
+    "description": ["description", "narration", "particulars", "remarks", "details", "transaction details"],
+    "utr": ["utr", "utr no", "ref", "ref no", "reference", "reference no", "chq ref no", "cheque ref no", "chq no"],
+    "amount": ["amount", "txn amount", "transaction amount", "amount inr"],
+    "debit": ["debit", "debit amount", "withdrawal", "withdrawals", "withdrawal amt", "withdrawal amount", "dr amount"],
+    "credit": ["credit", "credit amount", "deposit", "deposits", "deposit amt", "deposit amount", "cr amount"],
+    # "type" would also be read as the category, so direction goes in cr_dr
+    "cr_dr": ["type", "txn type", "transaction type", "cr dr", "dr cr"],
+    "mode": ["mode", "payment mode", "channel"],
+    "category": ["category"],
+    "gstin": ["gstin", "gst no", "gst number"],
+    "gst_rate": ["gst rate", "gst"],
+    "gst_amount": ["gst amount", "tax amount"],
+}
+_HEADER_LOOKUP = {alias: key for key, aliases in STATEMENT_COLUMNS.items() for alias in aliases}
+_HEADER_PUNCTUATION = re.compile(r'[^a-z0-9]+')
+
 
 class DataNormalizerAgent:
     """
@@ -15,9 +69,12 @@ class DataNormalizerAgent:
     
     def __init__(self):
         self.supported_modes = ["UPI", "NEFT", "IMPS", "RTGS", "CASH", "BANK_TRANSFER", "CARD", "CHEQUE"]
-        self.utr_pattern = re.compile(r'UTR[A-Za-z0-9]{6,}|[A-Z0-9]{12,}')
-        self.gstin_pattern = re.compile(r'\d{2}[A-Z]{5}\d{4}[A-Z]{1}[A-Z\d]{1}[Z]{1}[A-Z\d]{1}')
-        self.amount_pattern = re.compile(r'(?:Rs\.?|₹|INR)?\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)')
+        self.utr_pattern = UTR
+        self.gstin_pattern = GSTIN
+        self.text_scanner = TextScanner(self.supported_modes)
+        self.date_parser = DateParser()
+        # Compiled field resolvers keyed by the record's key set
+        self._schema_cache = TTLCache(maxsize=256)
         
     def normalize(self, raw_data: Any, source_type: str = "auto") -> Dict[str, Any]:
         """
@@ -49,22 +106,186 @@ class DataNormalizerAgent:
                 return self._create_safe_default()
                 
         except Exception as e:
-            print(f" Normalization error: {str(e)}, using safe defaults")
+            logger.warning("Normalization error: %s, using safe defaults", e)
             return self._create_safe_default()
     
     def normalize_batch(self, raw_data_list: List[Any], source_type: str = "auto") -> List[Dict[str, Any]]:
-        """Normalize multiple transactions at once"""
+        """
+        Normalize multiple transactions at once.
+
+        Dict records reuse a getter compiled for their key set, so a
+        homogeneous feed resolves its field aliases once, not per record.
+        """
         normalized = []
+        last_keys = None
+        getter = None
         
         for raw in raw_data_list:
             try:
-                normalized.append(self.normalize(raw, source_type))
+                if isinstance(raw, dict) and source_type in ("auto", "json"):
+                    if getter is None or raw.keys() != last_keys:
+                        getter = self.compile_schema(raw.keys())
+                        last_keys = raw.keys()
+                    normalized.append(self._apply_schema(getter, raw))
+                else:
+                    normalized.append(self.normalize(raw, source_type))
             except Exception as e:
-                print(f" Skipping invalid entry: {str(e)}")
+                logger.warning("Skipping invalid entry: %s", e)
                 continue
         
         return normalized
     
+    def compile_schema(self, keys: Iterable[str]) -> Callable[..., Dict[str, Any]]:
+        """
+        Build a normalizer for dicts with exactly these keys.
+
+        Each alias list is narrowed to the keys that exist in the schema, so
+        the getter only looks at fields that can match. Truthiness
+        fall-through between aliases is unchanged, and the result equals
+        _normalize_json for any record with this key set. Getters are cached
+        per key set.
+        """
+        schema = frozenset(keys)
+        getter = self._schema_cache.get(schema)
+        if getter is not None:
+            return getter
+        
+        def narrow(aliases: Tuple[str, ...]) -> Tuple[str, ...]:
+            return tuple(key for key in aliases if key in schema)
+        
+        id_keys, vendor_keys, amount_keys = narrow(ID_KEYS), narrow(VENDOR_KEYS), narrow(AMOUNT_KEYS)
+        utr_keys, date_keys, mode_keys = narrow(UTR_KEYS), narrow(DATE_KEYS), narrow(MODE_KEYS)
+        type_keys, type_amount_keys = narrow(TYPE_KEYS), narrow(TYPE_AMOUNT_KEYS)
+        gst_keys = (narrow(GST_RATE_KEYS), narrow(GST_AMOUNT_KEYS), narrow(GSTIN_KEYS))
+        category_keys = narrow(CATEGORY_KEYS)
+        has_gst = any(gst_keys)
+        
+        extract_id, extract_vendor = self._extract_id, self._extract_vendor
+        extract_amount, extract_utr = self._extract_amount, self._extract_utr
+        extract_date, extract_mode = self._extract_date, self._extract_mode
+        extract_type, extract_gst = self._extract_type, self._extract_gst
+        extract_category = self._extract_category
+        
+        def getter(data: Dict[str, Any], source: Optional[str] = None) -> Dict[str, Any]:
+            return {
+                "id": extract_id(data, id_keys),
+                "vendor": extract_vendor(data, vendor_keys),
+                "amount": extract_amount(data, amount_keys),
+                "utr": extract_utr(data, utr_keys),
+                "date": extract_date(data, source, date_keys),
+                "mode": extract_mode(data, mode_keys),
+                "type": extract_type(data, type_keys, type_amount_keys),
+                "gst": extract_gst(data, *gst_keys) if has_gst else None,
+                "category": extract_category(data, category_keys)
+            }
+        
+        self._schema_cache.set(schema, getter)
+        return getter
+    
+    def _apply_schema(self, getter: Callable[..., Dict[str, Any]], data: Dict[str, Any], source: Optional[str] = None) -> Dict[str, Any]:
+        """Run a compiled getter with normalize()'s safe-default behaviour"""
+        try:
+            return getter(data, source)
+        except Exception as e:
+            logger.warning("Normalization error: %s, using safe defaults", e)
+            return self._create_safe_default()
+    
+    def normalize_stream(self, file_obj: IO, header_scan_rows: int = 20) -> Iterator[Dict[str, Any]]:
+        """
+        Yield one normalized transaction per row of a CSV / bank statement.
+
+        Reads `file_obj` (text or binary, UTF-8) row by row, so memory does not
+        grow with the file. The header is located once among the first
+        `header_scan_rows` non-empty rows (statements often start with account
+        details) and its columns are mapped once. Without a recognisable
+        header every row is normalized like a headerless CSV line.
+        """
+        wrapper = None
+        if isinstance(file_obj.read(0), bytes):
+            wrapper = io.TextIOWrapper(file_obj, encoding="utf-8-sig", errors="replace", newline="")
+            file_obj = wrapper
+        try:
+            rows = (row for row in csv.reader(file_obj) if any(cell.strip() for cell in row))
+            yield from self._normalize_rows(rows, header_scan_rows)
+        finally:
+            # Leave the caller's binary file open
+            if wrapper is not None:
+                wrapper.detach()
+    
+    def _normalize_rows(self, rows: Iterator[List[str]], header_scan_rows: int) -> Iterator[Dict[str, Any]]:
+        preamble = []
+        columns = None
+        for row in rows:
+            columns = self._map_header(row)
+            if columns is not None:
+                break
+            preamble.append(row)
+            if len(preamble) >= header_scan_rows:
+                break
+
+        if columns is None:
+            for row in preamble:
+                yield self._normalize_csv(row)
+            for row in rows:
+                yield self._normalize_csv(row)
+            return
+
+        has_direction = "cr_dr" in columns
+        # Split Withdrawal / Deposit columns: the amount is whichever side is
+        # filled in (the other is often written as 0.00, not left empty)
+        split_amount = "amount" not in columns and ("debit" in columns or "credit" in columns)
+        # One statement uses one date format; let the parser learn it
+        source = f"stream:{uuid.uuid4().hex}"
+        record_keys = [key for key in columns if key is not None]
+        if not has_direction:
+            record_keys.append("cr_dr")
+        if split_amount:
+            record_keys.append("amount")
+        getter = self.compile_schema(record_keys)
+        for row in rows:
+            try:
+                record = {key: cell.strip() for key, cell in zip(columns, row) if key is not None}
+                if split_amount or not has_direction:
+                    side = self._statement_direction(record)
+                    if not has_direction:
+                        record["cr_dr"] = side
+                    if split_amount:
+                        record["amount"] = record.get(side, "")
+                if len(record) == len(record_keys):
+                    yield getter(record, source)
+                else:
+                    # Short row: fewer keys than the header schema
+                    yield self._normalize_json(record, source)
+            except Exception as e:
+                logger.warning("Skipping invalid statement row: %s", e)
+    
+    def _map_header(self, row: List[str]) -> Optional[List[Optional[str]]]:
+        """Column -> record key for a header row, or None if the row is data"""
+        cleaned = [_HEADER_PUNCTUATION.sub(' ', cell.lower()).strip() for cell in row]
+        columns = [_HEADER_LOOKUP.get(name) for name in cleaned]
+        known = [key for key in columns if key is not None]
+        if len(known) < 2 or not ("date" in known or "amount" in known or "debit" in known):
+            return None
+        # First occurrence wins if a statement repeats a column (e.g. two dates)
+        seen = set()
+        for i, key in enumerate(columns):
+            if key in seen:
+                columns[i] = None
+            elif key is not None:
+                seen.add(key)
+        return columns
+    
+    def _statement_direction(self, record: Dict[str, str]) -> str:
+        """debit / credit from split withdrawal/deposit columns"""
+        for key in ("debit", "credit"):
+            value = record.get(key, "").replace(',', '')
+            try:
+                if float(value) != 0:
+                    return key
+            except ValueError:
+                continue
+        return "debit"
+    
     def _detect_source_type(self, data: Any) -> str:
         """Auto-detect input data type"""
         if isinstance(data, dict):
@@ -80,14 +301,14 @@ class DataNormalizerAgent:
                 return "ocr"
         return "json"
     
-    def _normalize_json(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Normalize JSON/dict input"""
+    def _normalize_json(self, data: Dict[str, Any], source: Optional[str] = None) -> Dict[str, Any]:
+        """Normalize JSON/dict input (`source` groups records sharing a date format)"""
         return {
             "id": self._extract_id(data),
             "vendor": self._extract_vendor(data),
             "amount": self._extract_amount(data),
             "utr": self._extract_utr(data),
-            "date": self._extract_date(data),
+            "date": self._extract_date(data, source),
             "mode": self._extract_mode(data),
             "type": self._extract_type(data),
             "gst": self._extract_gst(data),
@@ -107,26 +328,19 @@ class DataNormalizerAgent:
     
     def _normalize_text(self, text: str) -> Dict[str, Any]:
         """Normalize raw text (OCR, PDF, Email)"""
-        # Extract all information from unstructured text
-        extracted = {
-            "vendor": self._extract_vendor_from_text(text),
-            "amount": self._extract_amount_from_text(text),
-            "utr": self._extract_utr_from_text(text),
-            "date": self._extract_date_from_text(text),
-            "mode": self._extract_mode_from_text(text),
-            "type": self._extract_type_from_text(text),
-            "gst": self._extract_gst_from_text(text),
-            "category": self._extract_category_from_text(text)
-        }
+        # Extract all information from unstructured text in one scan
+        extracted = self.text_scanner.scan(text)
         
+        date_str = extracted["date"]
+        extracted["date"] = self._date_or_now(date_str, "text") if date_str else datetime.now().isoformat()
         extracted["id"] = self._generate_id()
         
         return extracted
     
     
-    def _extract_id(self, data: Dict) -> str:
+    def _extract_id(self, data: Dict, keys: Tuple[str, ...] = ID_KEYS) -> str:
         """Extract or generate transaction ID"""
-        for key in ["id", "transaction_id", "txn_id", "ref_no", "reference"]:
+        for key in keys:
             if key in data and data[key]:
                 return str(data[key])
         return self._generate_id()
@@ -135,31 +349,16 @@ class DataNormalizerAgent:
         """Generate unique transaction ID"""
         return f"TXN_{uuid.uuid4().hex[:8].upper()}"
     
-    def _extract_vendor(self, data: Dict) -> str:
+    def _extract_vendor(self, data: Dict, keys: Tuple[str, ...] = VENDOR_KEYS) -> str:
         """Extract vendor name"""
-        for key in ["vendor", "party", "supplier", "merchant", "payee", "to", "beneficiary", "name"]:
+        for key in keys:
             if key in data and data[key]:
                 return str(data[key]).strip()
         return "Unknown Vendor"
     
-    def _extract_vendor_from_text(self, text: str) -> str:
-        """Extract vendor from unstructured text"""
-        patterns = [
-            r"(?:to|payee|vendor|merchant)[:|\s]+([A-Za-z\s&.]+)",
-            r"M/s\.?\s+([A-Za-z\s&.]+)",
-            r"([A-Z][a-z]+(?:\s+[A-Z][a-z]+){1,3})\s+(?:Pvt|Ltd|LLP)",
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                return match.group(1).strip()
-        
-        return "Unknown Vendor"
-    
-    def _extract_amount(self, data: Dict) -> float:
+    def _extract_amount(self, data: Dict, keys: Tuple[str, ...] = AMOUNT_KEYS) -> float:
         """Extract amount as float"""
-        for key in ["amount", "value", "total", "sum", "debit", "credit", "txn_amount"]:
+        for key in keys:
             if key in data:
                 try:
                     val = str(data[key]).replace(',', '').replace('₹', '').replace('Rs', '').strip()
@@ -168,20 +367,9 @@ class DataNormalizerAgent:
                     continue
         return 0.0
     
-    def _extract_amount_from_text(self, text: str) -> float:
-        """Extract amount from text"""
-        matches = self.amount_pattern.findall(text)
-        if matches:
-            try:
-                amounts = [float(m.replace(',', '')) for m in matches]
-                return max(amounts)
-            except:
-                pass
-        return 0.0
-    
-    def _extract_utr(self, data: Dict) -> Optional[str]:
+    def _extract_utr(self, data: Dict, keys: Tuple[str, ...] = UTR_KEYS) -> Optional[str]:
         """Extract UTR/reference number"""
-        for key in ["utr", "ref", "reference", "txn_ref", "transaction_ref", "ref_no"]:
+        for key in keys:
             if key in data and data[key]:
                 return str(data[key])
         
@@ -193,64 +381,28 @@ class DataNormalizerAgent:
         
         return None
     
-    def _extract_utr_from_text(self, text: str) -> Optional[str]:
-        """Extract UTR from text"""
-        match = self.utr_pattern.search(text)
-        return match.group(0) if match else None
-    
-    def _extract_date(self, data: Dict) -> str:
+    def _extract_date(self, data: Dict, source: Optional[str] = None, keys: Tuple[str, ...] = DATE_KEYS) -> str:
         """Extract and normalize date to ISO 8601"""
-        for key in ["date", "txn_date", "transaction_date", "timestamp", "datetime"]:
+        for key in keys:
             if key in data and data[key]:
-                return self._parse_date(data[key])
+                return self._date_or_now(data[key], source)
         return datetime.now().isoformat()
     
-    def _extract_date_from_text(self, text: str) -> str:
-        """Extract date from text"""
-        date_patterns = [
-            r'\d{2}[-/]\d{2}[-/]\d{4}',  # DD-MM-YYYY or DD/MM/YYYY
-            r'\d{4}[-/]\d{2}[-/]\d{2}',  # YYYY-MM-DD
-            r'\d{2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{4}',
-        ]
-        
-        for pattern in date_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                return self._parse_date(match.group(0))
-        
-        return datetime.now().isoformat()
+    def _parse_date(self, date_str: Any, source: Optional[str] = None) -> Optional[str]:
+        """Parse any supported date format to ISO 8601; None if unparseable"""
+        return self.date_parser.parse(date_str, source)
     
-    def _parse_date(self, date_str: Any) -> str:
-        """Parse any date format to ISO 8601"""
-        if not date_str:
+    def _date_or_now(self, date_str: Any, source: Optional[str] = None) -> str:
+        """Parsed date, falling back to the current time for unparseable input"""
+        parsed = self.date_parser.parse(date_str, source)
+        if parsed is None:
+            logger.warning("Unparseable date %r, using current time", date_str)
             return datetime.now().isoformat()
-        
-        date_str = str(date_str)
-        
-        formats = [
-            "%Y-%m-%d",
-            "%d-%m-%Y",
-            "%d/%m/%Y",
-            "%Y/%m/%d",
-            "%d-%m-%y",
-            "%d %B %Y",
-            "%d %b %Y",
-            "%Y-%m-%dT%H:%M:%S",
-            "%Y-%m-%d %H:%M:%S",
-        ]
-        
-        for fmt in formats:
-            try:
-                dt = datetime.strptime(date_str, fmt)
-                return dt.isoformat()
-            except:
-                continue
-        
-        return datetime.now().isoformat()
+        return parsed
     
-    def _extract_mode(self, data: Dict) -> str:
+    def _extract_mode(self, data: Dict, keys: Tuple[str, ...] = MODE_KEYS) -> str:
         """Extract payment mode"""
-        for key in ["mode", "payment_mode", "method", "type", "channel"]:
+        for key in keys:
             if key in data:
                 mode = str(data[key]).upper()
                 for supported in self.supported_modes:
@@ -258,17 +410,14 @@ class DataNormalizerAgent:
                         return supported
         return "BANK_TRANSFER"
     
-    def _extract_mode_from_text(self, text: str) -> str:
-        """Extract payment mode from text"""
-        text_upper = text.upper()
-        for mode in self.supported_modes:
-            if mode in text_upper:
-                return mode
-        return "BANK_TRANSFER"
-    
-    def _extract_type(self, data: Dict) -> str:
+    def _extract_type(
+        self,
+        data: Dict,
+        keys: Tuple[str, ...] = TYPE_KEYS,
+        amount_keys: Tuple[str, ...] = TYPE_AMOUNT_KEYS
+    ) -> str:
         """Extract transaction type (credit/debit)"""
-        for key in ["type", "txn_type", "transaction_type", "cr_dr"]:
+        for key in keys:
             if key in data:
                 val = str(data[key]).lower()
                 if "credit" in val or "cr" in val or "received" in val:
@@ -276,7 +425,7 @@ class DataNormalizerAgent:
                 if "debit" in val or "dr" in val or "paid" in val or "payment" in val:
                     return "debit"
         
-        for key in ["amount", "value"]:
+        for key in amount_keys:
             if key in data:
                 try:
                     amount = float(str(data[key]).replace(',', '').replace('₹', ''))
@@ -286,20 +435,17 @@ class DataNormalizerAgent:
         
         return "debit"
     
-    def _extract_type_from_text(self, text: str) -> str:
-        """Extract transaction type from text"""
-        text_lower = text.lower()
-        if any(word in text_lower for word in ["received", "credit", "deposited", "cr"]):
-            return "credit"
-        if any(word in text_lower for word in ["paid", "debit", "withdrawn", "dr", "payment"]):
-            return "debit"
-        return "debit"
-    
-    def _extract_gst(self, data: Dict) -> Optional[Dict[str, Any]]:
+    def _extract_gst(
+        self,
+        data: Dict,
+        rate_keys: Tuple[str, ...] = GST_RATE_KEYS,
+        amount_keys: Tuple[str, ...] = GST_AMOUNT_KEYS,
+        gstin_keys: Tuple[str, ...] = GSTIN_KEYS
+    ) -> Optional[Dict[str, Any]]:
         """Extract GST information"""
         gst_info = {}
         
-        for key in ["gst_rate", "gst", "tax_rate", "igst", "cgst", "sgst"]:
+        for key in rate_keys:
             if key in data and data[key]:
                 try:
                     rate = float(str(data[key]).replace('%', ''))
@@ -308,7 +454,7 @@ class DataNormalizerAgent:
                 except:
                     pass
         
-        for key in ["gst_amount", "tax_amount", "gst_value", "tax"]:
+        for key in amount_keys:
             if key in data and data[key]:
                 try:
                     gst_info["amount"] = float(str(data[key]).replace(',', ''))
@@ -316,7 +462,7 @@ class DataNormalizerAgent:
                 except:
                     pass
         
-        for key in ["gstin", "gst_number", "gst_no"]:
+        for key in gstin_keys:
             if key in data and data[key]:
                 gstin = str(data[key])
                 if self.gstin_pattern.match(gstin):
@@ -325,50 +471,13 @@ class DataNormalizerAgent:
         
         return gst_info if gst_info else None
     
-    def _extract_gst_from_text(self, text: str) -> Optional[Dict[str, Any]]:
-        """Extract GST from text"""
-        gst_info = {}
-        
-        gstin_match = self.gstin_pattern.search(text)
-        if gstin_match:
-            gst_info["gstin"] = gstin_match.group(0)
-        
-        gst_rate_match = re.search(r'GST\s*[@:]\s*(\d+)%', text, re.IGNORECASE)
-        if gst_rate_match:
-            gst_info["rate"] = int(gst_rate_match.group(1))
-        
-        gst_amount_match = re.search(r'GST[:\s]*(?:Rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)', text, re.IGNORECASE)
-        if gst_amount_match:
-            gst_info["amount"] = float(gst_amount_match.group(1).replace(',', ''))
-        
-        return gst_info if gst_info else None
-    
-    def _extract_category(self, data: Dict) -> Optional[str]:
+    def _extract_category(self, data: Dict, keys: Tuple[str, ...] = CATEGORY_KEYS) -> Optional[str]:
         """Extract transaction category"""
-        for key in ["category", "type", "purpose", "description", "narration"]:
+        for key in keys:
             if key in data and data[key]:
                 return str(data[key])
         return None
     
-    def _extract_category_from_text(self, text: str) -> Optional[str]:
-        """Extract category from text keywords"""
-        text_lower = text.lower()
-        
-        categories = {
-            "supplies": ["supplies", "material", "goods", "inventory"],
-            "salary": ["salary", "wages", "payroll", "compensation"],
-            "rent": ["rent", "lease"],
-            "utilities": ["electricity", "water", "internet", "telecom"],
-            "services": ["service", "consulting", "professional"],
-            "equipment": ["equipment", "machinery", "tools"],
-        }
-        
-        for category, keywords in categories.items():
-            if any(kw in text_lower for kw in keywords):
-                return category
-        
-        return None
-    
     def _create_safe_default(self) -> Dict[str, Any]:
         """Create safe default transaction when parsing fails"""
         return {
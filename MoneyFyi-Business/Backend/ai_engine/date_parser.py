@@ -0,0 +1,107 @@
+"""
+DateParser - memoized, format-learning date parsing for DataNormalizerAgent
+Part of MoneyFyi AI Intelligence Layer
+"""
+
+from datetime import datetime
+from typing import Any, Hashable, Optional
+
+try:
+    from .ttl_cache import TTLCache
+except ImportError:
+    from ttl_cache import TTLCache
+
+
+DATE_FORMATS = (
+    "%Y-%m-%d",
+    "%d-%m-%Y",
+    "%d/%m/%Y",
+    "%Y/%m/%d",
+    "%d-%m-%y",
+    "%d %B %Y",
+    "%d %b %Y",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S",
+)
+
+# Cached marker for strings no format accepts (None means "not cached")
+_UNPARSEABLE = ""
+
+
+def _fast_parse(value: str) -> Optional[str]:
+    """YYYY-MM-DD / DD-MM-YYYY without strptime; None if the shape differs"""
+    if len(value) != 10:
+        return None
+    if value[4] == '-' and value[7] == '-':
+        year, month, day = value[0:4], value[5:7], value[8:10]
+    elif value[2] == '-' and value[5] == '-':
+        day, month, year = value[0:2], value[3:5], value[6:10]
+    else:
+        return None
+    digits = year + month + day
+    if not (digits.isascii() and digits.isdigit()):
+        return None
+    try:
+        return datetime(int(year), int(month), int(day)).isoformat()
+    except ValueError:
+        return None
+
+
+class DateParser:
+    """
+    Parses date strings in any of DATE_FORMATS to ISO 8601.
+
+    - Fast path for YYYY-MM-DD and DD-MM-YYYY (no strptime)
+    - Per-source learned format: a statement uses one format for every row,
+      so the format that last worked for `source` is tried first
+    - Bounded LRU of string -> ISO results, unparseable strings included
+
+    The formats do not overlap (no string parses under two of them with
+    different results), so trying the learned format first never changes
+    the answer. Unparseable input returns None; the caller decides the
+    fallback, which keeps cached results deterministic.
+    """
+
+    def __init__(self, cache_size: int = 10_000, max_sources: int = 1_000):
+        self.cache = TTLCache(maxsize=cache_size)
+        self.learned_formats = TTLCache(maxsize=max_sources)
+
+    def parse(self, value: Any, source: Optional[Hashable] = None) -> Optional[str]:
+        """ISO 8601 string for value, or None if it is empty or unparseable"""
+        if not value:
+            return None
+        date_str = str(value)
+
+        cached = self.cache.get(date_str)
+        if cached is not None:
+            return cached or None
+
+        parsed = _fast_parse(date_str)
+        if parsed is None:
+            parsed = self._parse_formats(date_str, source)
+
+        self.cache.set(date_str, parsed if parsed is not None else _UNPARSEABLE)
+        return parsed
+
+    def _parse_formats(self, date_str: str, source: Optional[Hashable]) -> Optional[str]:
+        learned = self.learned_formats.get(source) if source is not None else None
+        if learned is not None:
+            try:
+                return datetime.strptime(date_str, learned).isoformat()
+            except ValueError:
+                pass
+
+        for fmt in DATE_FORMATS:
+            if fmt == learned:
+                continue
+            try:
+                parsed = datetime.strptime(date_str, fmt).isoformat()
+            except ValueError:
+                continue
+            if source is not None:
+                self.learned_formats.set(source, fmt)
+            return parsed
+        return None
+
+    def stats(self):
+        return {"cache": self.cache.stats(), "sources": len(self.learned_formats)}
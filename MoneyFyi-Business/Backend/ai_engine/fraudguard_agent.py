@@ -1,21 +1,67 @@
 import json
-from datetime import datetime, timedelta
-from typing import Dict, List, Any, Set
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+
+import numpy as np
+
+from history import BoundedHistory
+from utr_index import UTRIndex, utr_fingerprint
+from velocity_index import VelocityIndex, parse_epoch
+
+
+# Bit positions for the columnar path, in the order analyze_transaction emits flags
+FLAG_NAMES = (
+    "NEW_VENDOR",
+    "UNUSUAL_AMOUNT",
+    "ELEVATED_AMOUNT",
+    "DUPLICATE_UTR",
+    "HIGH_VELOCITY",
+    "ELEVATED_VELOCITY",
+    "ROUND_AMOUNT",
+    "WEEKEND_TRANSACTION",
+    "LATE_NIGHT_TRANSACTION",
+    "HIGH_VALUE",
+)
+FLAG_BITS = {name: 1 << i for i, name in enumerate(FLAG_NAMES)}
+
+
+def parse_times(date_value: Any) -> Tuple[float, float]:
+    """
+    (UTC epoch seconds, wall-clock seconds) for an ISO 8601 date, NaN for
+    both when it is missing or unparseable. Wall-clock seconds are the
+    date's local time read as if it were UTC, so the hour and weekday
+    match what analyze_transaction sees for any offset. Naive dates are UTC.
+    """
+    if not date_value:
+        return np.nan, np.nan
+    try:
+        dt = datetime.fromisoformat(str(date_value).replace('Z', '+00:00'))
+    except ValueError:
+        return np.nan, np.nan
+    wall_clock = dt.replace(tzinfo=timezone.utc).timestamp()
+    return (dt.timestamp() if dt.tzinfo is not None else wall_clock), wall_clock
 
 
 class FraudGuardAgent:
    
-    def __init__(self):
-        self.seen_utrs: Set[str] = set()
-        self.transaction_history: List[Dict] = []
+    def __init__(self, utr_index: Optional[UTRIndex] = None, history_size: int = 1000):
+        # Memory-only index unless the caller wires in a persistent one
+        self.utr_index = utr_index if utr_index is not None else UTRIndex()
+        self.transaction_history = BoundedHistory(history_size)
         
     def analyze_transaction(
         self, 
         transaction: Dict[str, Any], 
         vendor_history: Dict[str, Any],
-        all_transactions: List[Dict] = None
+        all_transactions: List[Dict] = None,
+        tenant_id: Optional[str] = None,
+        velocity_index: Optional[VelocityIndex] = None,
+        duplicate_in_batch: bool = False
     ) -> Dict[str, Any]:
-      
+        """
+        Score one transaction. `duplicate_in_batch` flags a UTR the caller
+        already saw earlier in the same batch without consulting the index.
+        """
         flags = []
         reasons = []
         score = 0
@@ -25,9 +71,6 @@ class FraudGuardAgent:
         utr = transaction.get('utr', '')
         transaction_date = transaction.get('date', datetime.now().isoformat())
         
-       
-        self.transaction_history.append(transaction)
-        
         
         if vendor not in vendor_history or vendor_history.get(vendor, {}).get('frequency', 0) == 0:
             flags.append("NEW_VENDOR")
@@ -51,19 +94,21 @@ class FraudGuardAgent:
         
         
         if utr:
-            if utr in self.seen_utrs:
+            tenant = tenant_id or transaction.get('user_id')
+            if duplicate_in_batch or self.utr_index.check_and_add(utr, tenant):
                 flags.append("DUPLICATE_UTR")
                 reasons.append(f"UTR {utr} has been used before - possible duplicate payment")
                 score += 40
-            else:
-                self.seen_utrs.add(utr)
         
         
-        if all_transactions:
+        if all_transactions or velocity_index is not None:
+            if velocity_index is None:
+                velocity_index = VelocityIndex.from_transactions(all_transactions)
+            
             recent_count = self._count_recent_transactions(
                 vendor, 
                 transaction_date, 
-                all_transactions,
+                velocity_index,
                 hours=1
             )
             
@@ -116,6 +161,8 @@ class FraudGuardAgent:
         else:
             risk_level = "low"
         
+        self.transaction_history.append(transaction, category=risk_level, value=min(score, 100))
+        
         return {
             "transaction_id": transaction.get('id', 'unknown'),
             "vendor": vendor,
@@ -132,24 +179,14 @@ class FraudGuardAgent:
         self, 
         vendor: str, 
         current_date: str, 
-        all_transactions: List[Dict],
+        velocity_index: VelocityIndex,
         hours: int = 1
     ) -> int:
-        """Count transactions to same vendor in recent time window"""
-        try:
-            current_dt = datetime.fromisoformat(current_date.replace('Z', '+00:00'))
-            cutoff_time = current_dt - timedelta(hours=hours)
-            
-            count = 0
-            for txn in all_transactions:
-                if txn.get('vendor') == vendor:
-                    txn_dt = datetime.fromisoformat(txn.get('date', '').replace('Z', '+00:00'))
-                    if txn_dt >= cutoff_time and txn_dt <= current_dt:
-                        count += 1
-            
-            return count
-        except:
+        """Count transactions to same vendor in recent time window (O(log n))"""
+        current_ts = parse_epoch(current_date)
+        if current_ts is None:
             return 0
+        return velocity_index.count(vendor, current_ts, hours * 3600)
     
     def _get_recommendation(self, risk_level: str, score: int) -> str:
         """Generate action recommendation based on risk"""
@@ -163,25 +200,262 @@ class FraudGuardAgent:
     def analyze_batch(
         self, 
         transactions: List[Dict], 
-        vendor_history: Dict
+        vendor_history: Dict,
+        tenant_id: Optional[str] = None
     ) -> List[Dict]:
         """Analyze multiple transactions"""
         results = []
         
+        # Parse and sort the batch once; every velocity check is then a bisect
+        velocity_index = VelocityIndex.from_transactions(transactions)
+        
         for txn in transactions:
-            result = self.analyze_transaction(txn, vendor_history, transactions)
+            result = self.analyze_transaction(
+                txn,
+                vendor_history,
+                transactions,
+                tenant_id=tenant_id,
+                velocity_index=velocity_index
+            )
             results.append(result)
         
         return results
     
-    def get_summary_stats(self, analysis_results: List[Dict]) -> Dict:
-        """Generate summary statistics from batch analysis"""
-        total = len(analysis_results)
-        high_risk = sum(1 for r in analysis_results if r['risk_level'] == 'high')
-        medium_risk = sum(1 for r in analysis_results if r['risk_level'] == 'medium')
-        low_risk = sum(1 for r in analysis_results if r['risk_level'] == 'low')
-        
-        avg_score = sum(r['fraud_score'] for r in analysis_results) / total if total > 0 else 0
+    def analyze_batch_columnar(
+        self,
+        amounts: Sequence[float],
+        vendor_ids: Sequence[int],
+        timestamps: Sequence[float],
+        utr_hashes: Sequence[int],
+        vendor_names: Sequence[str],
+        vendor_history: Dict,
+        transaction_ids: Optional[Sequence[str]] = None,
+        tenant_id: Optional[str] = None,
+        local_seconds: Optional[Sequence[float]] = None
+    ) -> Dict[str, Any]:
+        """
+        Vectorized equivalent of analyze_batch for large statement imports.
+        
+        Args:
+            amounts: Transaction amounts
+            vendor_ids: Index into vendor_names for each row
+            timestamps: UTC epoch seconds (NaN when unknown)
+            utr_hashes: utr_fingerprint() of each UTR, 0 when there is none
+            vendor_names: Vendor name for each vendor id
+            vendor_history: Same mapping analyze_batch takes
+            transaction_ids: Optional ids, only used in flagged row output
+            local_seconds: Wall-clock time of each row as epoch seconds (NaN
+                when unknown), for weekend/late-night checks; defaults to
+                `timestamps`, i.e. UTC wall clock
+            
+        Returns:
+            Per-row score/risk/flag arrays plus fully explained results for
+            rows that tripped at least one flag
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        vendor_ids = np.asarray(vendor_ids, dtype=np.int64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        local_seconds = timestamps if local_seconds is None else np.asarray(local_seconds, dtype=np.float64)
+        utr_hashes = np.asarray(utr_hashes, dtype=np.int64)
+        n = len(amounts)
+        
+        vendor_freq = np.array(
+            [vendor_history.get(v, {}).get('frequency', 0) for v in vendor_names],
+            dtype=np.float64
+        )
+        vendor_avg = np.array(
+            [vendor_history.get(v, {}).get('avg_amount', 0) for v in vendor_names],
+            dtype=np.float64
+        )
+        
+        flags = np.zeros(n, dtype=np.uint16)
+        score = np.zeros(n, dtype=np.int64)
+        
+        def apply(mask, name, points):
+            flags[mask] |= FLAG_BITS[name]
+            score[mask] += points
+        
+        apply(vendor_freq[vendor_ids] == 0, "NEW_VENDOR", 25)
+        
+        avg = vendor_avg[vendor_ids]
+        ratio = np.divide(amounts, avg, out=np.zeros(n), where=avg > 0)
+        apply(ratio > 3, "UNUSUAL_AMOUNT", 30)
+        apply((ratio > 2) & (ratio <= 3), "ELEVATED_AMOUNT", 15)
+        
+        apply(self._columnar_duplicates(utr_hashes, tenant_id), "DUPLICATE_UTR", 40)
+        
+        recent = self._columnar_velocity(vendor_ids, timestamps, 3600)
+        apply(recent > 5, "HIGH_VELOCITY", 25)
+        apply((recent > 3) & (recent <= 5), "ELEVATED_VELOCITY", 10)
+        
+        apply((np.fmod(amounts, 10000) == 0) & (amounts >= 50000), "ROUND_AMOUNT", 10)
+        
+        valid_ts = ~np.isnan(local_seconds)
+        local = np.floor(np.where(valid_ts, local_seconds, 0)).astype(np.int64)
+        weekday = (local // 86400 + 3) % 7  # 1970-01-01 was a Thursday
+        hour = (local % 86400) // 3600
+        apply(valid_ts & (weekday >= 5), "WEEKEND_TRANSACTION", 5)
+        apply(valid_ts & ((hour >= 23) | (hour <= 5)), "LATE_NIGHT_TRANSACTION", 10)
+        
+        apply(amounts > 100000, "HIGH_VALUE", 15)
+        
+        risk_level = np.where(score >= 70, "high", np.where(score >= 40, "medium", "low"))
+        fraud_score = np.minimum(score, 100)
+        
+        self.transaction_history.record_bulk(
+            {level: int(np.count_nonzero(risk_level == level)) for level in ("high", "medium", "low")},
+            float(fraud_score.sum())
+        )
+        
+        # Reason strings are only built for rows that tripped a flag
+        flagged = []
+        rows = np.flatnonzero(flags)
+        for i, mask, vid, amount, row_ratio, row_avg, count, row_hour, row_score, raw_score, risk in zip(
+            rows.tolist(), flags[rows].tolist(), vendor_ids[rows].tolist(), amounts[rows].tolist(),
+            ratio[rows].tolist(), avg[rows].tolist(), recent[rows].tolist(), hour[rows].tolist(),
+            fraud_score[rows].tolist(), score[rows].tolist(), risk_level[rows].tolist()
+        ):
+            vendor = vendor_names[vid]
+            row_flags, reasons = self._explain_flags(mask, vendor, amount, row_ratio, row_avg, count, row_hour)
+            flagged.append({
+                "index": i,
+                "transaction_id": transaction_ids[i] if transaction_ids is not None else 'unknown',
+                "vendor": vendor,
+                "amount": amount,
+                "fraud_score": row_score,
+                "risk_level": risk,
+                "flags": row_flags,
+                "reasoning": reasons,
+                "recommendation": self._get_recommendation(risk, raw_score)
+            })
+        
+        return {
+            "fraud_score": fraud_score,
+            "risk_level": risk_level,
+            "flag_mask": flags,
+            "flag_names": FLAG_NAMES,
+            "flagged": flagged,
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    @staticmethod
+    def to_columns(transactions: List[Dict]) -> Dict[str, Any]:
+        """Convert transaction dicts into the arrays analyze_batch_columnar takes"""
+        vendor_lookup: Dict[str, int] = {}
+        vendor_ids = []
+        for txn in transactions:
+            vendor = txn.get('vendor', 'Unknown')
+            vendor_ids.append(vendor_lookup.setdefault(vendor, len(vendor_lookup)))
+        
+        times = np.array([parse_times(txn.get('date')) for txn in transactions], dtype=np.float64).reshape(-1, 2)
+        return {
+            "amounts": np.array([txn.get('amount', 0) for txn in transactions], dtype=np.float64),
+            "vendor_ids": np.array(vendor_ids, dtype=np.int64),
+            "timestamps": times[:, 0],
+            "local_seconds": times[:, 1],
+            "utr_hashes": np.array(
+                [utr_fingerprint(txn['utr']) if txn.get('utr') else 0 for txn in transactions],
+                dtype=np.int64
+            ),
+            "vendor_names": list(vendor_lookup),
+            "transaction_ids": [txn.get('id', 'unknown') for txn in transactions]
+        }
+    
+    def _columnar_duplicates(self, utr_hashes: np.ndarray, tenant_id: Optional[str]) -> np.ndarray:
+        """Duplicate mask: repeats inside the batch, plus first sightings already in the UTR index"""
+        duplicate = np.zeros(len(utr_hashes), dtype=bool)
+        has_utr = utr_hashes != 0
+        if not has_utr.any():
+            return duplicate
+        
+        rows = np.flatnonzero(has_utr)
+        unique_hashes, first_pos = np.unique(utr_hashes[rows], return_index=True)
+        first_rows = rows[first_pos]
+        duplicate[rows] = True
+        duplicate[first_rows] = False
+        
+        # One index lookup per distinct UTR, written to the store in one transaction
+        already_seen = self.utr_index.check_and_add_many(unique_hashes.tolist(), tenant_id)
+        duplicate[first_rows[np.array(already_seen, dtype=bool)]] = True
+        return duplicate
+    
+    @staticmethod
+    def _columnar_velocity(vendor_ids: np.ndarray, timestamps: np.ndarray, window_seconds: int) -> np.ndarray:
+        """Per-row count of same-vendor rows within [ts - window, ts]"""
+        counts = np.zeros(len(vendor_ids), dtype=np.int64)
+        valid = ~np.isnan(timestamps)
+        if not valid.any():
+            return counts
+        
+        ts = np.floor(timestamps[valid]).astype(np.int64)
+        base = ts.min()
+        # Compose (vendor, time) into one sortable int64 key; the stride leaves
+        # a gap wider than the window so ranges never cross vendors
+        stride = int(ts.max() - base) + window_seconds + 1
+        keys = vendor_ids[valid] * stride + (ts - base)
+        sorted_keys = np.sort(keys)
+        hi = np.searchsorted(sorted_keys, keys, side='right')
+        lo = np.searchsorted(sorted_keys, keys - window_seconds, side='left')
+        counts[valid] = hi - lo
+        return counts
+    
+    @staticmethod
+    def _explain_flags(
+        mask: int,
+        vendor: str,
+        amount: float,
+        ratio: float,
+        vendor_avg: float,
+        recent_count: int,
+        hour: int
+    ):
+        """Build flag names and reason strings for one columnar row"""
+        flags = [name for name in FLAG_NAMES if mask & FLAG_BITS[name]]
+        reasons = []
+        for name in flags:
+            if name == "NEW_VENDOR":
+                reasons.append(f"First time transacting with {vendor}")
+            elif name == "UNUSUAL_AMOUNT":
+                reasons.append(f"Amount ₹{amount:,.0f} is {ratio:.1f}x higher than average ₹{vendor_avg:,.0f}")
+            elif name == "ELEVATED_AMOUNT":
+                reasons.append(f"Amount is {ratio:.1f}x higher than usual")
+            elif name == "DUPLICATE_UTR":
+                reasons.append("UTR has been used before - possible duplicate payment")
+            elif name == "HIGH_VELOCITY":
+                reasons.append(f"{recent_count} transactions to {vendor} in last hour - possible attack")
+            elif name == "ELEVATED_VELOCITY":
+                reasons.append(f"{recent_count} transactions in short time period")
+            elif name == "ROUND_AMOUNT":
+                reasons.append(f"Suspiciously round amount: ₹{amount:,.0f}")
+            elif name == "WEEKEND_TRANSACTION":
+                reasons.append("Transaction on weekend - unusual for B2B")
+            elif name == "LATE_NIGHT_TRANSACTION":
+                reasons.append(f"Transaction at {hour}:00 - unusual timing")
+            elif name == "HIGH_VALUE":
+                reasons.append(f"High value transaction: ₹{amount:,.0f}")
+        return flags, reasons
+    
+    def get_summary_stats(self, analysis_results: Optional[List[Dict]] = None) -> Dict:
+        """
+        Generate summary statistics from batch analysis.
+        
+        Without analysis_results, summarizes everything this agent has scored
+        from its running aggregates in O(1).
+        """
+        if analysis_results is None:
+            history = self.transaction_history
+            total = history.total
+            high_risk = history.count('high')
+            medium_risk = history.count('medium')
+            low_risk = history.count('low')
+            avg_score = history.mean
+        else:
+            total = len(analysis_results)
+            high_risk = sum(1 for r in analysis_results if r['risk_level'] == 'high')
+            medium_risk = sum(1 for r in analysis_results if r['risk_level'] == 'medium')
+            low_risk = sum(1 for r in analysis_results if r['risk_level'] == 'low')
+            
+            avg_score = sum(r['fraud_score'] for r in analysis_results) / total if total > 0 else 0
         
         return {
             "total_analyzed": total,
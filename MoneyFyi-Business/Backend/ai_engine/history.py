@@ -0,0 +1,77 @@
+"""
+BoundedHistory - ring-buffer record history with streaming aggregates
+Part of MoneyFyi AI Intelligence Layer
+"""
+
+import threading
+from collections import deque
+from typing import Dict, List, Any, Iterator, Optional
+
+
+class BoundedHistory:
+    """
+    Keeps the most recent `capacity` records and O(1) running aggregates
+    over everything ever appended (total, per-category counts, mean score).
+
+    Agents live on the process-wide ai_service singleton, so their history
+    must not grow with uptime; summaries read the aggregates instead of
+    rescanning records.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._records: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.total = 0
+        self.category_counts: Dict[str, int] = {}
+        self._value_sum = 0.0
+
+    def append(self, record: Any, category: Optional[str] = None, value: Optional[float] = None) -> None:
+        """Store a record (evicting the oldest when full) and fold it into the aggregates"""
+        with self._lock:
+            self._records.append(record)
+            self.total += 1
+            if category is not None:
+                self.category_counts[category] = self.category_counts.get(category, 0) + 1
+            if value is not None:
+                self._value_sum += value
+
+    def record_bulk(self, category_counts: Dict[str, int], value_sum: float) -> None:
+        """Fold pre-aggregated results (e.g. a columnar batch) into the aggregates only"""
+        with self._lock:
+            self.total += sum(category_counts.values())
+            for category, count in category_counts.items():
+                self.category_counts[category] = self.category_counts.get(category, 0) + count
+            self._value_sum += value_sum
+
+    def count(self, category: str) -> int:
+        return self.category_counts.get(category, 0)
+
+    @property
+    def mean(self) -> float:
+        """Running mean of appended values"""
+        return self._value_sum / self.total if self.total else 0.0
+
+    def recent(self, limit: Optional[int] = None) -> List[Any]:
+        """Most recent records, oldest first"""
+        with self._lock:
+            records = list(self._records)
+        return records[-limit:] if limit else records
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+            self.total = 0
+            self.category_counts = {}
+            self._value_sum = 0.0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.recent())
+
+    def __bool__(self) -> bool:
+        return self.total > 0
@@ -0,0 +1,171 @@
+"""
+Instrumentation - pipeline stage timers, counters and pluggable sinks
+Part of MoneyFyi AI Intelligence Layer
+"""
+
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Any, Iterator, Optional, Sequence
+
+
+# Upper bounds (ms) for the in-memory latency histogram
+DEFAULT_BUCKETS_MS = (0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class LoggingSink:
+    """Writes each observation as a DEBUG line (counters too)"""
+
+    def __init__(self, logger: Optional[logging.Logger] = None, level: int = logging.DEBUG):
+        self.logger = logger or logging.getLogger("moneyfyi.ai_engine.metrics")
+        self.level = level
+
+    def observe(self, stage: str, duration_ms: float) -> None:
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, "stage=%s duration_ms=%.3f", stage, duration_ms)
+
+    def increment(self, name: str, value: int = 1) -> None:
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, "counter=%s inc=%d", name, value)
+
+
+class HistogramSink:
+    """
+    In-memory per-stage latency histograms (fixed buckets) and counters.
+    Memory is bounded by the number of stage/counter names, not by traffic.
+    """
+
+    def __init__(self, buckets_ms: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.buckets_ms = tuple(sorted(buckets_ms))
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[str, Any]] = {}
+        self.counters: Dict[str, int] = {}
+
+    def observe(self, stage: str, duration_ms: float) -> None:
+        slot = bisect.bisect_left(self.buckets_ms, duration_ms)
+        with self._lock:
+            hist = self._histograms.get(stage)
+            if hist is None:
+                hist = {"counts": [0] * (len(self.buckets_ms) + 1), "sum": 0.0, "count": 0}
+                self._histograms[stage] = hist
+            hist["counts"][slot] += 1
+            hist["sum"] += duration_ms
+            hist["count"] += 1
+
+    def increment(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def percentile(self, stage: str, q: float) -> Optional[float]:
+        """Bucket upper bound containing the q-th quantile (0..1); None if unseen"""
+        with self._lock:
+            hist = self._histograms.get(stage)
+            if not hist or not hist["count"]:
+                return None
+            target = q * hist["count"]
+            running = 0
+            for bound, count in zip(self.buckets_ms + (float("inf"),), hist["counts"]):
+                running += count
+                if running >= target:
+                    return bound
+            return float("inf")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Count / total / mean per stage plus all counters"""
+        with self._lock:
+            stages = {
+                stage: {
+                    "count": hist["count"],
+                    "total_ms": round(hist["sum"], 3),
+                    "mean_ms": round(hist["sum"] / hist["count"], 3) if hist["count"] else 0.0
+                }
+                for stage, hist in self._histograms.items()
+            }
+            return {"stages": stages, "counters": dict(self.counters)}
+
+    def prometheus_text(self, prefix: str = "moneyfyi_ai") -> str:
+        """Render histograms and counters in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            if self._histograms:
+                metric = f"{prefix}_stage_duration_ms"
+                lines.append(f"# HELP {metric} AI pipeline stage latency in milliseconds")
+                lines.append(f"# TYPE {metric} histogram")
+                for stage, hist in sorted(self._histograms.items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets_ms, hist["counts"]):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+                    lines.append(f'{metric}_bucket{{stage="{stage}",le="+Inf"}} {hist["count"]}')
+                    lines.append(f'{metric}_sum{{stage="{stage}"}} {hist["sum"]:.6f}')
+                    lines.append(f'{metric}_count{{stage="{stage}"}} {hist["count"]}')
+            for name, value in sorted(self.counters.items()):
+                metric = f"{prefix}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms = {}
+            self.counters = {}
+
+
+def cache_prometheus_text(name: str, stats: Dict[str, Any], prefix: str = "moneyfyi_ai") -> str:
+    """Render a TTLCache.stats() dict as hit/miss/eviction counters and a size gauge"""
+    lines: List[str] = []
+    for counter in ("hits", "misses", "evictions"):
+        metric = f"{prefix}_{name}_{counter}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {stats[counter]}")
+    metric = f"{prefix}_{name}_size"
+    lines.append(f"# TYPE {metric} gauge")
+    lines.append(f"{metric} {stats['size']}")
+    return "\n".join(lines) + "\n"
+
+
+class Instrumentation:
+    """
+    Fan-out of stage timings and counters to the configured sinks.
+
+    With no sinks `enabled` is False and every method returns immediately,
+    so callers can leave instrumentation calls in the hot path (guard any
+    extra work they do only for metrics with `if metrics.enabled`).
+    """
+
+    def __init__(self, sinks: Optional[Sequence[Any]] = None):
+        self.sinks: List[Any] = list(sinks or [])
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.sinks)
+
+    def add_sink(self, sink: Any) -> None:
+        self.sinks.append(sink)
+
+    def observe(self, stage: str, duration_ms: float) -> None:
+        for sink in self.sinks:
+            sink.observe(stage, duration_ms)
+
+    def observe_many(self, durations: Dict[str, float]) -> None:
+        for sink in self.sinks:
+            for stage, duration_ms in durations.items():
+                sink.observe(stage, duration_ms)
+
+    def increment(self, name: str, value: int = 1) -> None:
+        for sink in self.sinks:
+            sink.increment(name, value)
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Time a block into `stage`; no clock reads when disabled"""
+        if not self.sinks:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, (time.perf_counter() - started) * 1000)
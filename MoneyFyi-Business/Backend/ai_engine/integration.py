@@ -1,6 +1,10 @@
 import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
 
 # AI Agents
 from data_normalizer_agent import DataNormalizerAgent
@@ -9,116 +13,461 @@ from cashflow_oracle import CashflowOracle
 from smartpayment_agent import SmartPaymentAgent
 from compliance_mate_agent import ComplianceMateAgent
 from insight_agent import InsightAgent
+from utr_index import UTRIndex, utr_fingerprint
+from velocity_index import VelocityIndex
+from purchase_index import PurchaseIndex
+from pipeline_dag import PipelineDAG
+from instrumentation import Instrumentation
+
+
+logger = logging.getLogger("moneyfyi.ai_engine.pipeline")
 
 
 class MoneyFyiAI:
 
-    def __init__(self):
+    def __init__(
+        self,
+        utr_index: Optional[UTRIndex] = None,
+        history_size: int = 1000,
+        max_workers: int = 4,
+        instrumentation: Optional[Instrumentation] = None,
+        cashflow_oracle: Optional[CashflowOracle] = None
+    ):
         self.normalizer = DataNormalizerAgent()
-        self.fraudguard = FraudGuardAgent()
-        self.cashflow_oracle = CashflowOracle()
-        self.smartpayment = SmartPaymentAgent()
+        self.fraudguard = FraudGuardAgent(utr_index=utr_index, history_size=history_size)
+        self.cashflow_oracle = cashflow_oracle if cashflow_oracle is not None else CashflowOracle()
+        self.smartpayment = SmartPaymentAgent(history_size=history_size)
         self.compliance = ComplianceMateAgent()
         self.insight = InsightAgent()
 
+        # Disabled (no sinks) unless the caller wires metrics in
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+
+        # Independent agents (FraudGuard, CashflowOracle, ComplianceMate) run
+        # concurrently on this pool; max_workers <= 1 runs stages inline
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self) -> Optional[ThreadPoolExecutor]:
+        if self.max_workers <= 1:
+            return None
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="moneyfyi-agent"
+                    )
+        return self._executor
+
+    def close(self) -> None:
+        """Shut down the agent thread pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
     def analyze_full(
         self,
         raw_transaction: Dict[str, Any],
         transaction_history: List[Dict[str, Any]],
         vendor_history: Dict[str, Any],
-        current_balance: float
+        current_balance: float,
+        tenant_id: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None,
+        timings: Optional[Dict[str, float]] = None,
+        duplicate_in_batch: bool = False
     ) -> Dict[str, Any]:
+        """
+        Run every agent over one transaction.
+
+        `context` is the output of `build_context` for the same history and
+        balance (or a subset of its keys); whatever it omits runs as part of
+        the pipeline. `timings` (stage -> ms) is accumulated into when given.
+        `duplicate_in_batch` marks a UTR already seen earlier in the same
+        batch (see analyze_batch).
+        """
+        pipeline = self._build_pipeline(
+            raw_transaction, transaction_history, vendor_history, current_balance, tenant_id,
+            duplicate_in_batch
+        )
+        results, durations = pipeline.run(self.executor, seed=_context_seed(context))
+        _merge_timings(timings, durations)
+        self._record_transaction(durations)
 
-        print(" Starting MoneyFyi Full Pipeline Analysis")
-
-        print(" Normalizing data...")
-        transaction = self.normalizer.normalize(raw_transaction)
+        return _assemble_result(results)
 
-        print(" Running FraudGuard...")
-        fraud_analysis = self.fraudguard.analyze_transaction(
-            transaction,
-            vendor_history,
-            transaction_history
+    async def analyze_full_async(
+        self,
+        raw_transaction: Dict[str, Any],
+        transaction_history: List[Dict[str, Any]],
+        vendor_history: Dict[str, Any],
+        current_balance: float,
+        tenant_id: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None,
+        timings: Optional[Dict[str, float]] = None
+    ) -> Dict[str, Any]:
+        """analyze_full for async callers; agents run on the pool, not the event loop"""
+        pipeline = self._build_pipeline(
+            raw_transaction, transaction_history, vendor_history, current_balance, tenant_id
         )
-
-        print("  Running CashflowOracle...")
-        cashflow_analysis = self.cashflow_oracle.predict(
-            transaction_history,
-            current_balance
+        results, durations = await pipeline.run_async(self.executor, seed=_context_seed(context))
+        _merge_timings(timings, durations)
+        self._record_transaction(durations)
+        return _assemble_result(results)
+
+    def _record_transaction(self, durations: Dict[str, float]) -> None:
+        metrics = self.instrumentation
+        if metrics.enabled:
+            metrics.observe_many(durations)
+            metrics.increment("transactions_analyzed")
+
+    def _build_pipeline(
+        self,
+        raw_transaction: Dict[str, Any],
+        transaction_history: List[Dict[str, Any]],
+        vendor_history: Dict[str, Any],
+        current_balance: float,
+        tenant_id: Optional[str],
+        duplicate_in_batch: bool = False
+    ) -> PipelineDAG:
+        """
+        Stage graph for one transaction. FraudGuard, CashflowOracle and
+        ComplianceMate only need the normalized transaction and history, so
+        they run side by side; SmartPayment and Insight wait on their outputs.
+        """
+        pipeline = PipelineDAG()
+        pipeline.add(
+            "normalize",
+            lambda: self.normalizer.normalize(raw_transaction)
         )
-
-        print("Running SmartPaymentAgent...")
-        payment_recommendation = self.smartpayment.recommend(
-            transaction,
-            fraud_analysis,
-            cashflow_analysis,
-            vendor_history
+        pipeline.add(
+            "cashflow",
+            lambda: self.cashflow_oracle.predict(transaction_history, current_balance)
         )
-
-        print(" Running ComplianceMateAgent...")
-        compliance_analysis = self.compliance.check_compliance(
-            transaction,
-            vendor_history,
-            transaction_history
+        pipeline.add(
+            "velocity_index",
+            lambda: VelocityIndex.from_transactions(transaction_history)
         )
-
-
-        print("  Running InsightAgent...")
-        final_insight = self.insight.generate(
-            fraud_analysis,
-            cashflow_analysis,
-            compliance_analysis,
-            payment_recommendation,
-            transaction
+        pipeline.add(
+            "fraudguard",
+            lambda transaction, velocity_index: self.fraudguard.analyze_transaction(
+                transaction,
+                vendor_history,
+                transaction_history,
+                tenant_id=tenant_id,
+                velocity_index=velocity_index,
+                duplicate_in_batch=duplicate_in_batch
+            ),
+            depends_on=("normalize", "velocity_index")
         )
-
-        result = {
-            "analysis_timestamp": datetime.now().isoformat(),
-
-            "normalized_transaction": transaction,
-
-            "fraud_analysis": fraud_analysis,
-            "cashflow_analysis": cashflow_analysis,
-            "payment_recommendation": payment_recommendation,
-            "compliance_analysis": compliance_analysis,
-
-            "final_insight": final_insight
-        }
-
-        print("\n COMPLETE — Full pipeline executed.\n")
-        return result
+        pipeline.add(
+            "purchase_index",
+            lambda: PurchaseIndex.from_transactions(transaction_history)
+        )
+        pipeline.add(
+            "compliance",
+            lambda transaction, purchase_index: self.compliance.check_compliance(
+                transaction,
+                vendor_history,
+                transaction_history,
+                purchase_index=purchase_index
+            ),
+            depends_on=("normalize", "purchase_index")
+        )
+        pipeline.add(
+            "smartpayment",
+            lambda transaction, fraud_analysis, cashflow_analysis: self.smartpayment.recommend(
+                transaction,
+                fraud_analysis,
+                cashflow_analysis,
+                vendor_history
+            ),
+            depends_on=("normalize", "fraudguard", "cashflow")
+        )
+        pipeline.add(
+            "insight",
+            lambda transaction, fraud_analysis, cashflow_analysis, compliance_analysis, payment_recommendation:
+                self.insight.generate(
+                    fraud_analysis,
+                    cashflow_analysis,
+                    compliance_analysis,
+                    payment_recommendation,
+                    transaction
+                ),
+            depends_on=("normalize", "fraudguard", "cashflow", "compliance", "smartpayment")
+        )
+        return pipeline
 
     def analyze_batch(
         self,
         raw_transactions: List[Dict[str, Any]],
         transaction_history: List[Dict[str, Any]],
         vendor_history: Dict[str, Any],
-        current_balance: float
+        current_balance: float,
+        tenant_id: Optional[str] = None,
+        workers: int = 1
     ) -> Dict[str, Any]:
-
-        print(f"\n Running batch analysis for {len(raw_transactions)} transactions...\n")
-
-        results = []
-        for i, raw_txn in enumerate(raw_transactions):
-            print(f"\n--- Processing Transaction {i+1}/{len(raw_transactions)} ---")
-            result = self.analyze_full(
-                raw_txn,
-                transaction_history,
-                vendor_history,
-                current_balance
+        """
+        Analyze many transactions against the same history and balance.
+
+        With workers > 1 the transactions are normalized here, split into
+        contiguous shards and run on a process pool. Each worker receives the
+        history/vendor data once (pool initializer) and builds its own
+        context; results come back in input order. UTRs repeated within the
+        batch are marked here, so as in a serial run the first occurrence is
+        checked against the UTR index and every later one is flagged,
+        whichever shard it lands in. That check needs the persistent (SQLite)
+        UTR index, which every worker opens. Stage timings are summed across
+        workers.
+        """
+        logger.debug("Running batch analysis for %d transactions (workers=%d)", len(raw_transactions), workers)
+
+        batch_started = time.perf_counter()
+        timings: Dict[str, float] = {}
+
+        if workers > 1 and len(raw_transactions) > 1:
+            results = self._analyze_batch_parallel(
+                raw_transactions, transaction_history, vendor_history,
+                current_balance, tenant_id, workers, timings
             )
-            results.append(result)
+        else:
+            context = self.build_context(transaction_history, current_balance, timings)
+
+            results = []
+            for raw_txn in raw_transactions:
+                result = self.analyze_full(
+                    raw_txn,
+                    transaction_history,
+                    vendor_history,
+                    current_balance,
+                    tenant_id=tenant_id,
+                    context=context,
+                    timings=timings
+                )
+                results.append(result)
+
+        total_ms = (time.perf_counter() - batch_started) * 1000
+        _merge_timings(timings, {"total": total_ms})
+
+        metrics = self.instrumentation
+        if metrics.enabled:
+            metrics.observe("batch", total_ms)
+            metrics.increment("batches_analyzed")
 
         return {
             "batch_size": len(results),
             "results": results,
+            "timings_ms": {stage: round(ms, 3) for stage, ms in timings.items()},
             "timestamp": datetime.now().isoformat()
         }
 
+    def _analyze_batch_parallel(
+        self,
+        raw_transactions: List[Dict[str, Any]],
+        transaction_history: List[Dict[str, Any]],
+        vendor_history: Dict[str, Any],
+        current_balance: float,
+        tenant_id: Optional[str],
+        workers: int,
+        timings: Dict[str, float]
+    ) -> List[Dict[str, Any]]:
+        store = self.fraudguard.utr_index.store
+        if store is None:
+            raise ValueError(
+                "analyze_batch(workers > 1) requires a persistent UTR index (UTRIndex(db_path=...)) "
+                "so duplicates are detected across worker processes"
+            )
+
+        # Normalize up front so in-batch UTR repeats are decided once, in
+        # input order, instead of by which worker reaches the store first
+        started = time.perf_counter()
+        normalized = [self.normalizer.normalize(raw_txn) for raw_txn in raw_transactions]
+        rows = list(zip(normalized, _batch_utr_repeats(normalized)))
+        _merge_timings(timings, {"normalize": (time.perf_counter() - started) * 1000})
+
+        workers = min(workers, len(rows))
+        # A few shards per worker keeps the pool busy when shard costs differ
+        shard_size = max(1, -(-len(rows) // (workers * 4)))
+        shards = [rows[start:start + shard_size] for start in range(0, len(rows), shard_size)]
+
+        init_args = (
+            store.db_path,
+            self.fraudguard.transaction_history.capacity,
+            transaction_history,
+            vendor_history,
+            current_balance,
+            tenant_id
+        )
+
+        results: List[Dict[str, Any]] = []
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_batch_worker,
+            initargs=init_args
+        ) as pool:
+            # map yields in submission order, so results keep the input order
+            for shard_results, shard_timings in pool.map(_analyze_shard, shards):
+                results.extend(shard_results)
+                _merge_timings(timings, shard_timings)
+
+        # Worker engines have no sinks: per-transaction stage timings stay in
+        # the summed batch timings, only the volume is counted here
+        if self.instrumentation.enabled:
+            self.instrumentation.increment("transactions_analyzed", len(results))
+
+        # Worker agents are discarded with the pool; fold their decisions into
+        # this engine's histories so summaries match a serial run
+        for result in results:
+            fraud = result["fraud_analysis"]
+            self.fraudguard.transaction_history.append(
+                result["normalized_transaction"],
+                category=fraud["risk_level"],
+                value=fraud["fraud_score"]
+            )
+            decision = result["payment_recommendation"]
+            self.smartpayment.decision_history.append(
+                decision,
+                category=decision["recommendation"],
+                value=decision["payment_safety_score"]
+            )
+        return results
+
+    def build_context(
+        self,
+        transaction_history: List[Dict[str, Any]],
+        current_balance: float,
+        timings: Optional[Dict[str, float]] = None
+    ) -> Dict[str, Any]:
+        """
+        History-dependent work shared by every transaction in a batch:
+        the cashflow forecast and the per-vendor velocity and purchase indexes.
+        """
+        pipeline = PipelineDAG()
+        pipeline.add("cashflow", lambda: self.cashflow_oracle.predict(transaction_history, current_balance))
+        pipeline.add("velocity_index", lambda: VelocityIndex.from_transactions(transaction_history))
+        pipeline.add("purchase_index", lambda: PurchaseIndex.from_transactions(transaction_history))
+        results, durations = pipeline.run(self.executor)
+        _merge_timings(timings, durations)
+        if self.instrumentation.enabled:
+            self.instrumentation.observe_many(durations)
+
+        return {
+            "cashflow_analysis": results["cashflow"],
+            "velocity_index": results["velocity_index"],
+            "purchase_index": results["purchase_index"]
+        }
+
     def save_to_file(self, analysis: Dict, filename: str):
         with open(filename, 'w') as f:
             json.dump(analysis, f, indent=2)
-        print(f"\n✓ Analysis saved to {filename}")
+        logger.info("Analysis saved to %s", filename)
+
+
+# Per-process state for analyze_batch(workers > 1), set by _init_batch_worker
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_batch_worker(
+    utr_index_path: str,
+    history_size: int,
+    transaction_history: List[Dict[str, Any]],
+    vendor_history: Dict[str, Any],
+    current_balance: float,
+    tenant_id: Optional[str]
+) -> None:
+    """Process-pool initializer: build one engine and one batch context per worker"""
+    engine = MoneyFyiAI(
+        utr_index=UTRIndex(db_path=utr_index_path),
+        history_size=history_size,
+        max_workers=1
+    )
+    timings: Dict[str, float] = {}
+    context = engine.build_context(transaction_history, current_balance, timings)
+    _worker_state.update(
+        engine=engine,
+        context=context,
+        context_timings=timings,
+        transaction_history=transaction_history,
+        vendor_history=vendor_history,
+        current_balance=current_balance,
+        tenant_id=tenant_id
+    )
+
+
+def _analyze_shard(shard: List[Tuple[Dict[str, Any], bool]]) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """Analyze (normalized transaction, UTR repeated earlier in the batch) rows"""
+    state = _worker_state
+    # Report the one-off context cost with the worker's first shard only
+    timings = state.pop("context_timings", None) or {}
+    results = [
+        state["engine"].analyze_full(
+            normalized,
+            state["transaction_history"],
+            state["vendor_history"],
+            state["current_balance"],
+            tenant_id=state["tenant_id"],
+            context=dict(state["context"], normalized_transaction=normalized),
+            timings=timings,
+            duplicate_in_batch=repeated
+        )
+        for normalized, repeated in shard
+    ]
+    return results, timings
+
+
+def _batch_utr_repeats(transactions: List[Dict[str, Any]]) -> List[bool]:
+    """Per transaction: whether its UTR already appeared earlier in the list"""
+    seen = set()
+    repeats = []
+    for txn in transactions:
+        utr = txn.get("utr")
+        if not utr:
+            repeats.append(False)
+            continue
+        fingerprint = utr_fingerprint(utr)
+        repeats.append(fingerprint in seen)
+        seen.add(fingerprint)
+    return repeats
+
+
+def _context_seed(context: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Map a build_context result onto the pipeline stages it precomputes.
+    A partial context (e.g. only "cashflow_analysis" from a CashflowState)
+    seeds just those stages.
+    """
+    if context is None:
+        return None
+    stages = {
+        "normalized_transaction": "normalize",
+        "cashflow_analysis": "cashflow",
+        "velocity_index": "velocity_index",
+        "purchase_index": "purchase_index"
+    }
+    return {stage: context[key] for key, stage in stages.items() if key in context}
+
+
+def _merge_timings(timings: Optional[Dict[str, float]], durations: Dict[str, float]) -> None:
+    if timings is not None:
+        for stage, ms in durations.items():
+            timings[stage] = timings.get(stage, 0.0) + ms
+
+
+def _assemble_result(results: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "analysis_timestamp": datetime.now().isoformat(),
+
+        "normalized_transaction": results["normalize"],
+
+        "fraud_analysis": results["fraudguard"],
+        "cashflow_analysis": results["cashflow"],
+        "payment_recommendation": results["smartpayment"],
+        "compliance_analysis": results["compliance"],
+
+        "final_insight": results["insight"]
+    }
 
 
 def load_sample_data():
@@ -162,5 +511,6 @@ if __name__ == "__main__":
     )
 
     ai.save_to_file(result, "sample_output.json")
+    ai.close()
 
     print("\n===== END =====\n")
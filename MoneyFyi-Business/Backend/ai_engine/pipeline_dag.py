@@ -0,0 +1,89 @@
+"""
+PipelineDAG - dependency-ordered execution of agent stages
+Part of MoneyFyi AI Intelligence Layer
+"""
+
+import time
+import asyncio
+from concurrent.futures import Executor, FIRST_COMPLETED, wait
+from typing import Dict, List, Any, Callable, Optional, Tuple
+
+
+class PipelineDAG:
+    """
+    Stages with explicit dependencies. Each stage is called with the results
+    of its dependencies (in declaration order) and may start as soon as those
+    are available, so independent agents run concurrently on an executor.
+
+    `run` / `run_async` return (results, durations_ms) keyed by stage name.
+    Stages already present in `seed` are treated as completed.
+    """
+
+    def __init__(self):
+        self._stages: Dict[str, Tuple[Callable[..., Any], Tuple[str, ...]]] = {}
+
+    def add(self, name: str, func: Callable[..., Any], depends_on: Tuple[str, ...] = ()) -> "PipelineDAG":
+        for dep in depends_on:
+            if dep not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self._stages[name] = (func, tuple(depends_on))
+        return self
+
+    def run(
+        self,
+        executor: Optional[Executor] = None,
+        seed: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """Run to completion; inline in declaration order when executor is None"""
+        results: Dict[str, Any] = dict(seed or {})
+        durations: Dict[str, float] = {}
+        pending = [name for name in self._stages if name not in results]
+
+        if executor is None:
+            for name in pending:
+                results[name], durations[name] = self._call(name, results)
+            return results, durations
+
+        running = {}
+        while pending or running:
+            for name in list(pending):
+                if all(dep in results for dep in self._stages[name][1]):
+                    pending.remove(name)
+                    running[executor.submit(self._call, name, results)] = name
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                results[name], durations[name] = future.result()
+        return results, durations
+
+    async def run_async(
+        self,
+        executor: Optional[Executor] = None,
+        seed: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """Same as run, but awaitable: stages run on the executor, never on the event loop"""
+        loop = asyncio.get_running_loop()
+        results: Dict[str, Any] = dict(seed or {})
+        durations: Dict[str, float] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(name: str) -> None:
+            deps = self._stages[name][1]
+            await asyncio.gather(*(tasks[dep] for dep in deps if dep in tasks))
+            results[name], durations[name] = await loop.run_in_executor(executor, self._call, name, results)
+
+        for name in self._stages:
+            if name not in results:
+                tasks[name] = asyncio.ensure_future(run_stage(name))
+        await asyncio.gather(*tasks.values())
+        return results, durations
+
+    def _call(self, name: str, results: Dict[str, Any]) -> Tuple[Any, float]:
+        func, deps = self._stages[name]
+        started = time.perf_counter()
+        value = func(*(results[dep] for dep in deps))
+        return value, (time.perf_counter() - started) * 1000
+
+    @property
+    def stages(self) -> List[str]:
+        return list(self._stages)
@@ -0,0 +1,138 @@
+"""
+PurchaseIndex - per-(vendor, financial year) running purchase totals
+Part of MoneyFyi AI Intelligence Layer
+"""
+
+from datetime import datetime
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+
+# Indian financial year runs April to March
+FY_START_MONTH = 4
+
+
+def financial_year(date_value: Any) -> Optional[int]:
+    """Starting calendar year of the financial year date_value falls in"""
+    if not date_value:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(date_value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return dt.year if dt.month >= FY_START_MONTH else dt.year - 1
+
+
+def _purchase(txn: Dict[str, Any]) -> Optional[Tuple[Tuple[Any, int], float]]:
+    """((vendor, fy), amount) for a dated debit, None for anything else"""
+    if txn.get('type', 'debit') != 'debit':
+        return None
+    fy = financial_year(txn.get('date'))
+    if fy is None:
+        return None
+    return (txn.get('vendor'), fy), abs(float(txn.get('amount') or 0))
+
+
+class PurchaseIndex:
+    """
+    Running debit total per (vendor, financial year), so aggregate TDS
+    thresholds (194C's ₹1L per year, 194Q's ₹50L) are a dict lookup instead
+    of a rescan of the vendor's history for every transaction.
+
+    Backfill from history with `from_transactions`, or seed it with totals
+    kept elsewhere (e.g. the vendor_purchase_totals table) via `from_totals`
+    and `add` / `remove` transactions as they arrive. Transactions carrying
+    an `id` are counted once however often they are added; ones without an
+    id are recognised by identity, so the same dict is never counted twice.
+    """
+
+    def __init__(self):
+        self._totals: Dict[Tuple[Any, int], float] = {}
+        self._counted: Dict[Any, Tuple[Tuple[Any, int], float]] = {}
+        # id-less transactions by id(); the dict is kept so its id() is not reused
+        self._anonymous: Dict[int, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_transactions(cls, transactions: Iterable[Dict[str, Any]]) -> "PurchaseIndex":
+        """Bulk build (backfills): one date parse per transaction"""
+        index = cls()
+        for txn in transactions:
+            index.add(txn)
+        return index
+
+    @classmethod
+    def from_totals(
+        cls,
+        totals: Dict[Tuple[Any, int], float],
+        included: Iterable[Dict[str, Any]] = ()
+    ) -> "PurchaseIndex":
+        """
+        Index over precomputed (vendor, fy) -> total debits. `included`
+        transactions are already part of those totals: they are marked as
+        counted without being added again.
+        """
+        index = cls()
+        index._totals = {key: float(total) for key, total in totals.items() if total}
+        for txn in included:
+            purchase = _purchase(txn)
+            if purchase is not None:
+                index._mark_counted(txn, purchase)
+        return index
+
+    def add(self, txn: Dict[str, Any]) -> bool:
+        """Count a transaction; False if it is not a dated debit or already counted"""
+        if self._is_counted(txn):
+            return False
+        purchase = _purchase(txn)
+        if purchase is None:
+            return False
+        key, amount = purchase
+        self._totals[key] = self._totals.get(key, 0.0) + amount
+        self._mark_counted(txn, purchase)
+        return True
+
+    def remove(self, txn_id: Any) -> bool:
+        """Uncount a transaction previously added with this id"""
+        purchase = self._counted.pop(txn_id, None)
+        if purchase is None:
+            return False
+        key, amount = purchase
+        remaining = self._totals[key] - amount
+        if remaining > 0.005:
+            self._totals[key] = remaining
+        else:
+            del self._totals[key]
+        return True
+
+    def total(self, vendor: Any, fy: int) -> float:
+        """Debits to vendor in the financial year starting in `fy`"""
+        return self._totals.get((vendor, fy), 0.0)
+
+    def total_with(self, txn: Dict[str, Any]) -> Optional[float]:
+        """
+        Financial-year total for the transaction's vendor with the
+        transaction itself counted exactly once; None if it is not a dated debit.
+        """
+        purchase = _purchase(txn)
+        if purchase is None:
+            return None
+        key, amount = purchase
+        total = self._totals.get(key, 0.0)
+        if not self._is_counted(txn):
+            total += amount
+        return total
+
+    def _is_counted(self, txn: Dict[str, Any]) -> bool:
+        txn_id = txn.get('id')
+        if txn_id is not None:
+            return txn_id in self._counted
+        return self._anonymous.get(id(txn)) is txn
+
+    def _mark_counted(self, txn: Dict[str, Any], purchase: Tuple[Tuple[Any, int], float]) -> None:
+        txn_id = txn.get('id')
+        if txn_id is not None:
+            self._counted[txn_id] = purchase
+        else:
+            self._anonymous[id(txn)] = txn
+
+    def __len__(self) -> int:
+        return len(self._totals)
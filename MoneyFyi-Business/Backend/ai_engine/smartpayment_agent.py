@@ -2,10 +2,12 @@ import json
 from datetime import datetime
 from typing import Dict, List, Any
 
+from history import BoundedHistory
+
 
 class SmartPaymentAgent:
-    def __init__(self):
-        self.decision_history = []
+    def __init__(self, history_size: int = 1000):
+        self.decision_history = BoundedHistory(history_size)
     
     def recommend(
         self,
@@ -141,7 +143,11 @@ class SmartPaymentAgent:
             "timestamp": datetime.now().isoformat()
         }
         
-        self.decision_history.append(decision)
+        self.decision_history.append(
+            decision,
+            category=decision['recommendation'],
+            value=decision['payment_safety_score']
+        )
         
         return decision
     
@@ -239,16 +245,17 @@ class SmartPaymentAgent:
         else:
             return "medium"  
     def get_summary(self) -> Dict:
-        """summary of all recommendations made"""
-        if not self.decision_history:
+        """summary of all recommendations made (O(1), from running aggregates)"""
+        history = self.decision_history
+        if not history:
             return {"total_decisions": 0}
         
-        total = len(self.decision_history)
-        pay_full = sum(1 for d in self.decision_history if d['recommendation'] == 'PAY_FULL')
-        pay_partial = sum(1 for d in self.decision_history if d['recommendation'] == 'PAY_PARTIALLY')
-        avoid = sum(1 for d in self.decision_history if d['recommendation'] == 'AVOID')
+        total = history.total
+        pay_full = history.count('PAY_FULL')
+        pay_partial = history.count('PAY_PARTIALLY')
+        avoid = history.count('AVOID')
         
-        avg_score = sum(d['payment_safety_score'] for d in self.decision_history) / total
+        avg_score = history.mean
         
         return {
             "total_decisions": total,
@@ -0,0 +1,169 @@
+"""
+TextScanner - precompiled field extraction for unstructured transaction text
+Part of MoneyFyi AI Intelligence Layer
+"""
+
+import re
+from typing import Dict, List, Any, Optional, Sequence
+
+
+VENDOR_LABEL = re.compile(r"(?:to|payee|vendor|merchant)[:|\s]+([A-Za-z\s&.]+)", re.IGNORECASE)
+VENDOR_MS = re.compile(r"M/s\.?\s+([A-Za-z\s&.]+)", re.IGNORECASE)
+VENDOR_COMPANY = re.compile(r"([A-Z][a-z]+(?:\s+[A-Z][a-z]+){1,3})\s+(?:Pvt|Ltd|LLP)", re.IGNORECASE)
+
+DATE_PATTERNS = (
+    re.compile(r'\d{2}[-/]\d{2}[-/]\d{4}', re.IGNORECASE),  # DD-MM-YYYY or DD/MM/YYYY
+    re.compile(r'\d{4}[-/]\d{2}[-/]\d{2}', re.IGNORECASE),  # YYYY-MM-DD
+    re.compile(r'\d{2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{4}', re.IGNORECASE),
+)
+
+GST_RATE = re.compile(r'GST\s*[@:]\s*(\d+)%', re.IGNORECASE)
+GST_AMOUNT = re.compile(r'GST[:\s]*(?:Rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)', re.IGNORECASE)
+GSTIN = re.compile(r'\d{2}[A-Z]{5}\d{4}[A-Z]{1}[A-Z\d]{1}[Z]{1}[A-Z\d]{1}')
+UTR = re.compile(r'UTR[A-Za-z0-9]{6,}|[A-Z0-9]{12,}')
+
+# Same captures as `(?:Rs\.?|₹|INR)?\s*(<digits>)`: the optional currency
+# prefix never overlaps a digit, so dropping it leaves findall unchanged
+AMOUNT_DIGITS = re.compile(r'\d{1,3}(?:,\d{3})*(?:\.\d{2})?')
+
+# Anything that is not a credit is treated as a debit
+CREDIT_WORDS = ("received", "credit", "deposited", "cr")
+
+CATEGORY_KEYWORDS = (
+    ("supplies", ("supplies", "material", "goods", "inventory")),
+    ("salary", ("salary", "wages", "payroll", "compensation")),
+    ("rent", ("rent", "lease")),
+    ("utilities", ("electricity", "water", "internet", "telecom")),
+    ("services", ("service", "consulting", "professional")),
+    ("equipment", ("equipment", "machinery", "tools")),
+)
+
+
+def _occurrences(haystack: str, needles: Sequence[str]) -> List[int]:
+    """Sorted start offsets of every needle in haystack"""
+    positions = []
+    for needle in needles:
+        pos = haystack.find(needle)
+        while pos != -1:
+            positions.append(pos)
+            pos = haystack.find(needle, pos + 1)
+    positions.sort()
+    return positions
+
+
+def _match_at_anchors(
+    pattern: "re.Pattern",
+    text: str,
+    lowered: Optional[str],
+    anchors: Sequence[str]
+) -> Optional["re.Match"]:
+    """
+    `pattern.search(text)` for a case-insensitive pattern that must start
+    with one of `anchors`: only offsets where an anchor occurs are tried.
+    """
+    if lowered is None:
+        return pattern.search(text)
+    for pos in _occurrences(lowered, anchors):
+        match = pattern.match(text, pos)
+        if match:
+            return match
+    return None
+
+
+class TextScanner:
+    """
+    Extracts every field `DataNormalizerAgent` reads from OCR / PDF / email
+    text in one call, sharing a single lowercase copy of the text.
+
+    All patterns are compiled once at import. Patterns that begin with a
+    keyword ("to:", "M/s", "GST") are only attempted where that keyword
+    occurs instead of at every offset, and keyword dictionaries are checked
+    against the shared lowercase copy. Results are identical to searching
+    each pattern over the whole text.
+    """
+
+    def __init__(self, supported_modes: Sequence[str]):
+        self.supported_modes = tuple(supported_modes)
+
+    def scan(self, text: str) -> Dict[str, Any]:
+        """Return vendor, amount, utr, raw date string, mode, type, gst and category"""
+        lowered = text.lower()
+        # Anchor offsets are only valid if lowercasing kept every character
+        # at its position (a few non-ASCII characters expand)
+        anchored = lowered if len(lowered) == len(text) else None
+
+        return {
+            "vendor": self._vendor(text, lowered, anchored),
+            "amount": self._amount(text),
+            "utr": self._utr(text),
+            "date": self._date(text),
+            "mode": self._mode(text),
+            "type": self._type(lowered),
+            "gst": self._gst(text, anchored),
+            "category": self._category(lowered)
+        }
+
+    def _vendor(self, text: str, lowered: str, anchored: Optional[str]) -> str:
+        match = _match_at_anchors(VENDOR_LABEL, text, anchored, ("to", "payee", "vendor", "merchant"))
+        if match is None:
+            match = _match_at_anchors(VENDOR_MS, text, anchored, ("m/s",))
+        if match is None:
+            # A company match has to end at one of the suffixes, so the scan
+            # can stop after the last one (and is skipped when there is none)
+            last_suffix = max(lowered.rfind(suffix) for suffix in ("pvt", "ltd", "llp"))
+            if last_suffix != -1:
+                endpos = last_suffix + 3 if anchored is not None else len(text)
+                match = VENDOR_COMPANY.search(text, 0, endpos)
+        return match.group(1).strip() if match else "Unknown Vendor"
+
+    def _amount(self, text: str) -> float:
+        matches = AMOUNT_DIGITS.findall(text)
+        if not matches:
+            return 0.0
+        return max(float(m.replace(',', '')) for m in matches)
+
+    def _utr(self, text: str) -> Optional[str]:
+        match = UTR.search(text)
+        return match.group(0) if match else None
+
+    def _date(self, text: str) -> Optional[str]:
+        for pattern in DATE_PATTERNS:
+            match = pattern.search(text)
+            if match:
+                return match.group(0)
+        return None
+
+    def _mode(self, text: str) -> str:
+        text_upper = text.upper()
+        for mode in self.supported_modes:
+            if mode in text_upper:
+                return mode
+        return "BANK_TRANSFER"
+
+    def _type(self, lowered: str) -> str:
+        if any(word in lowered for word in CREDIT_WORDS):
+            return "credit"
+        return "debit"
+
+    def _gst(self, text: str, anchored: Optional[str]) -> Optional[Dict[str, Any]]:
+        gst_info: Dict[str, Any] = {}
+
+        gstin_match = GSTIN.search(text)
+        if gstin_match:
+            gst_info["gstin"] = gstin_match.group(0)
+
+        rate_match = _match_at_anchors(GST_RATE, text, anchored, ("gst",))
+        if rate_match:
+            gst_info["rate"] = int(rate_match.group(1))
+
+        amount_match = _match_at_anchors(GST_AMOUNT, text, anchored, ("gst",))
+        if amount_match:
+            gst_info["amount"] = float(amount_match.group(1).replace(',', ''))
+
+        return gst_info if gst_info else None
+
+    def _category(self, lowered: str) -> Optional[str]:
+        for category, keywords in CATEGORY_KEYWORDS:
+            if any(kw in lowered for kw in keywords):
+                return category
+        return None
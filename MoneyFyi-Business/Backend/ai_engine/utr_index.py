@@ -0,0 +1,250 @@
+"""
+UTRIndex - bounded, persistent duplicate-UTR detection for FraudGuard
+Part of MoneyFyi AI Intelligence Layer
+"""
+
+import os
+import math
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, List, Any, Optional
+
+from ttl_cache import TTLCache
+
+
+DEFAULT_TENANT = "_default"
+
+
+def utr_fingerprint(utr: str) -> int:
+    """
+    Stable signed 64-bit fingerprint of a UTR.
+
+    Used as the storage key so every tier holds fixed-size integers instead of
+    strings, and so columnar callers can hash UTRs up front.
+    """
+    digest = hashlib.blake2b(str(utr).strip().encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 64-bit fingerprints (double hashing)"""
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.001):
+        bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_bits = max(bits, 8)
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, fingerprint: int):
+        value = fingerprint & 0xFFFFFFFFFFFFFFFF
+        h1 = value & 0xFFFFFFFF
+        h2 = (value >> 32) | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, fingerprint: int) -> None:
+        for pos in self._positions(fingerprint):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, fingerprint: int) -> bool:
+        for pos in self._positions(fingerprint):
+            if not self.bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+class SQLiteUTRStore:
+    """
+    On-disk UTR tier. One row per (tenant, fingerprint) in a WITHOUT ROWID
+    B-tree, opened in WAL mode so several uvicorn workers can share the file.
+    """
+
+    def __init__(self, db_path: str):
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS utr_index ("
+            " tenant TEXT NOT NULL,"
+            " fingerprint INTEGER NOT NULL,"
+            " first_seen REAL NOT NULL,"
+            " PRIMARY KEY (tenant, fingerprint)"
+            ") WITHOUT ROWID"
+        )
+        self._lock = threading.Lock()
+
+    def add(self, tenant: str, fingerprint: int) -> bool:
+        """Insert the key; returns True if it was new, False if already stored"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO utr_index (tenant, fingerprint, first_seen) VALUES (?, ?, ?)",
+                (tenant, fingerprint, time.time())
+            )
+            return cursor.rowcount == 1
+
+    def add_many(self, tenant: str, fingerprints: List[int]) -> List[bool]:
+        """Insert many keys in one write transaction; per-key True if it was new"""
+        now = time.time()
+        results = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for fingerprint in fingerprints:
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO utr_index (tenant, fingerprint, first_seen) VALUES (?, ?, ?)",
+                        (tenant, fingerprint, now)
+                    )
+                    results.append(cursor.rowcount == 1)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return results
+
+    def contains(self, tenant: str, fingerprint: int) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM utr_index WHERE tenant = ? AND fingerprint = ?",
+                (tenant, fingerprint)
+            ).fetchone()
+        return row is not None
+
+    def purge_older_than(self, seconds: float) -> int:
+        """Delete keys first seen more than `seconds` ago (retention policy)"""
+        cutoff = time.time() - seconds
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM utr_index WHERE first_seen < ?", (cutoff,))
+            return cursor.rowcount
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM utr_index").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class UTRIndex:
+    """
+    Tiered UTR index scoped per tenant (user/business account).
+
+    Tiers:
+    - recent: in-memory LRU/TTL of recently seen keys (exact, fast positives)
+    - bloom: fixed-size Bloom filter in front of the store (fast negatives)
+    - store: optional SQLite file shared by all workers (exact, durable)
+
+    Memory stays flat regardless of how many UTRs have been recorded: the LRU
+    and the Bloom filter are both bounded, and the full key set lives on disk.
+    The INSERT into the store is the authoritative check, so a UTR recorded by
+    another worker is still reported as a duplicate. The Bloom filter lets new
+    UTRs go straight to a single INSERT and lets repeats be confirmed with a
+    read instead of contending for the SQLite write lock.
+
+    Without a store the index is memory-only and forgets UTRs that age out of
+    the LRU; it never reports a false duplicate.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        memory_capacity: int = 100_000,
+        ttl_seconds: Optional[float] = 24 * 3600,
+        bloom_capacity: int = 1_000_000,
+        bloom_error_rate: float = 0.001
+    ):
+        self.recent = TTLCache(maxsize=memory_capacity, ttl_seconds=ttl_seconds)
+        self.store = SQLiteUTRStore(db_path) if db_path else None
+        self.bloom = BloomFilter(bloom_capacity, bloom_error_rate) if self.store is not None else None
+        self._lock = threading.Lock()
+        self._tenant_salts: Dict[str, int] = {}
+
+    def check_and_add(self, utr: str, tenant_id: Optional[str] = None) -> bool:
+        """Record a UTR and return True if it had already been seen for this tenant"""
+        return self.check_and_add_fingerprint(utr_fingerprint(utr), tenant_id)
+
+    def check_and_add_fingerprint(self, fingerprint: int, tenant_id: Optional[str] = None) -> bool:
+        """Same as check_and_add for callers that already hashed the UTR"""
+        tenant = str(tenant_id) if tenant_id else DEFAULT_TENANT
+        key = (tenant, fingerprint)
+
+        if self.recent.get(key, False):
+            return True
+
+        seen = False
+        if self.store is not None:
+            bloom_key = fingerprint ^ self._tenant_salt(tenant)
+            with self._lock:
+                maybe_seen = bloom_key in self.bloom
+            if maybe_seen and self.store.contains(tenant, fingerprint):
+                seen = True
+            else:
+                seen = not self.store.add(tenant, fingerprint)
+            with self._lock:
+                self.bloom.add(bloom_key)
+
+        self.recent.set(key, True)
+        return seen
+
+    def check_and_add_many(self, fingerprints: List[int], tenant_id: Optional[str] = None) -> List[bool]:
+        """Bulk check_and_add_fingerprint; the store is written in a single transaction"""
+        tenant = str(tenant_id) if tenant_id else DEFAULT_TENANT
+        seen = [False] * len(fingerprints)
+        pending = []
+        for i, fingerprint in enumerate(fingerprints):
+            if self.recent.get((tenant, fingerprint), False):
+                seen[i] = True
+            else:
+                pending.append(i)
+
+        if self.store is not None and pending:
+            inserted = self.store.add_many(tenant, [fingerprints[i] for i in pending])
+            salt = self._tenant_salt(tenant)
+            with self._lock:
+                for i, was_new in zip(pending, inserted):
+                    seen[i] = not was_new
+                    self.bloom.add(fingerprints[i] ^ salt)
+
+        for i in pending:
+            self.recent.set((tenant, fingerprints[i]), True)
+        return seen
+
+    def contains(self, utr: str, tenant_id: Optional[str] = None) -> bool:
+        """Read-only membership test (does not record the UTR)"""
+        tenant = str(tenant_id) if tenant_id else DEFAULT_TENANT
+        fingerprint = utr_fingerprint(utr)
+
+        if self.recent.get((tenant, fingerprint), False):
+            return True
+        if self.store is not None:
+            return self.store.contains(tenant, fingerprint)
+        return False
+
+    def purge_older_than(self, seconds: float) -> int:
+        """Apply a retention window to the on-disk tier"""
+        return self.store.purge_older_than(seconds) if self.store is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "recent": self.recent.stats(),
+            "bloom_bits": self.bloom.num_bits if self.bloom is not None else 0,
+            "store_path": self.store.db_path if self.store is not None else None
+        }
+
+    def close(self) -> None:
+        if self.store is not None:
+            self.store.close()
+
+    def _tenant_salt(self, tenant: str) -> int:
+        salt = self._tenant_salts.get(tenant)
+        if salt is None:
+            salt = utr_fingerprint(f"tenant:{tenant}")
+            if len(self._tenant_salts) < 100_000:
+                self._tenant_salts[tenant] = salt
+        return salt
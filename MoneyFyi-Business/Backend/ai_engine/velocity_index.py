@@ -0,0 +1,67 @@
+"""
+VelocityIndex - per-vendor sorted timestamps for sliding-window counts
+Part of MoneyFyi AI Intelligence Layer
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Iterable, Optional
+
+
+def parse_epoch(date_value: Any) -> Optional[float]:
+    """Parse an ISO 8601 date/datetime into UTC epoch seconds (naive = UTC)"""
+    if not date_value:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(date_value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class VelocityIndex:
+    """
+    Transactions grouped by vendor with pre-parsed epoch timestamps kept in
+    sorted order, so "how many payments to this vendor in the last hour" is
+    two bisects instead of a scan over every transaction.
+
+    Build once per batch with `from_transactions`, or keep one around and
+    `add` to it as transactions arrive.
+    """
+
+    def __init__(self):
+        self._times: Dict[str, List[float]] = {}
+
+    @classmethod
+    def from_transactions(cls, transactions: Iterable[Dict[str, Any]]) -> "VelocityIndex":
+        """Bulk build: one parse per transaction, one sort per vendor"""
+        index = cls()
+        times = index._times
+        for txn in transactions:
+            ts = parse_epoch(txn.get('date'))
+            if ts is None:
+                continue
+            times.setdefault(txn.get('vendor'), []).append(ts)
+        for vendor_times in times.values():
+            vendor_times.sort()
+        return index
+
+    def add(self, vendor: str, date_value: Any) -> None:
+        """Insert a single transaction, keeping the vendor's timestamps sorted"""
+        ts = parse_epoch(date_value)
+        if ts is not None:
+            insort(self._times.setdefault(vendor, []), ts)
+
+    def count(self, vendor: str, at_epoch: float, window_seconds: float) -> int:
+        """Number of transactions to vendor within [at - window, at]"""
+        vendor_times = self._times.get(vendor)
+        if not vendor_times:
+            return 0
+        lo = bisect_left(vendor_times, at_epoch - window_seconds)
+        hi = bisect_right(vendor_times, at_epoch)
+        return hi - lo
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._times.values())
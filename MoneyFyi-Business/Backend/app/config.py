@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Literal
+from typing import Dict, Literal, Optional
 
 from pydantic import AnyHttpUrl, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -28,13 +28,27 @@ class Settings(BaseSettings):
     
     # AI Configuration
     gemini_api_key: str = Field(..., alias="GEMINI_API_KEY")
+    ai_history_size: int = Field(1000, description="Records each AI agent keeps in its in-memory history", alias="AI_HISTORY_SIZE")
+    ai_max_workers: int = Field(4, description="Threads used to run independent AI agents concurrently (1 = serial)", alias="AI_MAX_WORKERS")
+    ai_batch_workers: int = Field(1, description="Processes used by batch analysis (1 = in-process)", alias="AI_BATCH_WORKERS")
+    ai_metrics_enabled: bool = Field(False, description="Collect AI pipeline stage timings and counters (exposed at /metrics)", alias="AI_METRICS_ENABLED")
+    cashflow_aggregation: Literal["calendar", "rows"] = Field("calendar", description="Weekly averages over the last 28 days (calendar) or the last 28 transactions per side (rows, the pre-calendar behaviour)", alias="CASHFLOW_AGGREGATION")
+    cashflow_cache_size: int = Field(1024, description="Cashflow forecasts kept in the in-process result cache", alias="CASHFLOW_CACHE_SIZE")
+    cashflow_cache_ttl_seconds: float = Field(300, description="Seconds a cached cashflow forecast stays valid", alias="CASHFLOW_CACHE_TTL_SECONDS")
     
+    # Fraud detection
+    utr_index_path: Optional[str] = Field("utr_index.sqlite3", description="SQLite file for the shared duplicate-UTR index (empty for memory-only)", alias="UTR_INDEX_PATH")
+
     # Notifications
     n8n_webhook_url: str = Field("https://n8n.example.com/webhook/alert", alias="N8N_WEBHOOK_URL")
     
     # Encryption
     encryption_key: str = Field(..., description="Base64-encoded AES-256 key", alias="ENCRYPTION_KEY")
     key_version: str = Field("v1", description="Encryption key version", alias="KEY_VERSION")
+    encryption_keys: Dict[str, str] = Field(default_factory=dict, description="Key encryption keys by version, as a JSON object of base64 AES-256 keys (ENCRYPTION_KEY is used for KEY_VERSION when missing here)", alias="ENCRYPTION_KEYS")
+    data_key_cache_size: int = Field(1024, description="Unwrapped per-file data keys kept in memory", alias="DATA_KEY_CACHE_SIZE")
+    key_rotation_batch_size: int = Field(500, description="Rows rewrapped per batch by the key rotation job", alias="KEY_ROTATION_BATCH_SIZE")
+    key_rotation_on_startup: bool = Field(True, description="Rewrap data keys onto KEY_VERSION in the background at startup when ENCRYPTION_KEYS holds older versions", alias="KEY_ROTATION_ON_STARTUP")
     encrypted_bucket_name: str = Field("encrypted-files", description="Supabase bucket for encrypted files", alias="ENCRYPTED_BUCKET_NAME")
 
 
@@ -7,7 +7,7 @@ from typing import Any, AsyncIterator, Dict
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from .config import settings
 
@@ -22,6 +22,8 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     """Application lifespan hook for startup and shutdown events."""
 
     from .database import check_database_health  # Local import to avoid circular dependencies
+    from .tasks.key_rotation import start_key_rotation
+    from .services.encrypted_download_service import close_encrypted_download_service
 
     logger.info("Starting MoneyFyi backend in %s mode", settings.environment)
 
@@ -31,8 +33,13 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     else:
         logger.error("Supabase database connection failed")
 
+    key_rotation = start_key_rotation()
+
     yield
 
+    if key_rotation is not None and not key_rotation.done():
+        key_rotation.cancel()
+    await close_encrypted_download_service()
     logger.info("Shutting down MoneyFyi backend")
 
 
@@ -64,6 +71,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Needed by browser clients reading ranged file downloads
+    expose_headers=["Content-Range", "Accept-Ranges", "Content-Disposition"],
 )
 
 
@@ -98,6 +107,21 @@ async def health_check() -> Dict[str, Any]:
     return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
 
 
+@app.get("/metrics", tags=["health"], response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """AI pipeline metrics in Prometheus text format (requires AI_METRICS_ENABLED)."""
+
+    from .services.ai_service import ai_service, cache_prometheus_text
+
+    if ai_service.metrics is None:
+        return PlainTextResponse("AI metrics are disabled\n", status_code=404)
+
+    cache = ai_service.engine.cashflow_oracle.cache_stats()
+    return PlainTextResponse(
+        ai_service.metrics.prometheus_text() + cache_prometheus_text("cashflow_cache", cache)
+    )
+
+
 __all__ = ["app"]
 
 
@@ -1,14 +1,17 @@
 """
 Encrypted transaction API endpoints
 """
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Header
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
 from ..dependencies import get_user_id
 from ..services.encrypted_upload_service import get_encrypted_upload_service
 from ..services.encrypted_download_service import get_encrypted_download_service
+from ..services.crypto_service import get_encryption_manager
 from ..database import get_supabase
 
 router = APIRouter(prefix="/encrypted-transactions", tags=["Encrypted Transactions"])
@@ -17,6 +20,7 @@ router = APIRouter(prefix="/encrypted-transactions", tags=["Encrypted Transactio
 # Response models
 class UploadResponse(BaseModel):
     transaction_id: str
+    transaction_count: int = 1
     status: str
     message: str
 
@@ -33,6 +37,19 @@ class DownloadResponse(BaseModel):
     created_at: str
 
 
+class TransactionDetailResponse(BaseModel):
+    transaction_id: str
+    filename: str
+    mime_type: str
+    file_size_bytes: Optional[int] = None
+    normalized_json: Dict[str, Any]
+    vendor: str
+    amount: float
+    transaction_date: str
+    transaction_type: str
+    created_at: str
+
+
 class TransactionListItem(BaseModel):
     id: str
     vendor_name: str
@@ -41,6 +58,7 @@ class TransactionListItem(BaseModel):
     transaction_type: str
     original_filename: str
     created_at: str
+    normalized_json: Optional[Dict[str, Any]] = None
 
 
 class TransactionListResponse(BaseModel):
@@ -68,7 +86,39 @@ async def upload_encrypted_transaction(
     return await service.upload_and_encrypt(file, user_id)
 
 
-@router.get("/{transaction_id}/download", response_model=DownloadResponse)
+@router.get("/{transaction_id}", response_model=TransactionDetailResponse)
+async def get_encrypted_transaction(
+    transaction_id: str,
+    user_id: str = Depends(get_user_id)
+):
+    """Decrypted normalized JSON and metadata (the file is served by /file)"""
+    service = get_encrypted_download_service()
+    return await service.get_details(transaction_id, user_id)
+
+
+@router.get("/{transaction_id}/file")
+async def stream_encrypted_transaction_file(
+    transaction_id: str,
+    user_id: str = Depends(get_user_id),
+    range_header: Optional[str] = Header(None, alias="Range")
+):
+    """
+    Stream the decrypted original file as binary
+    
+    Supports single-range `Range: bytes=...` requests (206 Partial Content);
+    only the encrypted chunks covering the range are read from storage.
+    """
+    service = get_encrypted_download_service()
+    status_code, headers, body = await service.open_file_stream(transaction_id, user_id, range_header)
+    return StreamingResponse(
+        body,
+        status_code=status_code,
+        headers=headers,
+        media_type=headers.get("Content-Type")
+    )
+
+
+@router.get("/{transaction_id}/download", response_model=DownloadResponse, deprecated=True)
 async def download_encrypted_transaction(
     transaction_id: str,
     user_id: str = Depends(get_user_id)
@@ -80,28 +130,55 @@ async def download_encrypted_transaction(
     - Decrypted file (base64)
     - Decrypted normalized JSON
     - Metadata
+    
+    Deprecated: use GET /{transaction_id} for the metadata and
+    GET /{transaction_id}/file for the binary file.
     """
     service = get_encrypted_download_service()
     return await service.download_and_decrypt(transaction_id, user_id)
 
 
+LIST_COLUMNS = "id, vendor_name, amount, transaction_date, transaction_type, original_filename, created_at"
+
+
 @router.get("/", response_model=TransactionListResponse)
 async def list_encrypted_transactions(
     user_id: str = Depends(get_user_id),
     limit: int = 50,
-    offset: int = 0
+    offset: int = 0,
+    include_normalized: bool = False
 ):
-    """List user's encrypted transactions (metadata only, not decrypted)"""
+    """
+    List user's encrypted transactions
+    
+    Metadata only by default. With include_normalized=true each item also
+    carries its decrypted normalized JSON (null if it cannot be decrypted),
+    decrypted for the whole page in one batch.
+    """
     supabase = get_supabase()
     
+    columns = LIST_COLUMNS
+    if include_normalized:
+        columns += ", encrypted_normalized_json, key_version, wrapped_data_key"
+    
     response = supabase.table("encrypted_transactions") \
-        .select("id, vendor_name, amount, transaction_date, transaction_type, original_filename, created_at") \
+        .select(columns) \
         .eq("user_id", user_id) \
         .order("created_at", desc=True) \
         .range(offset, offset + limit - 1) \
         .execute()
     
+    rows = response.data
+    if include_normalized and rows:
+        encrypted = [
+            (row.pop("key_version", None), row.pop("wrapped_data_key", None), row.pop("encrypted_normalized_json", None))
+            for row in rows
+        ]
+        normalized = await run_in_threadpool(get_encryption_manager().decrypt_json_batch, encrypted)
+        for row, value in zip(rows, normalized):
+            row["normalized_json"] = value
+    
     return {
-        "transactions": response.data,
-        "total": len(response.data)
+        "transactions": rows,
+        "total": len(rows)
     }
@@ -2,7 +2,7 @@ from typing import Any, List, Dict
 from uuid import UUID
 from datetime import datetime, timedelta
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from supabase import Client
 
 from ..database import get_supabase
@@ -69,34 +69,21 @@ async def get_executive_summary(
 
 @router.get("/cashflow")
 async def get_cashflow_forecast(
-    days: int = 30,
+    days: int = Query(30, ge=1, le=365, description="Forecast horizon in days"),
     user_id: UUID = Depends(get_current_user_id),
     supabase: Client = Depends(get_supabase)
 ) -> Dict[str, Any]:
     """
     Get cashflow forecast using the CashflowOracle agent.
+    Repeated requests with an unchanged history are served from the
+    oracle's result cache.
     """
-    # Fetch history for prediction
-    history = supabase.table("transactions")\
-        .select("*")\
-        .eq("user_id", str(user_id))\
-        .order("transaction_date", desc=True)\
-        .limit(100)\
-        .execute()
+    # Fetch only the date range the averaging window covers
+    mapped_history, history_start = ai_service.fetch_cashflow_history(supabase, str(user_id))
         
-    if not history.data:
+    if not mapped_history:
         return {"forecast": [], "status": "insufficient_data"}
         
-    # Map to AI engine format
-    mapped_history = []
-    for t in history.data:
-        mapped_history.append({
-            "date": t["transaction_date"],
-            "amount": t["debit"] if t["debit"] > 0 else t["credit"],
-            "type": "debit" if t["debit"] > 0 else "credit",
-            "vendor": t.get("vendor_name", "Unknown")
-        })
-        
     # We need to access the CashflowOracle directly or via a specific method in ai_service
     # Since ai_service exposes the engine, let's use that.
     # The engine has 'cashflow_oracle' attribute.
@@ -105,7 +92,10 @@ async def get_cashflow_forecast(
     
     forecast = ai_service.engine.cashflow_oracle.predict(
         mapped_history,
-        current_balance
+        current_balance,
+        horizon_days=days,
+        history_start=history_start,
+        user_id=str(user_id)
     )
     
     return forecast
@@ -1,7 +1,9 @@
 import sys
 import os
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
+
+from ..config import settings
 
 # Add the parent directory to sys.path to allow importing ai_engine
 # Assuming structure: Backend/app/services/ai_service.py -> Backend/ai_engine
@@ -11,25 +13,76 @@ if str(backend_root) not in sys.path:
 
 try:
     from ai_engine.integration import MoneyFyiAI
+    from ai_engine.utr_index import UTRIndex
+    from ai_engine.instrumentation import Instrumentation, HistogramSink, LoggingSink, cache_prometheus_text
+    from ai_engine.cashflow_state import CashflowState
+    from ai_engine.cashflow_oracle import CashflowOracle, fetched_window
+    from ai_engine.purchase_index import PurchaseIndex, financial_year
 except ImportError:
     # Fallback for when running from different contexts
     try:
         sys.path.append(os.path.join(os.getcwd(), "ai_engine"))
         from integration import MoneyFyiAI
+        from utr_index import UTRIndex
+        from instrumentation import Instrumentation, HistogramSink, LoggingSink, cache_prometheus_text
+        from cashflow_state import CashflowState
+        from cashflow_oracle import CashflowOracle, fetched_window
+        from purchase_index import PurchaseIndex, financial_year
     except ImportError:
         print("CRITICAL: Could not import ai_engine. Make sure it exists in the Backend directory.")
         raise
 
+# Row cap for "rows" aggregation, which needs the latest 28 of each side
+ROWS_MODE_HISTORY_LIMIT = 100
+# Row cap for "calendar" aggregation; a user with more transactions inside
+# the window gets averages over the most recent fully fetched days
+CALENDAR_MODE_HISTORY_LIMIT = 2000
+
+
+def map_history_row(t: Dict[str, Any]) -> Dict[str, Any]:
+    """transactions row -> AI engine history record"""
+    return {
+        "id": t["id"],
+        "date": t["transaction_date"],
+        "amount": t["debit"] if t["debit"] > 0 else t["credit"],
+        "type": "debit" if t["debit"] > 0 else "credit",
+        "vendor": t.get("vendor_name", "Unknown")
+    }
+
+
 class AIService:
     def __init__(self):
-        self.engine = MoneyFyiAI()
+        # Shared on-disk UTR index so duplicate detection survives restarts
+        # and is consistent across uvicorn workers
+        utr_index = UTRIndex(db_path=settings.utr_index_path) if settings.utr_index_path else None
+
+        # Pipeline metrics are off (zero-cost) unless AI_METRICS_ENABLED is set
+        self.metrics: Optional[HistogramSink] = None
+        instrumentation = Instrumentation()
+        if settings.ai_metrics_enabled:
+            self.metrics = HistogramSink()
+            instrumentation.add_sink(self.metrics)
+            instrumentation.add_sink(LoggingSink())
+
+        self.engine = MoneyFyiAI(
+            utr_index=utr_index,
+            history_size=settings.ai_history_size,
+            max_workers=settings.ai_max_workers,
+            instrumentation=instrumentation,
+            cashflow_oracle=CashflowOracle(
+                aggregation=settings.cashflow_aggregation,
+                cache_size=settings.cashflow_cache_size,
+                cache_ttl_seconds=settings.cashflow_cache_ttl_seconds
+            )
+        )
 
     def analyze_transaction(
         self,
         transaction: Dict[str, Any],
         transaction_history: List[Dict[str, Any]],
         vendor_history: Dict[str, Any],
-        current_balance: float
+        current_balance: float,
+        tenant_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Run the full AI analysis pipeline on a single transaction.
@@ -38,24 +91,86 @@ class AIService:
             raw_transaction=transaction,
             transaction_history=transaction_history,
             vendor_history=vendor_history,
-            current_balance=current_balance
+            current_balance=current_balance,
+            tenant_id=tenant_id
+        )
+
+    async def analyze_transaction_async(
+        self,
+        transaction: Dict[str, Any],
+        transaction_history: List[Dict[str, Any]],
+        vendor_history: Dict[str, Any],
+        current_balance: float,
+        tenant_id: Optional[str] = None,
+        cashflow_state: Optional["CashflowState"] = None,
+        purchase_index: Optional["PurchaseIndex"] = None
+    ) -> Dict[str, Any]:
+        """
+        Awaitable variant of analyze_transaction. Agents run on the engine's
+        thread pool so the event loop stays free while they work.
+        With `cashflow_state` the forecast comes from the incremental state
+        instead of re-scanning `transaction_history`; with `purchase_index`
+        the aggregate TDS checks use its financial-year totals instead of
+        totals over `transaction_history` alone.
+        """
+        context = {}
+        if cashflow_state is not None:
+            context["cashflow_analysis"] = self.engine.cashflow_oracle.predict_from_state(
+                cashflow_state, current_balance
+            )
+        if purchase_index is not None:
+            context["purchase_index"] = purchase_index
+        return await self.engine.analyze_full_async(
+            raw_transaction=transaction,
+            transaction_history=transaction_history,
+            vendor_history=vendor_history,
+            current_balance=current_balance,
+            tenant_id=tenant_id,
+            context=context or None
+        )
+
+    def fetch_cashflow_history(self, supabase, user_id: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        The user's transactions inside the cashflow averaging window (mapped
+        to engine fields, newest first) and the first day that window covers.
+
+        One query for the newest rows, capped at CALENDAR_MODE_HISTORY_LIMIT;
+        the WINDOW_DAYS window ending at the latest transaction is cut from
+        those rows in Python.
+        """
+        query = supabase.table("transactions").select("*").eq("user_id", user_id)
+        if self.engine.cashflow_oracle.aggregation == "rows":
+            response = query.order("transaction_date", desc=True).limit(ROWS_MODE_HISTORY_LIMIT).execute()
+            return [map_history_row(t) for t in response.data or []], None
+
+        response = query.order("transaction_date", desc=True).limit(CALENDAR_MODE_HISTORY_LIMIT).execute()
+        rows = response.data or []
+        count, history_start = fetched_window(
+            [t["transaction_date"] for t in rows],
+            truncated=len(rows) >= CALENDAR_MODE_HISTORY_LIMIT
         )
+        return [map_history_row(t) for t in rows[:count]], history_start
 
     def analyze_batch(
         self,
         transactions: List[Dict[str, Any]],
         transaction_history: List[Dict[str, Any]],
         vendor_history: Dict[str, Any],
-        current_balance: float
+        current_balance: float,
+        tenant_id: Optional[str] = None,
+        workers: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Run batch analysis on multiple transactions.
+        `workers` > 1 spreads the batch over that many processes.
         """
         return self.engine.analyze_batch(
             raw_transactions=transactions,
             transaction_history=transaction_history,
             vendor_history=vendor_history,
-            current_balance=current_balance
+            current_balance=current_balance,
+            tenant_id=tenant_id,
+            workers=workers if workers is not None else settings.ai_batch_workers
         )
 
 # Singleton instance
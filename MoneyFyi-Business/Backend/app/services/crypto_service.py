@@ -1,25 +1,312 @@
 """
 AES-256-GCM encryption service for MoneyFyi
 """
+import io
 import os
+import re
 import base64
 import json
+import struct
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Dict, Hashable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
 logger = logging.getLogger("moneyfyi.backend.crypto")
 
+# Chunked stream format:
+#   header = MAGIC | version (1 byte) | chunk size (uint32 BE) | nonce prefix (7 bytes)
+#   body   = AES-GCM(chunk) + 16-byte tag for each chunk of `chunk size`
+#            plaintext bytes (the last one may be shorter, or empty)
+# Chunk i is sealed with nonce = prefix | i (uint32 BE) | last-chunk flag and
+# the header as associated data, so reordered, truncated, extended or
+# re-framed streams fail authentication.
+STREAM_MAGIC = b"MFYE"
+STREAM_VERSION = 1
+STREAM_HEADER = struct.Struct(">4sBI7s")
+STREAM_NONCE_PREFIX_SIZE = 7
+STREAM_TAG_SIZE = 16
+DEFAULT_CHUNK_SIZE = 64 * 1024
 
-class EncryptionManager:
-    """AES-256-GCM encryption manager"""
+# Batch decrypt: each worker gets a slice of at least this many rows, so a
+# 50-row listing page splits three ways and anything under 32 rows runs inline
+BATCH_ROWS_PER_WORKER = 16
+BATCH_MAX_WORKERS = min(8, os.cpu_count() or 1)
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+MAX_STREAM_CHUNKS = 2 ** 32
+
+RANGE_PATTERN = re.compile(r"^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$")
+
+
+class RangeNotSatisfiable(ValueError):
+    """A `Range` that starts at or past the end of the file (HTTP 416)"""
+    
+    def __init__(self, size: int):
+        super().__init__(f"Requested range not satisfiable for {size} bytes")
+        self.size = size
+
+
+def is_chunked(blob_start: bytes) -> bool:
+    """True if a stored blob starts with the chunked stream header (legacy blobs are nonce + ciphertext)"""
+    return (
+        len(blob_start) >= STREAM_HEADER.size
+        and blob_start[:4] == STREAM_MAGIC
+        and blob_start[4] == STREAM_VERSION
+    )
+
+
+def read_header(header: bytes) -> int:
+    """Chunk size from a chunked stream header; ValueError if it is not one"""
+    magic, version, chunk_size, _ = STREAM_HEADER.unpack(header)
+    if magic != STREAM_MAGIC or version != STREAM_VERSION:
+        raise ValueError("Not a chunked encrypted stream")
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError("Invalid chunk size in stream header")
+    return chunk_size
+
+
+def ciphertext_range(chunk_size: int, plaintext_size: int, start: int, end: int) -> Tuple[int, int, int, int, bool]:
+    """
+    Map the plaintext byte range [start, end] (inclusive) onto the stored
+    chunked stream.
+    
+    Returns (first_chunk, cipher_start, cipher_end, skip, to_end): the chunks
+    covering the range occupy ciphertext bytes [cipher_start, cipher_end]
+    (inclusive), the first `skip` decrypted bytes precede `start`, and
+    `to_end` says whether the range includes the stream's last chunk.
+    """
+    sealed_size = chunk_size + STREAM_TAG_SIZE
+    chunk_count = max(1, -(-plaintext_size // chunk_size))
+    total = STREAM_HEADER.size + plaintext_size + chunk_count * STREAM_TAG_SIZE
+    first_chunk = start // chunk_size
+    last_chunk = end // chunk_size
+    cipher_start = STREAM_HEADER.size + first_chunk * sealed_size
+    cipher_end = min(STREAM_HEADER.size + (last_chunk + 1) * sealed_size, total) - 1
+    return first_chunk, cipher_start, cipher_end, start - first_chunk * chunk_size, last_chunk == chunk_count - 1
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) for a single-range `Range` header, None to serve
+    the whole file (no header, multiple ranges or unparseable syntax).
+    Raises RangeNotSatisfiable for a range outside the file.
+    """
+    if not range_header:
+        return None
+    match = RANGE_PATTERN.match(range_header)
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    first, last = match.group(1), match.group(2)
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        # Suffix range: the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+        if int(last) == 0:
+            start = size
+    if start >= size:
+        raise RangeNotSatisfiable(size)
+    return start, end
+
+
+def _chunk_nonce(prefix: bytes, index: int, last: bool) -> bytes:
+    return prefix + struct.pack(">I", index) + (b"\x01" if last else b"\x00")
+
+
+def _take_chunks(pending: bytearray, view: memoryview, size: int) -> Iterator:
+    """
+    Split `pending` + `view` into `size`-byte chunks, yielding every chunk
+    that is followed by more data and leaving the rest in `pending`.
+    Chunks fully inside `view` are yielded as zero-copy slices of it.
+    """
+    if pending:
+        if len(pending) + len(view) <= size:
+            pending += view
+            return
+        missing = size - len(pending)
+        pending += view[:missing]
+        view = view[missing:]
+        yield pending
+        pending.clear()
+    if not view:
+        return
+    full = (len(view) - 1) // size
+    for start in range(0, full * size, size):
+        yield view[start:start + size]
+    pending += view[full * size:]
+
+
+class StreamEncryptor:
+    """
+    Incremental encryptor for the chunked format: feed plaintext with
+    `update` and write out whatever it returns, then `finalize`. Holds at
+    most one chunk of plaintext at a time.
+    """
+
+    def __init__(self, aesgcm: AESGCM, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+            raise ValueError(f"chunk_size must be between 1 and {MAX_CHUNK_SIZE} bytes")
+        self.aesgcm = aesgcm
+        self.chunk_size = chunk_size
+        self.prefix = os.urandom(STREAM_NONCE_PREFIX_SIZE)
+        self.header = STREAM_HEADER.pack(STREAM_MAGIC, STREAM_VERSION, chunk_size, self.prefix)
+        self._buffer = bytearray()
+        self._index = 0
+        self._header_sent = False
+        self._finalized = False
+
+    def update(self, data) -> bytes:
+        """Encrypted bytes ready to write (may be empty); data is any bytes-like object"""
+        if self._finalized:
+            raise ValueError("Stream already finalized")
+        out = []
+        if not self._header_sent:
+            out.append(self.header)
+            self._header_sent = True
+        # Full chunks are sealed straight from `data`; only a partial tail is
+        # copied. The tail is held back because the last chunk is only known
+        # at finalize().
+        for chunk in _take_chunks(self._buffer, memoryview(data), self.chunk_size):
+            out.append(self._seal(chunk, last=False))
+        return b"".join(out)
+
+    def finalize(self) -> bytes:
+        """Seal the remaining plaintext as the last chunk"""
+        out = self.update(b"")
+        self._finalized = True
+        return out + self._seal(self._buffer, last=True)
+
+    def _seal(self, chunk, last: bool) -> bytes:
+        if self._index >= MAX_STREAM_CHUNKS:
+            raise ValueError("Stream too large for chunk counter")
+        sealed = self.aesgcm.encrypt(_chunk_nonce(self.prefix, self._index, last), chunk, self.header)
+        self._index += 1
+        return sealed
+
+
+class DecryptedReader(io.RawIOBase):
+    """Read-only file object over the plaintext of a chunked-format stream"""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._pending = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+class StreamDecryptor:
+    """
+    Incremental decryptor for the chunked format. `update` returns the
+    plaintext of every chunk completed so far; `finalize` raises unless the
+    last chunk was seen, so truncated streams are rejected.
+    
+    For a byte range of a stored stream, pass the already-read `header`, the
+    index of the first chunk being fed and whether the range runs to the
+    end of the stream (see `ciphertext_range`).
+    """
+
+    def __init__(self, aesgcm: AESGCM, header: Optional[bytes] = None,
+                 first_chunk: int = 0, to_end: bool = True):
+        self.aesgcm = aesgcm
+        self.header: Optional[bytes] = None
+        self.chunk_size = 0
+        self.prefix = b""
+        self.to_end = to_end
+        self._buffer = bytearray()
+        self._index = first_chunk
+        self._done = False
+        if header is not None:
+            self._read_header(bytes(header))
+
+    def update(self, data) -> bytes:
+        """Plaintext of every chunk completed so far; data is any bytes-like object"""
+        if self._done and data:
+            raise ValueError("Data after the final chunk")
+        view = memoryview(data)
+        if self.header is None:
+            missing = STREAM_HEADER.size - len(self._buffer)
+            self._buffer += view[:missing]
+            view = view[missing:]
+            if len(self._buffer) < STREAM_HEADER.size:
+                return b""
+            self._read_header(bytes(self._buffer))
+            self._buffer.clear()
+        # A full-size chunk followed by more data cannot be the last one
+        sealed_size = self.chunk_size + STREAM_TAG_SIZE
+        return b"".join([
+            self._open(chunk, last=False)
+            for chunk in _take_chunks(self._buffer, view, sealed_size)
+        ])
+
+    def finalize(self) -> bytes:
+        """Plaintext of the last chunk; raises if the stream was truncated"""
+        out = self.update(b"")
+        if self._done:
+            return out
+        if self.header is None:
+            raise ValueError("Truncated encrypted stream")
+        if not self.to_end and len(self._buffer) != self.chunk_size + STREAM_TAG_SIZE:
+            raise ValueError("Truncated encrypted range")
+        out += self._open(self._buffer, last=self.to_end)
+        self._buffer.clear()
+        self._done = True
+        return out
+
+    def _read_header(self, header: bytes) -> None:
+        self.chunk_size = read_header(header)
+        self.header = header
+        self.prefix = header[-STREAM_NONCE_PREFIX_SIZE:]
+
+    def _open(self, sealed, last: bool) -> bytes:
+        if self._index >= MAX_STREAM_CHUNKS:
+            raise ValueError("Too many chunks in stream")
+        plaintext = self.aesgcm.decrypt(_chunk_nonce(self.prefix, self._index, last), sealed, self.header)
+        self._index += 1
+        return plaintext
+
+
+class DataCipher:
+    """AES-256-GCM operations bound to one key (a data key or a legacy KEK)"""
     
-    def __init__(self, key_b64: str):
-        """Initialize with base64-encoded 256-bit key"""
-        self.key = base64.b64decode(key_b64)
-        if len(self.key) != 32:
+    def __init__(self, key: bytes):
+        if len(key) != 32:
             raise ValueError("Key must be 32 bytes (256 bits)")
-        self.aesgcm = AESGCM(self.key)
-        logger.info("Encryption manager initialized")
+        self.aesgcm = AESGCM(key)
+    
+    def encrypt_bytes(self, plaintext) -> bytes:
+        """
+        Encrypt any bytes-like object (bytes, bytearray, memoryview).
+        
+        Returns: nonce + ciphertext, binary
+        """
+        nonce = os.urandom(12)  # 96-bit nonce for GCM
+        return nonce + self.aesgcm.encrypt(nonce, plaintext, None)
+    
+    def decrypt_bytes(self, encrypted) -> bytes:
+        """
+        Decrypt binary nonce + ciphertext. Accepts any bytes-like object;
+        nonce and ciphertext are read through a memoryview, not copied.
+        """
+        view = memoryview(encrypted)
+        return self.aesgcm.decrypt(view[:12], view[12:], None)
     
     def encrypt(self, plaintext: bytes) -> str:
         """
@@ -27,10 +314,7 @@ class EncryptionManager:
         
         Returns: base64(nonce + ciphertext)
         """
-        nonce = os.urandom(12)  # 96-bit nonce for GCM
-        ciphertext = self.aesgcm.encrypt(nonce, plaintext, None)
-        encrypted = nonce + ciphertext
-        return base64.b64encode(encrypted).decode('utf-8')
+        return base64.b64encode(self.encrypt_bytes(plaintext)).decode('utf-8')
     
     def decrypt(self, encrypted_b64: str) -> bytes:
         """
@@ -39,11 +323,63 @@ class EncryptionManager:
         Args:
             encrypted_b64: base64(nonce + ciphertext)
         """
-        encrypted = base64.b64decode(encrypted_b64)
-        nonce = encrypted[:12]
-        ciphertext = encrypted[12:]
-        plaintext = self.aesgcm.decrypt(nonce, ciphertext, None)
-        return plaintext
+        return self.decrypt_bytes(base64.b64decode(encrypted_b64))
+    
+    def stream_encryptor(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> StreamEncryptor:
+        """Incremental encryptor for large files (chunked format)"""
+        return StreamEncryptor(self.aesgcm, chunk_size)
+    
+    def stream_decryptor(self, header: Optional[bytes] = None, first_chunk: int = 0,
+                         to_end: bool = True) -> StreamDecryptor:
+        """Incremental decryptor for the chunked format (or a chunk range of it)"""
+        return StreamDecryptor(self.aesgcm, header, first_chunk, to_end)
+    
+    async def encrypt_upload(self, source, sink: BinaryIO, read_size: int = DEFAULT_CHUNK_SIZE,
+                             max_size: Optional[int] = None) -> int:
+        """
+        Encrypt an async file (e.g. UploadFile) chunk by chunk into `sink`.
+        
+        Returns the plaintext size. Raises ValueError once more than
+        `max_size` bytes have been read.
+        """
+        encryptor = self.stream_encryptor()
+        size = 0
+        while True:
+            data = await source.read(read_size)
+            if not data:
+                break
+            size += len(data)
+            if max_size is not None and size > max_size:
+                raise ValueError(f"File exceeds {max_size} bytes")
+            sink.write(encryptor.update(data))
+        sink.write(encryptor.finalize())
+        return size
+    
+    def decrypt_chunks(self, source: BinaryIO, read_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield plaintext from a chunked-format file object, one chunk at a time"""
+        decryptor = self.stream_decryptor()
+        while True:
+            data = source.read(read_size)
+            if not data:
+                break
+            plaintext = decryptor.update(data)
+            if plaintext:
+                yield plaintext
+        plaintext = decryptor.finalize()
+        if plaintext:
+            yield plaintext
+    
+    def open_decrypted(self, source: BinaryIO) -> io.BufferedReader:
+        """Buffered file object yielding the plaintext of a chunked-format file"""
+        return io.BufferedReader(DecryptedReader(self.decrypt_chunks(source)), DEFAULT_CHUNK_SIZE)
+    
+    def decrypt_blob(self, blob: bytes) -> bytes:
+        """Decrypt a stored file blob in either the chunked or the legacy format"""
+        view = memoryview(blob)
+        if is_chunked(view[:STREAM_HEADER.size]):
+            decryptor = self.stream_decryptor()
+            return decryptor.update(view) + decryptor.finalize()
+        return self.decrypt_bytes(view)
     
     def encrypt_json(self, data: dict) -> str:
         """Encrypt a dictionary as JSON"""
@@ -52,8 +388,192 @@ class EncryptionManager:
     
     def decrypt_json(self, encrypted_b64: str) -> dict:
         """Decrypt and parse JSON"""
-        decrypted = self.decrypt(encrypted_b64)
-        return json.loads(decrypted.decode('utf-8'))
+        return json.loads(self.decrypt(encrypted_b64))
+
+
+class DataKeyCache:
+    """Thread-safe LRU of unwrapped data key ciphers, keyed by (key_version, wrapped key)"""
+    
+    def __init__(self, maxsize: int = 1024):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, DataCipher]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable) -> Optional[DataCipher]:
+        with self._lock:
+            cipher = self._data.get(key)
+            if cipher is not None:
+                self._data.move_to_end(key)
+            return cipher
+    
+    def set(self, key: Hashable, cipher: DataCipher) -> None:
+        with self._lock:
+            self._data[key] = cipher
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DataKey(NamedTuple):
+    """A fresh per-object data key: store `key_version` and `wrapped` with the object"""
+    key_version: str
+    wrapped: str
+    cipher: DataCipher
+
+
+class EncryptionManager(DataCipher):
+    """
+    AES-256-GCM encryption manager with envelope encryption.
+    
+    Every stored object gets its own random data key (DEK), saved next to
+    the object wrapped by a versioned key encryption key (KEK). Rotating a
+    KEK only rewraps the DEKs (`rewrap_data_key`), not the data. Unwrapped
+    DEKs are kept in a bounded LRU keyed by their wrapped form.
+    
+    Rows written before envelope encryption have no wrapped key; their data
+    is encrypted directly with the KEK of their `key_version`. The manager's
+    own encrypt/decrypt methods use the active KEK the same way.
+    """
+    
+    def __init__(self, key_b64: str, keys: Optional[Dict[str, str]] = None,
+                 active_version: str = "v1", data_key_cache_size: int = 1024):
+        """
+        Args:
+            key_b64: base64-encoded 256-bit key, used for `active_version`
+                unless `keys` has an entry for it
+            keys: KEK version -> base64-encoded 256-bit key
+            active_version: version new data keys are wrapped with
+        """
+        key_map = dict(keys or {})
+        key_map.setdefault(active_version, key_b64)
+        self.keks: Dict[str, DataCipher] = {
+            version: DataCipher(base64.b64decode(encoded)) for version, encoded in key_map.items()
+        }
+        self.active_version = active_version
+        self.key = base64.b64decode(key_map[active_version])
+        super().__init__(self.key)
+        self.data_keys = DataKeyCache(maxsize=data_key_cache_size)
+        logger.info("Encryption manager initialized (active key %s, %d key versions)", active_version, len(self.keks))
+    
+    def generate_data_key(self) -> DataKey:
+        """New random DEK wrapped with the active KEK"""
+        key = AESGCM.generate_key(bit_length=256)
+        wrapped = self._wrap(key, self.active_version)
+        cipher = DataCipher(key)
+        self.data_keys.set((self.active_version, wrapped), cipher)
+        return DataKey(self.active_version, wrapped, cipher)
+    
+    def cipher_for(self, key_version: Optional[str], wrapped_data_key: Optional[str]) -> DataCipher:
+        """
+        Cipher for a stored object: its unwrapped DEK, or the KEK itself for
+        rows without a wrapped key.
+        """
+        version = key_version or self.active_version
+        if not wrapped_data_key:
+            return self._kek(version)
+        
+        cache_key = (version, wrapped_data_key)
+        cipher = self.data_keys.get(cache_key)
+        if cipher is None:
+            cipher = DataCipher(self._unwrap(wrapped_data_key, version))
+            self.data_keys.set(cache_key, cipher)
+        return cipher
+    
+    def rewrap_data_key(self, wrapped_data_key: str, key_version: str) -> Tuple[str, str]:
+        """Re-wrap a DEK under the active KEK; returns (new_version, new_wrapped)"""
+        key = self._unwrap(wrapped_data_key, key_version)
+        return self.active_version, self._wrap(key, self.active_version)
+    
+    def decrypt_json_batch(
+        self,
+        rows: Sequence[Tuple[Optional[str], Optional[str], str]],
+        max_workers: Optional[int] = None
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Decrypt many encrypted JSON values at once.
+        
+        Each row is (key_version, wrapped_data_key, encrypted_b64). Data keys
+        are resolved once per distinct key on the calling thread; the
+        decryption itself runs over contiguous slices of rows on a shared
+        thread pool (AES-GCM in `cryptography` releases the GIL). Small
+        batches, single-core hosts and max_workers=1 stay on the calling
+        thread. Rows that fail to decrypt come back as None so one bad row
+        does not fail a page.
+        """
+        items = []
+        for key_version, wrapped_data_key, encrypted in rows:
+            try:
+                cipher = self.cipher_for(key_version, wrapped_data_key)
+            except Exception as e:
+                logger.warning("Could not resolve data key (version %s): %s", key_version, e)
+                cipher = None
+            items.append((cipher, encrypted))
+        
+        workers = min(max_workers or BATCH_MAX_WORKERS, BATCH_MAX_WORKERS, len(items) // BATCH_ROWS_PER_WORKER)
+        if workers <= 1:
+            return _decrypt_json_slice(items)
+        step = -(-len(items) // workers)
+        slices = [items[i:i + step] for i in range(0, len(items), step)]
+        results: List[Optional[Dict[str, Any]]] = []
+        for part in _batch_executor().map(_decrypt_json_slice, slices):
+            results.extend(part)
+        return results
+    
+    def _kek(self, version: str) -> DataCipher:
+        kek = self.keks.get(version)
+        if kek is None:
+            raise ValueError(f"Unknown encryption key version: {version}")
+        return kek
+    
+    def _wrap(self, key: bytes, version: str) -> str:
+        nonce = os.urandom(12)
+        wrapped = nonce + self._kek(version).aesgcm.encrypt(nonce, key, _wrap_aad(version))
+        return base64.b64encode(wrapped).decode('utf-8')
+    
+    def _unwrap(self, wrapped_data_key: str, version: str) -> bytes:
+        view = memoryview(base64.b64decode(wrapped_data_key))
+        return self._kek(version).aesgcm.decrypt(view[:12], view[12:], _wrap_aad(version))
+
+
+def _decrypt_json_slice(items: Sequence[Tuple[Optional[DataCipher], str]]) -> List[Optional[Dict[str, Any]]]:
+    results = []
+    for cipher, encrypted in items:
+        if cipher is None or not encrypted:
+            results.append(None)
+            continue
+        try:
+            results.append(cipher.decrypt_json(encrypted))
+        except Exception as e:
+            logger.warning("Could not decrypt row: %s", e)
+            results.append(None)
+    return results
+
+
+_batch_pool: Optional[ThreadPoolExecutor] = None
+_batch_pool_lock = threading.Lock()
+
+
+def _batch_executor() -> ThreadPoolExecutor:
+    """Shared pool for batch decryption, created on first use"""
+    global _batch_pool
+    if _batch_pool is None:
+        with _batch_pool_lock:
+            if _batch_pool is None:
+                _batch_pool = ThreadPoolExecutor(
+                    max_workers=BATCH_MAX_WORKERS,
+                    thread_name_prefix="moneyfyi-crypto"
+                )
+    return _batch_pool
+
+
+def _wrap_aad(version: str) -> bytes:
+    """Binds a wrapped key to the KEK version it claims"""
+    return b"moneyfyi-data-key:" + version.encode('utf-8')
 
 
 # Singleton instance
@@ -65,5 +585,10 @@ def get_encryption_manager():
     global _encryption_manager
     if _encryption_manager is None:
         from ..config import settings
-        _encryption_manager = EncryptionManager(settings.encryption_key)
+        _encryption_manager = EncryptionManager(
+            settings.encryption_key,
+            keys=settings.encryption_keys,
+            active_version=settings.key_version,
+            data_key_cache_size=settings.data_key_cache_size
+        )
     return _encryption_manager
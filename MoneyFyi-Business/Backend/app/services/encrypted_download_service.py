@@ -2,26 +2,198 @@
 Encrypted transaction download service
 """
 import base64
-import json
 import logging
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import httpx
 from fastapi import HTTPException
 
 from ..database import get_supabase
 from ..config import get_settings
-from .crypto_service import get_encryption_manager
+from .crypto_service import (
+    get_encryption_manager,
+    ciphertext_range,
+    parse_range,
+    read_header,
+    RangeNotSatisfiable,
+    is_chunked,
+    STREAM_HEADER,
+)
 
 logger = logging.getLogger("moneyfyi.backend.encrypted_download")
 
+# Lifetime of the signed storage URL used for streaming reads
+SIGNED_URL_TTL_SECONDS = 60
+
+
+def _byte_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """parse_range with an unsatisfiable range mapped to 416"""
+    try:
+        return parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        raise HTTPException(416, "Requested range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+
 
 class EncryptedDownloadService:
     """Service for downloading and decrypting transaction files"""
-    
+
     def __init__(self):
         self.settings = get_settings()
         self.encryptor = get_encryption_manager()
         self.supabase = get_supabase()
         self.bucket = self.settings.encrypted_bucket_name
-    
+        self.http = httpx.AsyncClient(timeout=30.0)
+
+    def _fetch_row(self, transaction_id: str, user_id: str, columns: str = "*") -> Dict:
+        response = self.supabase.table("encrypted_transactions") \
+            .select(columns) \
+            .eq("id", transaction_id) \
+            .eq("user_id", user_id) \
+            .single() \
+            .execute()
+
+        if not response.data:
+            raise HTTPException(404, "Transaction not found")
+        return response.data
+
+    async def get_details(self, transaction_id: str, user_id: str):
+        """Metadata and decrypted normalized JSON, without the file"""
+        try:
+            txn = self._fetch_row(transaction_id, user_id)
+            cipher = self.encryptor.cipher_for(txn.get("key_version"), txn.get("wrapped_data_key"))
+            normalized = cipher.decrypt_json(txn["encrypted_normalized_json"])
+
+            return {
+                "transaction_id": transaction_id,
+                "filename": txn["original_filename"],
+                "mime_type": txn.get("mime_type") or "application/octet-stream",
+                "file_size_bytes": txn.get("file_size_bytes"),
+                "normalized_json": normalized,
+                "vendor": txn["vendor_name"],
+                "amount": txn["amount"],
+                "transaction_date": txn["transaction_date"],
+                "transaction_type": txn["transaction_type"],
+                "created_at": txn["created_at"]
+            }
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.exception(f"Fetching transaction failed: {e}")
+            raise HTTPException(500, f"Fetching transaction failed: {str(e)}")
+
+    async def open_file_stream(
+        self,
+        transaction_id: str,
+        user_id: str,
+        range_header: Optional[str] = None
+    ) -> Tuple[int, Dict[str, str], AsyncIterator[bytes]]:
+        """
+        Decrypted file as (status, headers, body iterator) for a streaming
+        response. Chunked-format files are decrypted chunk by chunk as the
+        ciphertext arrives from storage, and a `Range` is served by fetching
+        only the chunks that cover it. Legacy single-shot blobs are
+        decrypted whole and sliced, as is any file whose storage answers
+        a range request with 200 instead of 206.
+
+        A chunk that fails authentication mid-stream aborts the response.
+        """
+        try:
+            txn = self._fetch_row(
+                transaction_id, user_id,
+                "encrypted_file_path, original_filename, mime_type, file_size_bytes, key_version, wrapped_data_key"
+            )
+            cipher = self.encryptor.cipher_for(txn.get("key_version"), txn.get("wrapped_data_key"))
+            url = self._signed_url(txn["encrypted_file_path"])
+
+            head = await self._fetch(url, 0, STREAM_HEADER.size - 1)
+            header = head.content[:STREAM_HEADER.size]
+            # Storage that ignored the Range already sent the whole object
+            whole = head.content if head.status_code != 206 else None
+            if whole is not None or not is_chunked(header) or txn.get("file_size_bytes") is None:
+                blob = whole if whole is not None else (await self._fetch(url)).content
+                return self._sliced_response(txn, cipher.decrypt_blob(blob), range_header)
+
+            chunk_size = read_header(header)
+            size = txn["file_size_bytes"]
+            byte_range = _byte_range(range_header, size)
+            headers = self._file_headers(txn)
+
+            if byte_range is None:
+                headers["Content-Length"] = str(size)
+                body = self._decrypt_stream(url, cipher, None, cipher.stream_decryptor(), 0, size)
+                return 200, headers, body
+
+            start, end = byte_range
+            first_chunk, cipher_start, cipher_end, skip, to_end = ciphertext_range(chunk_size, size, start, end)
+            decryptor = cipher.stream_decryptor(header, first_chunk, to_end)
+            headers["Content-Length"] = str(end - start + 1)
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            body = self._decrypt_stream(
+                url, cipher, (cipher_start, cipher_end), decryptor, skip, end - start + 1, start
+            )
+            return 206, headers, body
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.exception(f"Download failed: {e}")
+            raise HTTPException(500, f"Download failed: {str(e)}")
+
+    def _signed_url(self, storage_path: str) -> str:
+        signed = self.supabase.storage.from_(self.bucket).create_signed_url(storage_path, SIGNED_URL_TTL_SECONDS)
+        return signed.get("signedURL") or signed["signedUrl"]
+
+    async def _fetch(self, url: str, start: int = 0, end: Optional[int] = None) -> httpx.Response:
+        """Whole object, or ciphertext bytes [start, end] when `end` is given (check for 206)"""
+        headers = {"Range": f"bytes={start}-{end}"} if end is not None else {}
+        response = await self.http.get(url, headers=headers)
+        response.raise_for_status()
+        return response
+
+    async def _decrypt_stream(self, url: str, cipher, cipher_range: Optional[Tuple[int, int]], decryptor,
+                              skip: int, length: int, plaintext_start: int = 0) -> AsyncIterator[bytes]:
+        """
+        Decrypt the stored stream, or its ciphertext bytes `cipher_range`
+        (inclusive), as they arrive, dropping `skip` leading bytes. If
+        storage answers a range request with the whole object, that is
+        decrypted from the top instead, skipping to `plaintext_start`.
+        """
+        headers = {"Range": "bytes={}-{}".format(*cipher_range)} if cipher_range else {}
+        async with self.http.stream("GET", url, headers=headers) as response:
+            response.raise_for_status()
+            if cipher_range and response.status_code != 206:
+                decryptor, skip = cipher.stream_decryptor(), plaintext_start
+            async for data in response.aiter_bytes():
+                plaintext, skip, length = _trim(decryptor.update(data), skip, length)
+                if plaintext:
+                    yield plaintext
+        plaintext, skip, length = _trim(decryptor.finalize(), skip, length)
+        if plaintext:
+            yield plaintext
+
+    def _sliced_response(self, txn: Dict, plaintext: bytes,
+                         range_header: Optional[str]) -> Tuple[int, Dict[str, str], AsyncIterator[bytes]]:
+        size = len(plaintext)
+        byte_range = _byte_range(range_header, size)
+        headers = self._file_headers(txn)
+        status = 200
+        if byte_range is not None:
+            start, end = byte_range
+            plaintext = memoryview(plaintext)[start:end + 1]
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            status = 206
+        headers["Content-Length"] = str(len(plaintext))
+        return status, headers, _single(bytes(plaintext))
+
+    def _file_headers(self, txn: Dict) -> Dict[str, str]:
+        filename = (txn.get("original_filename") or "file").replace('"', "")
+        return {
+            "Accept-Ranges": "bytes",
+            "Content-Type": txn.get("mime_type") or "application/octet-stream",
+            "Content-Disposition": f'attachment; filename="{filename}"',
+        }
+
     async def download_and_decrypt(self, transaction_id: str, user_id: str):
         """
         Download and decrypt transaction:
@@ -30,37 +202,28 @@ class EncryptedDownloadService:
         3. Decrypt file bytes
         4. Decrypt normalized JSON
         5. Return both
+
+        Kept for existing clients; prefer `get_details` plus `open_file_stream`,
+        which avoid the base64 file payload.
         """
         try:
-            # Fetch from DB
-            response = self.supabase.table("encrypted_transactions") \
-                .select("*") \
-                .eq("id", transaction_id) \
-                .eq("user_id", user_id) \
-                .single() \
-                .execute()
-            
-            if not response.data:
-                raise HTTPException(404, "Transaction not found")
-            
-            txn = response.data
+            txn = self._fetch_row(transaction_id, user_id)
+            cipher = self.encryptor.cipher_for(txn.get("key_version"), txn.get("wrapped_data_key"))
             logger.info(f"Downloading transaction: {transaction_id}")
-            
+
             # Download encrypted file from storage
             file_response = self.supabase.storage.from_(self.bucket).download(
                 txn["encrypted_file_path"]
             )
-            
-            # Decrypt file (file_response is already bytes)
-            encrypted_file_b64 = base64.b64encode(file_response).decode('utf-8')
-            decrypted_file = self.encryptor.decrypt(encrypted_file_b64)
-            
+
+            # Decrypt file (file_response is already bytes; chunked or legacy format)
+            decrypted_file = cipher.decrypt_blob(file_response)
+
             # Decrypt normalized JSON
-            decrypted_json_bytes = self.encryptor.decrypt(txn["encrypted_normalized_json"])
-            normalized = json.loads(decrypted_json_bytes.decode('utf-8'))
-            
+            normalized = cipher.decrypt_json(txn["encrypted_normalized_json"])
+
             logger.info(f"Successfully decrypted transaction: {transaction_id}")
-            
+
             return {
                 "transaction_id": transaction_id,
                 "filename": txn["original_filename"],
@@ -72,13 +235,28 @@ class EncryptedDownloadService:
                 "transaction_type": txn["transaction_type"],
                 "created_at": txn["created_at"]
             }
-            
+
         except HTTPException:
             raise
         except Exception as e:
             logger.exception(f"Download failed: {e}")
             raise HTTPException(500, f"Download failed: {str(e)}")
 
+    async def close(self):
+        """Close the storage HTTP client (app shutdown)"""
+        await self.http.aclose()
+
+
+def _trim(plaintext: bytes, skip: int, length: int) -> Tuple[bytes, int, int]:
+    """Drop up to `skip` leading bytes and cap at `length`; returns the remaining skip and length"""
+    dropped = min(skip, len(plaintext))
+    kept = plaintext[dropped:dropped + length] if dropped or len(plaintext) > length else plaintext
+    return kept, skip - dropped, length - len(kept)
+
+
+async def _single(data: bytes) -> AsyncIterator[bytes]:
+    yield data
+
 
 # Singleton
 _download_service = None
@@ -90,3 +268,11 @@ def get_encrypted_download_service():
     if _download_service is None:
         _download_service = EncryptedDownloadService()
     return _download_service
+
+
+async def close_encrypted_download_service():
+    """Close the singleton's HTTP client, if it was ever created"""
+    global _download_service
+    if _download_service is not None:
+        await _download_service.close()
+        _download_service = None
@@ -1,20 +1,24 @@
 """
 Encrypted transaction upload service
 """
+import os
 import uuid
-import json
 import base64
 import logging
+import tempfile
 from datetime import datetime, timezone
 from fastapi import UploadFile, HTTPException
 
 from ..database import get_supabase
 from ..config import get_settings
-from .crypto_service import get_encryption_manager
+from .crypto_service import get_encryption_manager, DataKey
 from ...ai_engine.data_normalizer_agent import DataNormalizerAgent
 
 logger = logging.getLogger("moneyfyi.backend.encrypted_upload")
 
+# Statement rows are inserted in batches of this size while streaming
+STATEMENT_INSERT_CHUNK = 500
+
 
 class EncryptedUploadService:
     """Service for uploading and encrypting transaction files"""
@@ -29,100 +33,142 @@ class EncryptedUploadService:
     async def upload_and_encrypt(self, file: UploadFile, user_id: str):
         """
         Upload file with end-to-end encryption:
-        1. Read file bytes
-        2. Normalize with AI
-        3. Encrypt file
-        4. Encrypt normalized JSON
-        5. Upload to encrypted storage
-        6. Save metadata to DB
+        1. Stream the file through the chunked encryptor into a temp file
+        2. Upload the encrypted temp file to encrypted storage
+        3. Normalize with AI (CSV statements row by row)
+        4. Encrypt each normalized JSON
+        5. Save metadata to DB (one row per normalized transaction)
+        
+        CSV statements are never held in memory as a whole: encryption works
+        one chunk at a time and normalization streams the decrypted temp file.
         """
         storage_path = None
+        encrypted_path = None
         
         try:
-            # Read file
-            file_bytes = await file.read()
-            file_size = len(file_bytes)
-            
             max_size = self.settings.max_file_size_mb * 1024 * 1024 if hasattr(self.settings, 'max_file_size_mb') else 50 * 1024 * 1024
-            if file_size > max_size:
-                raise HTTPException(413, f"File too large. Max: {max_size // (1024*1024)}MB")
-            
-            logger.info(f"Processing file upload: {file.filename}, size: {file_size} bytes")
-            
-            # Normalize data
-            try:
-                file_text = file_bytes.decode('utf-8')
-            except:
-                # If binary file, encode to base64 for normalization
-                file_text = base64.b64encode(file_bytes).decode('utf-8')
             
-            normalized = self.normalizer.normalize(file_text)
-            logger.info(f"Normalized data: vendor={normalized.get('vendor')}, amount={normalized.get('amount')}")
-            
-            # Encrypt file bytes
-            encrypted_file = self.encryptor.encrypt(file_bytes)
+            # Encrypt while reading, under a fresh data key for this file
+            data_key = self.encryptor.generate_data_key()
+            with tempfile.NamedTemporaryFile(suffix=".enc", delete=False) as encrypted_tmp:
+                encrypted_path = encrypted_tmp.name
+                try:
+                    file_size = await data_key.cipher.encrypt_upload(file, encrypted_tmp, max_size=max_size)
+                except ValueError:
+                    raise HTTPException(413, f"File too large. Max: {max_size // (1024*1024)}MB")
             
-            # Encrypt normalized JSON
-            normalized_json = json.dumps(normalized)
-            encrypted_json = self.encryptor.encrypt(normalized_json.encode('utf-8'))
+            logger.info(f"Processing file upload: {file.filename}, size: {file_size} bytes")
             
             # Generate storage path
             storage_path = f"{user_id}/{uuid.uuid4()}.enc"
             
-            # Convert encrypted base64 to binary for storage
-            encrypted_binary = base64.b64decode(encrypted_file)
-            
-            # Upload to Supabase Storage
+            # Upload to Supabase Storage (the client streams from the path)
             self.supabase.storage.from_(self.bucket).upload(
                 path=storage_path,
-                file=encrypted_binary,
+                file=encrypted_path,
                 file_options={"content-type": "application/octet-stream"}
             )
             
             logger.info(f"Uploaded encrypted file to: {storage_path}")
             
-            # Insert metadata to DB
-            db_data = {
-                "user_id": user_id,
-                "encrypted_file_path": storage_path,
-                "encrypted_normalized_json": encrypted_json,
-                "vendor_name": normalized.get("vendor"),
-                "amount": float(normalized.get("amount", 0)),
-                "transaction_date": normalized.get("date"),
-                "transaction_type": normalized.get("type", "debit"),
-                "key_version": self.settings.key_version,
-                "original_filename": file.filename,
-                "file_size_bytes": file_size,
-                "mime_type": file.content_type or "application/octet-stream",
-                "created_at": datetime.now(timezone.utc).isoformat(),
-            }
-            
-            response = self.supabase.table("encrypted_transactions").insert(db_data).execute()
-            
-            if not response.data:
-                raise HTTPException(500, "Failed to create encrypted transaction record")
-            
-            transaction_id = response.data[0]["id"]
-            
-            logger.info(f"Created encrypted transaction: {transaction_id}")
+            # Normalize data: statements yield one transaction per row,
+            # read back through the decryptor so only what was stored is used
+            created_at = datetime.now(timezone.utc).isoformat()
+            transaction_ids = []
+            with open(encrypted_path, "rb") as encrypted_reader:
+                plaintext = data_key.cipher.open_decrypted(encrypted_reader)
+                if self._is_csv(file):
+                    records = self.normalizer.normalize_stream(plaintext)
+                else:
+                    file_bytes = plaintext.read()
+                    try:
+                        file_text = file_bytes.decode('utf-8')
+                    except UnicodeDecodeError:
+                        # If binary file, encode to base64 for normalization
+                        file_text = base64.b64encode(file_bytes).decode('utf-8')
+                    del file_bytes
+                    records = iter([self.normalizer.normalize(file_text)])
+                
+                chunk = []
+                for normalized in records:
+                    chunk.append(self._build_record(normalized, user_id, storage_path, file, file_size, created_at, data_key))
+                    if len(chunk) >= STATEMENT_INSERT_CHUNK:
+                        transaction_ids.extend(self._insert_records(chunk))
+                        chunk = []
+                if chunk:
+                    transaction_ids.extend(self._insert_records(chunk))
+            
+            if not transaction_ids:
+                raise HTTPException(422, "No transactions found in uploaded file")
+            
+            logger.info(f"Created {len(transaction_ids)} encrypted transaction(s) from {storage_path}")
             
             return {
-                "transaction_id": transaction_id,
+                "transaction_id": transaction_ids[0],
+                "transaction_count": len(transaction_ids),
                 "status": "success",
                 "message": "File uploaded and encrypted successfully"
             }
             
         except HTTPException:
+            self._cleanup(storage_path)
             raise
         except Exception as e:
             logger.exception(f"Upload failed: {e}")
-            # Cleanup on failure
-            if storage_path:
+            self._cleanup(storage_path)
+            raise HTTPException(500, f"Upload failed: {str(e)}")
+        finally:
+            if encrypted_path is not None:
                 try:
-                    self.supabase.storage.from_(self.bucket).remove([storage_path])
-                except:
+                    os.unlink(encrypted_path)
+                except OSError:
                     pass
-            raise HTTPException(500, f"Upload failed: {str(e)}")
+    
+    def _is_csv(self, file: UploadFile) -> bool:
+        content_type = (file.content_type or "").lower()
+        filename = (file.filename or "").lower()
+        return filename.endswith(".csv") or content_type in ("text/csv", "application/csv")
+    
+    def _build_record(self, normalized: dict, user_id: str, storage_path: str,
+                      file: UploadFile, file_size: int, created_at: str, data_key: DataKey) -> dict:
+        """encrypted_transactions row for one normalized transaction"""
+        # Encrypt normalized JSON with the file's data key
+        encrypted_json = data_key.cipher.encrypt_json(normalized)
+        
+        return {
+            "user_id": user_id,
+            "encrypted_file_path": storage_path,
+            "encrypted_normalized_json": encrypted_json,
+            "vendor_name": normalized.get("vendor"),
+            "amount": float(normalized.get("amount", 0)),
+            "transaction_date": normalized.get("date"),
+            "transaction_type": normalized.get("type", "debit"),
+            "key_version": data_key.key_version,
+            "wrapped_data_key": data_key.wrapped,
+            "original_filename": file.filename,
+            "file_size_bytes": file_size,
+            "mime_type": file.content_type or "application/octet-stream",
+            "created_at": created_at,
+        }
+    
+    def _insert_records(self, records: list) -> list:
+        response = self.supabase.table("encrypted_transactions").insert(records).execute()
+        if not response.data:
+            raise HTTPException(500, "Failed to create encrypted transaction record")
+        return [row["id"] for row in response.data]
+    
+    def _cleanup(self, storage_path):
+        """Remove the stored blob and any rows already inserted for it"""
+        if not storage_path:
+            return
+        try:
+            self.supabase.table("encrypted_transactions").delete().eq("encrypted_file_path", storage_path).execute()
+        except:
+            pass
+        try:
+            self.supabase.storage.from_(self.bucket).remove([storage_path])
+        except:
+            pass
 
 
 # Singleton
@@ -1,13 +1,127 @@
 import logging
 from uuid import UUID
 from datetime import datetime, timezone
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 
 from ..database import init_supabase_client
-from ..services.ai_service import ai_service
+from ..services.ai_service import ai_service, CashflowState, PurchaseIndex, financial_year
 
 logger = logging.getLogger("moneyfyi.backend.analysis")
 
+
+# Compare-and-set attempts before the state is rebuilt from history instead
+CASHFLOW_STATE_RETRIES = 3
+
+
+def _load_cashflow_state(supabase, user_id: UUID) -> Tuple[CashflowState, Optional[int]]:
+    """
+    Persisted cashflow state for the user, rebuilt from history if missing
+    or stale, and the row version to save it against (None if no row).
+    """
+    mode = ai_service.engine.cashflow_oracle.aggregation
+    version = None
+    try:
+        response = supabase.table("cashflow_states").select("state, version").eq("user_id", str(user_id)).execute()
+        if response.data:
+            version = response.data[0].get("version") or 0
+            state = CashflowState.from_dict(response.data[0]["state"])
+            if not state.stale and state.mode == mode:
+                return state, version
+            logger.info(f"Cashflow state for {user_id} is stale; rebuilding from history")
+    except Exception as e:
+        logger.warning(f"Could not load cashflow state for {user_id}: {e}")
+    history, history_start = ai_service.fetch_cashflow_history(supabase, str(user_id))
+    return CashflowState.from_transactions(history, mode=mode, history_start=history_start), version
+
+
+def _save_cashflow_state(supabase, user_id: UUID, state: CashflowState, version: Optional[int]) -> bool:
+    """
+    Write the state only if the row is still at `version` (or, for None,
+    still absent). False if another task got there first.
+    """
+    row = {
+        "state": state.to_dict(),
+        "version": (version or 0) + 1,
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+    try:
+        if version is None:
+            # Primary key on user_id: a concurrent first insert fails here
+            supabase.table("cashflow_states").insert({"user_id": str(user_id), **row}).execute()
+            return True
+        response = supabase.table("cashflow_states") \
+            .update(row) \
+            .eq("user_id", str(user_id)) \
+            .eq("version", version) \
+            .execute()
+        return bool(response.data)
+    except Exception as e:
+        logger.warning(f"Could not save cashflow state for {user_id}: {e}")
+        return False
+
+
+def _apply_to_cashflow_state(
+    supabase,
+    user_id: UUID,
+    transaction: Dict,
+    balance: Optional[float]
+) -> CashflowState:
+    """
+    Add one transaction to the user's persisted cashflow state.
+
+    Concurrent tasks for the same user each read the state, apply their
+    transaction and save with a version check, so a lost race is retried
+    on a fresh read rather than overwriting the other task's transaction.
+    If the state keeps changing underneath, it is rebuilt from history
+    (which already holds this transaction) and left for the next task to
+    persist.
+    """
+    for _ in range(CASHFLOW_STATE_RETRIES):
+        state, version = _load_cashflow_state(supabase, user_id)
+        # A retried task finds the id already present and changes nothing
+        state.insert_transaction(transaction, balance=balance)
+        if _save_cashflow_state(supabase, user_id, state, version):
+            return state
+        logger.info(f"Cashflow state for {user_id} changed concurrently; retrying")
+
+    logger.warning(f"Cashflow state for {user_id} still contended; using a rebuild from history")
+    history, history_start = ai_service.fetch_cashflow_history(supabase, str(user_id))
+    return CashflowState.from_transactions(
+        history,
+        balance=balance,
+        mode=ai_service.engine.cashflow_oracle.aggregation,
+        history_start=history_start
+    )
+
+
+def _load_purchase_index(supabase, user_id: UUID, transaction: Dict) -> Optional[PurchaseIndex]:
+    """
+    Financial-year purchase total for the transaction's vendor, from the
+    trigger-maintained vendor_purchase_totals row. The trigger has already
+    counted this transaction, so it is marked as included rather than added.
+    None (the engine falls back to totals over the fetched history) if the
+    transaction is undated or the row cannot be read.
+    """
+    fy = financial_year(transaction.get("date"))
+    if fy is None:
+        return None
+    # Same vendor key as the normalizer and the table
+    vendor = str(transaction.get("vendor") or "").strip() or "Unknown Vendor"
+    try:
+        response = supabase.table("vendor_purchase_totals") \
+            .select("total") \
+            .eq("user_id", str(user_id)) \
+            .eq("vendor_name", vendor) \
+            .eq("financial_year", fy) \
+            .execute()
+    except Exception as e:
+        logger.warning(f"Could not load purchase totals for {user_id}: {e}")
+        return None
+    totals = {(vendor, fy): float(row["total"]) for row in response.data or []}
+    # The engine's normalizer stringifies ids
+    return PurchaseIndex.from_totals(totals, included=[{**transaction, "id": str(transaction["id"])}])
+
+
 async def analyze_transaction_task(transaction_id: str, user_id: UUID):
     """
     Background task to analyze a newly created transaction.
@@ -89,17 +203,33 @@ async def analyze_transaction_task(transaction_id: str, user_id: UUID):
         mapped_history = []
         for t in transaction_history:
             mapped_history.append({
+                "id": t["id"],
                 "date": t["transaction_date"],
                 "amount": t["debit"] if t["debit"] > 0 else t["credit"],
                 "type": "debit" if t["debit"] > 0 else "credit",
                 "vendor": t.get("vendor_name", "Unknown")
             })
+        
+        # Apply this transaction to the user's cashflow state as a delta
+        balance = transaction.get("balance")
+        cashflow_state = _apply_to_cashflow_state(
+            supabase, user_id, mapped_txn, float(balance) if balance is not None else None
+        )
+        ai_service.engine.cashflow_oracle.invalidate(str(user_id))
+        if cashflow_state.balance is not None:
+            current_balance = float(cashflow_state.balance)
+
+        # Whole financial year for the 194C/194Q aggregates, not just the fetched history
+        purchase_index = _load_purchase_index(supabase, user_id, mapped_txn)
             
-        analysis_result = ai_service.analyze_transaction(
+        analysis_result = await ai_service.analyze_transaction_async(
             transaction=mapped_txn,
             transaction_history=mapped_history,
             vendor_history=vendor_history,
-            current_balance=current_balance
+            current_balance=current_balance,
+            tenant_id=str(user_id),
+            cashflow_state=cashflow_state,
+            purchase_index=purchase_index
         )
         
         # 6. Update Transaction with Results
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from ..config import settings
+from ..database import init_supabase_client
+from ..services.crypto_service import get_encryption_manager
+
+logger = logging.getLogger("moneyfyi.backend.key_rotation")
+
+
+async def rotate_data_keys_task(batch_size: Optional[int] = None) -> Dict[str, int]:
+    """
+    Background task to move encrypted_transactions onto the active key version.
+
+    Only the wrapped data key column is rewritten: each file's data key is
+    unwrapped with its old KEK and wrapped again with the active one, so the
+    cost is per row, not per stored byte. Rows of one upload share a data
+    key and are updated together.
+
+    Old KEKs must stay in ENCRYPTION_KEYS until this reports no remaining
+    rows. Rows written before envelope encryption (no wrapped key) are
+    encrypted with the KEK itself and are only counted, not rotated.
+    """
+    supabase = init_supabase_client()
+    manager = get_encryption_manager()
+    active = manager.active_version
+    batch_size = batch_size or settings.key_rotation_batch_size
+
+    stats = {"keys_rewrapped": 0, "rows_updated": 0, "failed": 0, "legacy_rows": 0}
+    # Rows that could not be rewrapped stay in the result set; page past them
+    offset = 0
+
+    logger.info(f"Starting data key rotation to {active}")
+
+    while True:
+        response = supabase.table("encrypted_transactions") \
+            .select("id, key_version, wrapped_data_key") \
+            .neq("key_version", active) \
+            .not_.is_("wrapped_data_key", "null") \
+            .order("id") \
+            .range(offset, offset + batch_size - 1) \
+            .execute()
+        rows = response.data or []
+        if not rows:
+            break
+
+        wrapped_keys = {(row["key_version"], row["wrapped_data_key"]) for row in rows}
+        for old_version, old_wrapped in wrapped_keys:
+            try:
+                new_version, new_wrapped = manager.rewrap_data_key(old_wrapped, old_version)
+                # Conditional on the old values, so concurrent runs cannot clobber each other
+                update = supabase.table("encrypted_transactions") \
+                    .update({"key_version": new_version, "wrapped_data_key": new_wrapped}) \
+                    .eq("key_version", old_version) \
+                    .eq("wrapped_data_key", old_wrapped) \
+                    .execute()
+                stats["keys_rewrapped"] += 1
+                stats["rows_updated"] += len(update.data or [])
+            except Exception as e:
+                logger.error(f"Could not rewrap data key from {old_version}: {e}")
+                offset += sum(
+                    1 for row in rows
+                    if row["key_version"] == old_version and row["wrapped_data_key"] == old_wrapped
+                )
+                stats["failed"] += 1
+
+        # Let other tasks run between batches
+        await asyncio.sleep(0)
+
+    legacy = supabase.table("encrypted_transactions") \
+        .select("id", count="exact") \
+        .neq("key_version", active) \
+        .is_("wrapped_data_key", "null") \
+        .limit(1) \
+        .execute()
+    stats["legacy_rows"] = legacy.count or 0
+
+    logger.info(
+        f"Data key rotation to {active} done: {stats['keys_rewrapped']} keys, "
+        f"{stats['rows_updated']} rows, {stats['failed']} failed, "
+        f"{stats['legacy_rows']} rows without a data key"
+    )
+    return stats
+
+
+def start_key_rotation() -> Optional[asyncio.Task]:
+    """
+    Schedule rotate_data_keys_task on the running loop when older KEK
+    versions are still configured (KEY_ROTATION_ON_STARTUP). Called from the
+    app lifespan; the caller cancels the returned task on shutdown.
+    """
+    old_versions = set(settings.encryption_keys) - {settings.key_version}
+    if not settings.key_rotation_on_startup or not old_versions:
+        return None
+    
+    async def run() -> None:
+        try:
+            await rotate_data_keys_task()
+        except Exception as e:
+            logger.exception(f"Data key rotation failed: {e}")
+    
+    logger.info(f"Scheduling data key rotation from {', '.join(sorted(old_versions))}")
+    return asyncio.create_task(run())
+
+
+if __name__ == "__main__":
+    asyncio.run(rotate_data_keys_task())
@@ -0,0 +1,40 @@
+-- Per-user incremental cashflow state (see ai_engine/cashflow_state.py)
+CREATE TABLE IF NOT EXISTS public.cashflow_states (
+  user_id UUID PRIMARY KEY REFERENCES auth.users(id) ON DELETE CASCADE,
+  state JSONB NOT NULL,
+  version BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Tables created before optimistic locking
+ALTER TABLE public.cashflow_states ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0;
+
+-- Enable RLS (the backend writes with the service role)
+ALTER TABLE public.cashflow_states ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view their own cashflow state"
+  ON public.cashflow_states FOR SELECT
+  USING (auth.uid() = user_id);
+
+-- The state only tracks inserts made by the analysis task. Any delete or
+-- edit of a transaction's amount/date drops the row, and the next task
+-- rebuilds it from history.
+CREATE OR REPLACE FUNCTION public.invalidate_cashflow_state()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  DELETE FROM public.cashflow_states WHERE user_id = OLD.user_id;
+  IF TG_OP = 'UPDATE' AND NEW.user_id IS DISTINCT FROM OLD.user_id THEN
+    DELETE FROM public.cashflow_states WHERE user_id = NEW.user_id;
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS transactions_invalidate_cashflow_state ON public.transactions;
+CREATE TRIGGER transactions_invalidate_cashflow_state
+  AFTER DELETE OR UPDATE OF transaction_date, debit, credit, user_id ON public.transactions
+  FOR EACH ROW EXECUTE FUNCTION public.invalidate_cashflow_state();
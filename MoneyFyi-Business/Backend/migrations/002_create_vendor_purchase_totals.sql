@@ -0,0 +1,76 @@
+-- Per-user debit totals by vendor and Indian financial year (April-March),
+-- read by the analysis task to seed ai_engine/purchase_index.py so the
+-- aggregate TDS thresholds (194C, 194Q) see the whole year, not just the
+-- recent history it fetches.
+CREATE TABLE IF NOT EXISTS public.vendor_purchase_totals (
+  user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+  vendor_name TEXT NOT NULL,
+  financial_year INT NOT NULL,
+  total DECIMAL(15,2) NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ DEFAULT NOW(),
+  PRIMARY KEY (user_id, vendor_name, financial_year)
+);
+
+-- Enable RLS (the backend reads with the service role)
+ALTER TABLE public.vendor_purchase_totals ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view their own vendor purchase totals"
+  ON public.vendor_purchase_totals FOR SELECT
+  USING (auth.uid() = user_id);
+
+-- Same vendor key as the engine's normalizer: trimmed, 'Unknown Vendor' if blank
+CREATE OR REPLACE FUNCTION public.purchase_vendor_key(vendor_name TEXT)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT COALESCE(NULLIF(btrim(vendor_name), ''), 'Unknown Vendor');
+$$;
+
+CREATE OR REPLACE FUNCTION public.purchase_financial_year(txn_date DATE)
+RETURNS INT
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT EXTRACT(YEAR FROM txn_date)::INT - CASE WHEN EXTRACT(MONTH FROM txn_date) < 4 THEN 1 ELSE 0 END;
+$$;
+
+-- Every insert, delete or edit of a debit moves its amount between totals,
+-- so the table never needs a rebuild.
+CREATE OR REPLACE FUNCTION public.apply_vendor_purchase_total()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.debit > 0 AND OLD.transaction_date IS NOT NULL THEN
+    UPDATE public.vendor_purchase_totals
+      SET total = total - OLD.debit, updated_at = NOW()
+      WHERE user_id = OLD.user_id
+        AND vendor_name = purchase_vendor_key(OLD.vendor_name)
+        AND financial_year = purchase_financial_year(OLD.transaction_date);
+  END IF;
+  IF TG_OP IN ('UPDATE', 'INSERT') AND NEW.debit > 0 AND NEW.transaction_date IS NOT NULL THEN
+    INSERT INTO public.vendor_purchase_totals (user_id, vendor_name, financial_year, total)
+      VALUES (NEW.user_id, purchase_vendor_key(NEW.vendor_name), purchase_financial_year(NEW.transaction_date), NEW.debit)
+      ON CONFLICT (user_id, vendor_name, financial_year)
+      DO UPDATE SET total = vendor_purchase_totals.total + EXCLUDED.total, updated_at = NOW();
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS transactions_apply_vendor_purchase_total ON public.transactions;
+CREATE TRIGGER transactions_apply_vendor_purchase_total
+  AFTER INSERT OR DELETE OR UPDATE OF debit, vendor_name, transaction_date, user_id ON public.transactions
+  FOR EACH ROW EXECUTE FUNCTION public.apply_vendor_purchase_total();
+
+-- Backfill from existing transactions
+INSERT INTO public.vendor_purchase_totals (user_id, vendor_name, financial_year, total)
+  SELECT user_id, purchase_vendor_key(vendor_name), purchase_financial_year(transaction_date), SUM(debit)
+  FROM public.transactions
+  WHERE debit > 0 AND transaction_date IS NOT NULL
+  GROUP BY 1, 2, 3
+  ON CONFLICT (user_id, vendor_name, financial_year)
+  DO UPDATE SET total = EXCLUDED.total, updated_at = NOW();
@@ -0,0 +1,67 @@
+"""
+Benchmark CashflowOracle bulk forecasting (nightly refresh of every account)
+
+Usage: python scripts/benchmark_cashflow.py [users] [avg_txns_per_user] [calendar|rows]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ai_engine"))
+
+from cashflow_oracle import CashflowOracle
+
+
+def generate_histories(users: int, avg_txns: int, seed: int = 42):
+    """Grouped columnar history: per-user offsets into flat amount / day arrays"""
+    rng = np.random.default_rng(seed)
+    counts = rng.poisson(avg_txns, users)
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    rows = int(offsets[-1])
+
+    amounts = np.round(rng.normal(0, 30_000, rows), 2)
+    days = 20_300 - rng.integers(0, 90, rows)  # last ~3 months
+    balances = rng.uniform(0, 500_000, users)
+    user_ids = [f"user-{i}" for i in range(users)]
+    return user_ids, offsets, amounts, days, balances
+
+
+def run_benchmark(users: int = 50_000, avg_txns: int = 60, aggregation: str = "calendar"):
+    oracle = CashflowOracle(aggregation=aggregation)
+    user_ids, offsets, amounts, days, balances = generate_histories(users, avg_txns)
+
+    print("=" * 60)
+    print("CASHFLOW ORACLE BULK FORECAST BENCHMARK")
+    print("=" * 60)
+    print(f"Users: {users:,}  Transactions: {len(amounts):,}  Aggregation: {aggregation}")
+
+    start = time.perf_counter()
+    bulk = oracle.predict_many(user_ids, offsets, amounts, days, balances)
+    bulk_time = time.perf_counter() - start
+
+    sample = min(users, 2_000)
+    mismatches = 0
+    start = time.perf_counter()
+    for i in range(sample):
+        lo, hi = offsets[i], offsets[i + 1]
+        single = oracle.predict_arrays(amounts[lo:hi], days[lo:hi], balances[i])
+        mismatches += single["cashflow_stress"] != bulk["cashflow_stress"][i]
+    per_user = (time.perf_counter() - start) / sample
+
+    print(f"\npredict_many:            {bulk_time:8.2f} s ({users / bulk_time:,.0f} users/s)")
+    print(f"predict_arrays per user: {per_user * 1e6:8.1f} us ({1 / per_user:,.0f} users/s,"
+          f" ~{per_user * users:.1f} s for all)")
+    print(f"Stress mismatches vs predict_arrays: {mismatches} / {sample:,}")
+    stress, counts = np.unique(bulk["cashflow_stress"], return_counts=True)
+    print("\nStress distribution: " + ", ".join(f"{s}={c:,}" for s, c in zip(stress, counts)))
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    run_benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 50_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 60,
+        sys.argv[3] if len(sys.argv) > 3 else "calendar"
+    )
@@ -0,0 +1,89 @@
+"""
+Benchmark batch decryption of encrypted_normalized_json rows
+
+Usage: python scripts/benchmark_crypto.py [rows] [payload_bytes] [pool_workers]
+
+pool_workers overrides BATCH_MAX_WORKERS (default: min(8, CPU count)).
+"""
+import os
+import sys
+import time
+import base64
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.services import crypto_service
+from app.services.crypto_service import EncryptionManager
+
+
+def generate_rows(manager: EncryptionManager, count: int, payload_bytes: int, rows_per_file: int = 20):
+    """(key_version, wrapped_data_key, ciphertext) rows, rows_per_file sharing a data key"""
+    rows = []
+    data_key = None
+    for i in range(count):
+        if i % rows_per_file == 0:
+            data_key = manager.generate_data_key()
+        normalized = {
+            "transaction_id": f"TXN_{i:06d}",
+            "vendor": "Bharat Steel Industries Pvt Ltd",
+            "amount": 45000 + i,
+            "date": "2025-11-16T00:00:00",
+            "type": "debit",
+            "raw_text": "x" * payload_bytes,
+        }
+        rows.append((data_key.key_version, data_key.wrapped, data_key.cipher.encrypt_json(normalized)))
+    return rows
+
+
+def best_of(func, runs: int = 5) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmark(count: int = 1000, payload_bytes: int = 400, pool_workers: int = None):
+    if pool_workers:
+        crypto_service.BATCH_MAX_WORKERS = pool_workers
+    key = base64.b64encode(os.urandom(32)).decode()
+    writer = EncryptionManager(key)
+    rows = generate_rows(writer, count, payload_bytes)
+
+    print("=" * 60)
+    print("ENCRYPTED LISTING BATCH DECRYPT BENCHMARK")
+    print("=" * 60)
+
+    def per_row():
+        # Fresh manager each run: data keys start unwrapped, like a cold page
+        reader = EncryptionManager(key)
+        return [reader.cipher_for(v, w).decrypt_json(ct) for v, w, ct in rows]
+
+    def batch_serial():
+        return EncryptionManager(key).decrypt_json_batch(rows, max_workers=1)
+
+    def batch_threaded():
+        return EncryptionManager(key).decrypt_json_batch(rows)
+
+    assert per_row() == batch_threaded()
+
+    serial = best_of(per_row)
+    batched = best_of(batch_serial)
+    threaded = best_of(batch_threaded)
+
+    workers = min(crypto_service.BATCH_MAX_WORKERS, count // crypto_service.BATCH_ROWS_PER_WORKER)
+    print(f"\n{count:,} rows, ~{payload_bytes + 150} byte JSON each, {os.cpu_count()} CPUs")
+    print(f"  row by row:            {serial * 1e3:8.1f} ms")
+    print(f"  decrypt_json_batch(1): {batched * 1e3:8.1f} ms ({serial / batched:.1f}x, inline)")
+    print(f"  decrypt_json_batch:    {threaded * 1e3:8.1f} ms ({serial / threaded:.1f}x, "
+          f"{max(workers, 1)} worker{'s' if workers > 1 else ''})")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    run_benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 400,
+        int(sys.argv[3]) if len(sys.argv) > 3 else None
+    )
@@ -0,0 +1,104 @@
+"""
+Benchmark DataNormalizerAgent text extraction on OCR-sized inputs
+
+Usage: python scripts/benchmark_normalizer.py [iterations]
+"""
+import os
+import re
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ai_engine"))
+
+import text_scanner
+from text_scanner import TextScanner
+from data_normalizer_agent import DataNormalizerAgent
+
+
+WORDS = (
+    "the of invoice details item qty rate total amount reference note account "
+    "branch ifsc bank customer description hsn unit price discount subtotal"
+).split()
+
+
+def generate_ocr_text(size: int, seed: int = 42) -> str:
+    """Invoice-like text: noisy line items with the real fields at the bottom"""
+    rng = random.Random(seed)
+    lines = ["TAX INVOICE", "Sold by: Bharat Steel Industries Pvt Ltd"]
+    while sum(len(line) for line in lines) < size:
+        words = " ".join(rng.choice(WORDS) for _ in range(8))
+        lines.append(f"{words} {rng.randint(1, 99999)}")
+    lines += [
+        "Amount: Rs. 45,000",
+        "Date: 16-11-2025",
+        "UTR: UTR123ABC456",
+        "Payment Mode: NEFT",
+        "GST @ 18%: Rs. 8,100",
+    ]
+    return "\n".join(lines)
+
+
+# Amount pattern used before TextScanner (currency prefix tried at every offset)
+LEGACY_AMOUNT = re.compile(r'(?:Rs\.?|₹|INR)?\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)')
+
+
+def unanchored_scan(text: str, modes) -> dict:
+    """Reference: the previous per-field extraction, every pattern over the whole text"""
+    vendor = None
+    for pattern in (text_scanner.VENDOR_LABEL, text_scanner.VENDOR_MS, text_scanner.VENDOR_COMPANY):
+        vendor = pattern.search(text)
+        if vendor:
+            break
+    date = None
+    for pattern in text_scanner.DATE_PATTERNS:
+        date = pattern.search(text)
+        if date:
+            break
+    text_lower = text.lower()
+    text_upper = text.upper()
+    return {
+        "vendor": vendor.group(1).strip() if vendor else "Unknown Vendor",
+        "amount": max((float(m.replace(',', '')) for m in LEGACY_AMOUNT.findall(text)), default=0.0),
+        "utr": text_scanner.UTR.search(text),
+        "date": date,
+        "mode": next((m for m in modes if m in text_upper), "BANK_TRANSFER"),
+        "gstin": text_scanner.GSTIN.search(text),
+        "gst_rate": text_scanner.GST_RATE.search(text),
+        "gst_amount": text_scanner.GST_AMOUNT.search(text),
+        "credit": any(w in text_lower for w in text_scanner.CREDIT_WORDS),
+    }
+
+
+def time_calls(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations
+
+
+def run_benchmark(iterations: int = 1000):
+    agent = DataNormalizerAgent()
+    scanner = TextScanner(agent.supported_modes)
+
+    print("=" * 60)
+    print("DATA NORMALIZER TEXT EXTRACTION BENCHMARK")
+    print("=" * 60)
+
+    for size in (500, 4_000, 32_000):
+        text = generate_ocr_text(size)
+        runs = max(10, iterations * 500 // size)
+
+        reference = time_calls(lambda: unanchored_scan(text, agent.supported_modes), runs)
+        scanned = time_calls(lambda: scanner.scan(text), runs)
+        normalized = time_calls(lambda: agent.normalize(text, source_type="ocr"), runs)
+
+        print(f"\n{len(text):>6,} chars ({runs:,} runs)")
+        print(f"  per-field pattern searches:  {reference * 1e6:8.1f} us")
+        print(f"  TextScanner.scan:            {scanned * 1e6:8.1f} us ({reference / scanned:.1f}x)")
+        print(f"  normalize(source_type=ocr):  {normalized * 1e6:8.1f} us")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
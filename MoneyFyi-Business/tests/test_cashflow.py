@@ -2,8 +2,10 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from cashflow_oracle import CashflowOracle
+from cashflow_oracle import CashflowOracle, to_day_index, fetched_window
+from cashflow_state import CashflowState
 import json
+import random
 
 
 def test_positive_cashflow():
@@ -187,6 +189,250 @@ def test_insights_generation():
         print(f"      {insight}")
 
 
+def test_forecast_horizon():
+    """Test 7: Longer horizons extend the same forecast"""
+    print("\n" + "="*60)
+    print("TEST 7: Forecast Horizon")
+    print("="*60)
+    
+    oracle = CashflowOracle()
+    
+    transactions = [
+        {"date": "2025-10-01", "amount": 50000, "type": "credit"},
+        {"date": "2025-10-15", "amount": 52000, "type": "credit"},
+        {"date": "2025-10-05", "amount": -15000, "type": "debit"},
+        {"date": "2025-10-20", "amount": -16000, "type": "debit"}
+    ]
+    
+    result = oracle.predict(transactions, current_balance=75000, horizon_days=90)
+    
+    assert len(result['90_day_forecast']) == 90, " Failed: 90-day forecast length"
+    assert result['90_day_forecast'][:30] == result['30_day_forecast'], " Failed: 30-day forecast is not a prefix"
+    assert result['30_day_forecast'][:7] == result['7_day_forecast'], " Failed: 7-day forecast is not a prefix"
+    
+    print(" PASSED: Horizon forecasts are consistent")
+    print(f"   Day 90: ₹{result['90_day_forecast'][-1]['predicted_balance']:,.0f}")
+
+
+def test_predict_many():
+    """Test 8: Bulk forecasts match per-user predictions"""
+    print("\n" + "="*60)
+    print("TEST 8: Bulk Forecasting")
+    print("="*60)
+    
+    oracle = CashflowOracle()
+    
+    histories = {
+        "healthy": [
+            {"date": "2025-10-01", "amount": 60000, "type": "credit"},
+            {"date": "2025-10-05", "amount": -15000, "type": "debit"},
+            {"date": "2025-10-08", "amount": 55000, "type": "credit"}
+        ],
+        "stressed": [
+            {"date": "2025-10-01", "amount": 20000, "type": "credit"},
+            {"date": "2025-10-05", "amount": -25000, "type": "debit"},
+            {"date": "2025-10-10", "amount": -22000, "type": "debit"}
+        ]
+    }
+    balances = [100000, 15000]
+    
+    flat = [t for txns in histories.values() for t in txns]
+    offsets = [0, 3, 6]
+    amounts = [t['amount'] for t in flat]
+    days = to_day_index([t['date'] for t in flat])
+    
+    bulk = oracle.predict_many(list(histories), offsets, amounts, days, balances)
+    
+    for i, (user, txns) in enumerate(histories.items()):
+        single = oracle.predict(txns, current_balance=balances[i])
+        assert bulk['cashflow_stress'][i] == single['cashflow_stress'], f" Failed: stress differs for {user}"
+        assert bulk['net_weekly_change'][i] == single['net_weekly_change'], f" Failed: net change differs for {user}"
+        assert list(bulk['forecast'][i]) == [f['predicted_balance'] for f in single['30_day_forecast']], \
+            f" Failed: forecast differs for {user}"
+    
+    print(" PASSED: Bulk forecasts match single-user forecasts")
+    print(f"   Stress levels: {dict(zip(bulk['user_ids'], bulk['cashflow_stress']))}")
+
+
+def test_incremental_state():
+    """Test 9: Incremental state matches a full recompute"""
+    print("\n" + "="*60)
+    print("TEST 9: Incremental Cashflow State")
+    print("="*60)
+    
+    oracle = CashflowOracle()
+    
+    transactions = [
+        {"id": f"txn-{i}", "date": f"2025-10-{i % 28 + 1:02d}", "amount": amount, "type": kind}
+        for i, (amount, kind) in enumerate(
+            [(50000 + i * 1000, "credit") if i % 3 == 0 else (-(12000 + i * 500), "debit") for i in range(60)]
+        )
+    ]
+    
+    state = CashflowState()
+    for txn in transactions:
+        state.insert_transaction(txn)
+    state.delete("txn-59")
+    state.delete("txn-58")
+    state = CashflowState.from_dict(json.loads(json.dumps(state.to_dict())))
+    
+    full = oracle.predict(transactions[:58], current_balance=90000)
+    incremental = oracle.predict_from_state(state, current_balance=90000)
+    
+    assert not state.stale, " Failed: State should still be complete"
+    assert incremental['avg_weekly_income'] == full['avg_weekly_income'], " Failed: Income differs"
+    assert incremental['avg_weekly_expense'] == full['avg_weekly_expense'], " Failed: Expense differs"
+    assert incremental['cashflow_stress'] == full['cashflow_stress'], " Failed: Stress differs"
+    assert not state.insert_transaction(transactions[0]), " Failed: Duplicate insert was applied"
+    
+    print(" PASSED: Incremental state matches full recompute")
+    print(f"   Net Weekly Change: ₹{incremental['net_weekly_change']:,.0f}")
+
+
+def test_calendar_aggregation():
+    """Test 10: Weekly averages follow the calendar, not the row count"""
+    print("\n" + "="*60)
+    print("TEST 10: Calendar-Aware Weekly Averages")
+    print("="*60)
+    
+    # One ₹7,000 payment a day for 27 days, then 28 small payments on a
+    # single busy day
+    steady = [
+        {"date": f"2025-10-{day:02d}", "amount": -7000, "type": "debit"} for day in range(1, 28)
+    ]
+    busy = [{"date": "2025-10-28", "amount": -250, "type": "debit"} for _ in range(28)]
+    history = steady + busy
+    
+    calendar = CashflowOracle().predict(history, current_balance=500000)
+    rows = CashflowOracle(aggregation="rows").predict(history, current_balance=500000)
+    
+    assert CashflowOracle().aggregation == "calendar", " Failed: Calendar is no longer the default"
+    
+    expected = (27 * 7000 + 28 * 250) / 4
+    assert calendar['avg_weekly_expense'] == expected, f" Failed: Calendar expense is {calendar['avg_weekly_expense']}"
+    assert rows['avg_weekly_expense'] == 28 * 250 / 4, " Failed: Rows mode changed"
+    
+    print(" PASSED: Busy days no longer distort weekly averages")
+    print(f"   Calendar: ₹{calendar['avg_weekly_expense']:,.0f}  Rows (legacy): ₹{rows['avg_weekly_expense']:,.0f}")
+
+
+def test_result_cache():
+    """Test 11: Repeated forecasts are cached until invalidated"""
+    print("\n" + "="*60)
+    print("TEST 11: Forecast Result Cache")
+    print("="*60)
+    
+    oracle = CashflowOracle()
+    
+    transactions = [
+        {"date": "2025-10-01", "amount": 50000, "type": "credit"},
+        {"date": "2025-10-05", "amount": -15000, "type": "debit"}
+    ]
+    
+    first = oracle.predict(transactions, current_balance=75000, user_id="user-1")
+    second = oracle.predict(transactions, current_balance=75000, user_id="user-1")
+    assert second is first, " Failed: Identical request was not cached"
+    
+    changed = oracle.predict(transactions[:1], current_balance=75000, user_id="user-1")
+    assert changed is not first, " Failed: Changed history hit the cache"
+    
+    # hash(-1) == hash(-2) in CPython; the key must not collide on them
+    small = oracle.predict([{"date": "2025-10-05", "amount": -1, "type": "debit"}], current_balance=75000, user_id="user-2")
+    smaller = oracle.predict([{"date": "2025-10-05", "amount": -2, "type": "debit"}], current_balance=75000, user_id="user-2")
+    assert smaller is not small, " Failed: Different histories shared a cache entry"
+    
+    oracle.invalidate("user-1")
+    third = oracle.predict(transactions, current_balance=75000, user_id="user-1")
+    assert third is not first, " Failed: Invalidation did not drop the entry"
+    
+    stats = oracle.cache_stats()
+    assert stats['hits'] == 1 and stats['misses'] == 5, f" Failed: Unexpected stats {stats}"
+    
+    print(" PASSED: Cache hits, misses and invalidation behave correctly")
+    print(f"   Cache stats: {stats}")
+
+
+def test_predict_many_exact():
+    """Test 12: Bulk forecasts equal per-user predict exactly, to the cent"""
+    print("\n" + "="*60)
+    print("TEST 12: Bulk Forecast Rounding")
+    print("="*60)
+    
+    rng = random.Random(7)
+    histories = []
+    for _ in range(150):
+        txns = []
+        for _ in range(rng.randint(0, 40)):
+            credit = rng.random() < 0.4
+            amount = round(rng.uniform(100, 90000), 2)
+            txns.append({
+                "date": f"2025-{rng.randint(8, 10):02d}-{rng.randint(1, 28):02d}",
+                "amount": amount if credit else -amount,
+                "type": "credit" if credit else "debit"
+            })
+        histories.append(txns)
+    balances = [round(rng.uniform(-5000, 300000), 2) for _ in histories]
+    
+    flat = [t for txns in histories for t in txns]
+    offsets = [0]
+    for txns in histories:
+        offsets.append(offsets[-1] + len(txns))
+    amounts = [t['amount'] for t in flat]
+    days = to_day_index([t['date'] for t in flat])
+    is_credit = [t['type'] == 'credit' or t['amount'] > 0 for t in flat]
+    is_debit = [t['type'] == 'debit' or t['amount'] < 0 for t in flat]
+    users = [f"user-{i}" for i in range(len(histories))]
+    
+    for aggregation in ("rows", "calendar"):
+        oracle = CashflowOracle(aggregation=aggregation)
+        bulk = oracle.predict_many(users, offsets, amounts, days, balances, is_credit=is_credit, is_debit=is_debit)
+        for i, txns in enumerate(histories):
+            single = oracle.predict(txns, current_balance=balances[i])
+            forecast = [f['predicted_balance'] for f in single['30_day_forecast']]
+            for field in ("avg_weekly_income", "avg_weekly_expense", "net_weekly_change"):
+                assert float(bulk[field][i]) == single[field], f" Failed: {field} differs for {users[i]} ({aggregation})"
+            assert bulk['forecast'][i].tolist() == forecast, f" Failed: forecast differs for {users[i]} ({aggregation})"
+            assert float(bulk['min_balance_7d'][i]) == min(forecast[:7]), f" Failed: 7d minimum ({aggregation})"
+            assert bulk['cashflow_stress'][i] == single['cashflow_stress'], f" Failed: stress ({aggregation})"
+    
+    print(" PASSED: predict_many matches predict to the cent")
+
+
+def test_fetched_window():
+    """Test 13: Cutting the averaging window from one row-limited fetch"""
+    print("\n" + "="*60)
+    print("TEST 13: Fetched History Window")
+    print("="*60)
+    
+    assert fetched_window([], truncated=False) == (0, None), " Failed: Empty history"
+    
+    # Whole history inside the window: it starts at the oldest row
+    dates = ["2025-10-28", "2025-10-20", "2025-10-20", "2025-10-15"]
+    assert fetched_window(dates, truncated=False) == (4, "2025-10-15"), " Failed: Short history"
+    
+    # Rows past the window start are dropped and the window is full length
+    dates = ["2025-10-28T10:00:00", "2025-10-01", "2025-09-30", "2025-09-01"]
+    for truncated in (False, True):
+        assert fetched_window(dates, truncated) == (2, "2025-10-01"), " Failed: Window not cut at 28 days"
+    
+    # Limit hit inside the window: the oldest, possibly partial, day is dropped
+    dates = ["2025-10-28", "2025-10-27", "2025-10-20", "2025-10-20"]
+    assert fetched_window(dates, truncated=True) == (2, "2025-10-21"), " Failed: Partial day kept"
+    
+    # ...unless it is the only day fetched
+    dates = ["2025-10-28"] * 3
+    assert fetched_window(dates, truncated=True) == (3, "2025-10-28"), " Failed: Single day dropped"
+    
+    # A cut window still gives full-window weekly averages
+    history = [{"date": f"2025-10-{day:02d}", "amount": -7000, "type": "debit"} for day in range(28, 0, -1)]
+    count, history_start = fetched_window([t["date"] for t in history[:15]], truncated=True)
+    cut = CashflowOracle().predict(history[:count], current_balance=500000, history_start=history_start)
+    full = CashflowOracle().predict(history, current_balance=500000)
+    assert cut['avg_weekly_expense'] == full['avg_weekly_expense'], " Failed: Cut window changed the average"
+    
+    print(" PASSED: One bounded fetch covers the averaging window")
+
+
 def run_all_tests():
     """Run all Cashflow Oracle tests"""
     print("\n" + "="*60)
@@ -199,7 +445,14 @@ def run_all_tests():
         test_forecast_generation,
         test_critical_low_balance,
         test_risk_identification,
-        test_insights_generation
+        test_insights_generation,
+        test_forecast_horizon,
+        test_predict_many,
+        test_incremental_state,
+        test_calendar_aggregation,
+        test_result_cache,
+        test_predict_many_exact,
+        test_fetched_window
     ]
     
     passed = 0
@@ -0,0 +1,214 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from compliance_mate_agent import ComplianceMateAgent
+from purchase_index import PurchaseIndex, financial_year
+from gstin_validator import GSTINValidator, VERDICTS
+import json
+
+
+def test_category_rules():
+    """Test 1: Category rules resolve TDS section, GST rate and ITC"""
+    print("\n" + "="*60)
+    print("TEST 1: Category Rule Lookup")
+    print("="*60)
+
+    agent = ComplianceMateAgent()
+
+    assert agent._determine_tds_section("Construction work", {}) == "194C", " Failed: 194C"
+    assert agent._determine_tds_section("Professional services", {}) == "194J", " Failed: 194J"
+    assert agent._determine_tds_section("goods", {"annual_purchase_value": 100}) is None, " Failed: 194Q below limit"
+    assert agent._get_expected_gst_rate("Medicines") == 12, " Failed: GST rate"
+    assert agent._get_expected_gst_rate(None) == 18, " Failed: Default GST rate"
+    assert agent._is_fake_gstin("00AAAAA0000A1Z5"), " Failed: Fake GSTIN not detected"
+    assert not agent._is_fake_gstin("27AABCU9603R1ZN"), " Failed: Real GSTIN flagged"
+
+    print(" PASSED: Category rules resolved correctly")
+
+
+def test_batch_matches_single():
+    """Test 2: Batch checks match single checks, including missing categories"""
+    print("\n" + "="*60)
+    print("TEST 2: Batch Compliance Checks")
+    print("="*60)
+
+    agent = ComplianceMateAgent()
+
+    transactions = [
+        {"id": "T1", "vendor": "ABC", "amount": 50000, "date": "2025-09-01T10:00:00",
+         "type": "debit", "category": "construction",
+         "gst": {"rate": 18, "amount": 9000, "gstin": "27AABCU9603R1ZN"}},
+        {"id": "T2", "vendor": "XYZ", "amount": 12000, "date": "2025-09-02T10:00:00",
+         "type": "debit", "category": None, "gst": {"rate": 5, "gstin": "99ABCDE9999F1Z8"}},
+        {"id": "T3", "vendor": "Cafe", "amount": 2500, "date": "2025-09-03T10:00:00",
+         "type": "debit", "category": "food", "gst": {"rate": 5}}
+    ]
+    vendor_history = {"ABC": {"is_msme": True}}
+
+    batch = agent.check_compliance_batch(transactions, vendor_history)
+
+    assert len(batch) == len(transactions), " Failed: Batch size mismatch"
+    for txn, result in zip(transactions, batch):
+        single = agent.check_compliance(txn, vendor_history)
+        single.pop('timestamp')
+        result = dict(result)
+        result.pop('timestamp')
+        assert single == result, f" Failed: Batch result differs for {txn['id']}"
+
+    assert "FAKE_GSTIN" in batch[1]['compliance_flags'], " Failed: Fake GSTIN missed"
+
+    print(" PASSED: Batch results match single checks")
+    print(f"   Severities: {[r['severity'] for r in batch]}")
+
+
+def test_aggregate_thresholds():
+    """Test 3: Financial-year aggregates trigger 194C and 194Q"""
+    print("\n" + "="*60)
+    print("TEST 3: Aggregate TDS Thresholds")
+    print("="*60)
+
+    agent = ComplianceMateAgent()
+
+    # Four ₹28k contract payments: each below ₹30k, together above ₹1L
+    history = [
+        {"id": f"C{i}", "vendor": "BuildCo", "amount": 28000, "type": "debit",
+         "date": f"2025-0{i + 5}-10T10:00:00", "category": "construction"}
+        for i in range(4)
+    ]
+    # March belongs to the previous financial year
+    history.append({"id": "C_OLD", "vendor": "BuildCo", "amount": 25000, "type": "debit",
+                    "date": "2025-03-31T10:00:00", "category": "construction"})
+
+    index = PurchaseIndex.from_transactions(history)
+    assert financial_year("2025-03-31") == 2024, " Failed: FY boundary"
+    assert index.total("BuildCo", 2025) == 112000, " Failed: FY total"
+    assert index.total_with(history[0]) == 112000, " Failed: Indexed transaction counted twice"
+
+    results = agent.check_compliance_batch(history, {}, all_transactions=history)
+    assert "TDS_REQUIRED_194C" in results[3]['compliance_flags'], " Failed: 194C aggregate missed"
+    assert "TDS_REQUIRED_194C" not in results[4]['compliance_flags'], " Failed: Previous FY flagged"
+
+    # Incremental updates match the bulk build
+    live = PurchaseIndex()
+    for txn in history:
+        live.add(txn)
+    assert not live.add(history[0]), " Failed: Duplicate added"
+    assert live.total("BuildCo", 2025) == index.total("BuildCo", 2025), " Failed: Incremental total"
+    live.remove("C3")
+    assert live.total("BuildCo", 2025) == 84000, " Failed: Remove"
+
+    # 194Q: TDS only on the part above ₹50L
+    goods = [
+        {"id": "G1", "vendor": "SteelCo", "amount": 4800000, "type": "debit",
+         "date": "2025-05-01T10:00:00", "category": "goods purchase"},
+        {"id": "G2", "vendor": "SteelCo", "amount": 500000, "type": "debit",
+         "date": "2025-06-01T10:00:00", "category": "goods purchase"}
+    ]
+    result = agent.check_compliance(goods[1], {}, all_transactions=goods[:1])
+    assert "TDS_REQUIRED_194Q" in result['compliance_flags'], " Failed: 194Q aggregate missed"
+    assert any("₹300" in d for d in result['details']), " Failed: 194Q not on excess"
+
+    print(" PASSED: Aggregate thresholds applied per vendor and financial year")
+
+
+def test_gstin_validation():
+    """Test 4: GSTIN check digit and state code, single and bulk"""
+    print("\n" + "="*60)
+    print("TEST 4: GSTIN Validation")
+    print("="*60)
+
+    validator = GSTINValidator()
+    gstins = [
+        "27AAPFU0939F1ZV",   # valid
+        "27AAPFU0939F1ZW",   # wrong check digit
+        "45AAPFU0939F1ZV",   # unassigned state code
+        "27AAPFU0939F1Z",    # too short
+        "27aapfu0939f1zv",   # lowercase
+    ]
+    expected = ["VALID", "INVALID_CHECKSUM", "INVALID_STATE_CODE", "INVALID_FORMAT", "INVALID_FORMAT"]
+
+    assert [validator.validate(g) for g in gstins] == expected, " Failed: Single verdicts"
+    assert [VERDICTS[c] for c in validator.validate_many(gstins)] == expected, " Failed: Bulk verdicts"
+    assert validator.stats()["cache"]["size"] == len(gstins), " Failed: Verdicts not cached"
+
+    agent = ComplianceMateAgent()
+    txn = {"id": "T1", "vendor": "V", "amount": 1180, "type": "credit", "category": "supplies",
+           "gst": {"rate": 18, "gstin": "27AAPFU0939F1ZW"}}
+    result = agent.check_compliance(txn, {})
+    assert "INVALID_GSTIN" in result['compliance_flags'], " Failed: Checksum error not flagged"
+
+    print(" PASSED: GSTIN verdicts match in single and bulk mode")
+
+
+def test_seeded_totals():
+    """Test 5: Totals seeded from storage and id-less transactions count once"""
+    print("\n" + "="*60)
+    print("TEST 5: Seeded Purchase Totals")
+    print("="*60)
+
+    agent = ComplianceMateAgent()
+
+    # A ₹29k payment on top of a stored ₹80k total crosses 194C's ₹1L
+    txn = {"id": "N1", "vendor": "BuildCo", "amount": 29000, "type": "debit",
+           "date": "2025-08-10T10:00:00", "category": "construction"}
+    index = PurchaseIndex.from_totals({("BuildCo", 2025): 109000}, included=[txn])
+    assert index.total_with(txn) == 109000, " Failed: Included transaction counted twice"
+    assert not index.add(txn), " Failed: Included transaction added again"
+    result = agent.check_compliance(txn, {}, purchase_index=index)
+    assert "TDS_REQUIRED_194C" in result['compliance_flags'], " Failed: Stored total ignored"
+
+    # Without ids: the transaction inside all_transactions is the same dict
+    payments = [
+        {"vendor": "BuildCo", "amount": 28000, "type": "debit",
+         "date": f"2025-0{i + 5}-10T10:00:00", "category": "construction"}
+        for i in range(4)
+    ]
+    index = PurchaseIndex.from_transactions(payments[:3])
+    assert index.total_with(payments[2]) == 84000, " Failed: Id-less transaction counted twice"
+    assert index.total_with(dict(payments[2])) == 112000, " Failed: Equal copy not counted"
+    result = agent.check_compliance(payments[2], {}, all_transactions=payments[:3])
+    assert "TDS_REQUIRED_194C" not in result['compliance_flags'], " Failed: 194C on a double count"
+
+    print(" PASSED: Seeded totals and id-less transactions counted once")
+
+
+def run_all_tests():
+    """Run all ComplianceMate tests"""
+    print("\n" + "="*60)
+    print("COMPLIANCE MATE AGENT - TEST SUITE")
+    print("="*60)
+
+    tests = [
+        test_category_rules,
+        test_batch_matches_single,
+        test_aggregate_thresholds,
+        test_gstin_validation,
+        test_seeded_totals
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"\nTEST FAILED: {str(e)}")
+            failed += 1
+        except Exception as e:
+            print(f"\nTEST ERROR: {str(e)}")
+            failed += 1
+
+    print("\n" + "="*60)
+    print("TEST SUMMARY")
+    print("="*60)
+    print(f" Passed: {passed}")
+    print(f" Failed: {failed}")
+    print(f"Success Rate: {(passed/(passed+failed)*100):.1f}%")
+    print("="*60)
+
+
+if __name__ == "__main__":
+    run_all_tests()
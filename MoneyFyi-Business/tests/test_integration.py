@@ -0,0 +1,349 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import asyncio
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from integration import MoneyFyiAI, _init_batch_worker, _analyze_shard, _batch_utr_repeats, _worker_state
+from utr_index import UTRIndex
+from pipeline_dag import PipelineDAG
+from cashflow_oracle import CashflowOracle
+from instrumentation import Instrumentation, HistogramSink, LoggingSink, cache_prometheus_text
+
+
+HISTORY = [
+    {"id": "H1", "date": "2025-10-01", "amount": 60000, "type": "credit", "vendor": "Client A"},
+    {"id": "H2", "date": "2025-10-05", "amount": 12000, "type": "debit", "vendor": "Regular Supplier A"},
+    {"id": "H3", "date": "2025-10-09", "amount": 28000, "type": "debit", "vendor": "BuildCo",
+     "category": "construction"},
+    {"id": "H4", "date": "2025-10-12", "amount": 8000, "type": "debit", "vendor": "Regular Supplier B"},
+    {"id": "H5", "date": "2025-10-15", "amount": 55000, "type": "credit", "vendor": "Client A"},
+]
+
+VENDORS = {
+    "Regular Supplier A": {"avg_amount": 12000, "frequency": 15, "trust_score": 90},
+    "BuildCo": {"avg_amount": 28000, "frequency": 6, "trust_score": 80},
+}
+
+
+def make_batch(count):
+    vendors = ["Regular Supplier A", "BuildCo", "New Vendor Ltd"]
+    return [
+        {"id": f"TXN_{i:03d}", "vendor": vendors[i % 3], "amount": str(5000 + 1000 * i),
+         "date": f"2025-10-{16 + i % 10:02d}", "utr": f"UTR{900000 + i}", "type": "debit"}
+        for i in range(count)
+    ]
+
+
+def strip_timestamps(value):
+    """Drop wall-clock fields so two runs can be compared"""
+    if isinstance(value, dict):
+        return {k: strip_timestamps(v) for k, v in value.items() if "timestamp" not in k}
+    if isinstance(value, list):
+        return [strip_timestamps(v) for v in value]
+    return value
+
+
+def test_shared_context_matches_per_transaction():
+    """Test 1: Reusing build_context gives the same results as per-transaction analysis"""
+    print("\n" + "="*60)
+    print("TEST 1: Shared Batch Context")
+    print("="*60)
+
+    batch = make_batch(6)
+
+    shared = MoneyFyiAI(max_workers=1)
+    context = shared.build_context(HISTORY, 75000)
+    assert set(context) == {"cashflow_analysis", "velocity_index", "purchase_index"}, " Failed: Context keys"
+    with_context = [shared.analyze_full(txn, HISTORY, VENDORS, 75000, context=context) for txn in batch]
+
+    fresh = MoneyFyiAI(max_workers=1)
+    without_context = [fresh.analyze_full(txn, HISTORY, VENDORS, 75000) for txn in batch]
+
+    assert strip_timestamps(with_context) == strip_timestamps(without_context), \
+        " Failed: Shared context changed the results"
+
+    batched = MoneyFyiAI(max_workers=1).analyze_batch(batch, HISTORY, VENDORS, 75000)
+    assert strip_timestamps(batched["results"]) == strip_timestamps(without_context), \
+        " Failed: analyze_batch differs from analyze_full"
+
+    print(" PASSED: Shared context results match per-transaction analysis")
+
+
+def build_dag(log, lock, fail=None):
+    """a -> (b, c) -> d, recording start/finish order; `fail` names a stage that raises"""
+    def stage(name, value):
+        def run(*deps):
+            with lock:
+                log.append(("start", name))
+            time.sleep(0.02)
+            if name == fail:
+                raise RuntimeError(f"{name} failed")
+            with lock:
+                log.append(("end", name))
+            return value + sum(deps)
+        return run
+
+    dag = PipelineDAG()
+    dag.add("a", stage("a", 1))
+    dag.add("b", stage("b", 10), depends_on=("a",))
+    dag.add("c", stage("c", 100), depends_on=("a",))
+    dag.add("d", stage("d", 1000), depends_on=("b", "c"))
+    return dag
+
+
+def test_pipeline_dag():
+    """Test 2: PipelineDAG honours dependencies and propagates stage errors"""
+    print("\n" + "="*60)
+    print("TEST 2: Pipeline DAG Execution")
+    print("="*60)
+
+    expected = {"a": 1, "b": 11, "c": 101, "d": 1112}
+
+    def check_order(log):
+        position = {event: i for i, event in enumerate(log)}
+        for stage, deps in (("b", "a"), ("c", "a"), ("d", "b"), ("d", "c")):
+            assert position[("end", deps)] < position[("start", stage)], \
+                f" Failed: {stage} started before {deps} finished"
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        for executor in (None, pool):
+            log, lock = [], threading.Lock()
+            results, durations = build_dag(log, lock).run(executor)
+            assert results == expected, " Failed: run results"
+            assert set(durations) == set(expected), " Failed: run durations"
+            check_order(log)
+
+            log = []
+            results, _ = asyncio.run(build_dag(log, lock).run_async(executor))
+            assert results == expected, " Failed: run_async results"
+            check_order(log)
+
+        # With a pool, b and c overlap
+        log = []
+        build_dag(log, lock).run(pool)
+        assert log.index(("start", "c")) < log.index(("end", "b")) or \
+            log.index(("start", "b")) < log.index(("end", "c")), " Failed: b and c did not overlap"
+
+        # Seeded stages are skipped and feed their dependents
+        log = []
+        results, durations = build_dag(log, lock).run(pool, seed={"a": 5})
+        assert results["d"] == 1000 + 15 + 105 and "a" not in durations, " Failed: Seed ignored"
+        assert ("start", "a") not in log, " Failed: Seeded stage ran"
+
+        for executor in (None, pool):
+            for runner in ("run", "run_async"):
+                log = []
+                dag = build_dag(log, lock, fail="c")
+                try:
+                    if runner == "run":
+                        dag.run(executor)
+                    else:
+                        asyncio.run(dag.run_async(executor))
+                except RuntimeError as e:
+                    assert str(e) == "c failed", " Failed: Wrong error"
+                else:
+                    assert False, f" Failed: {runner} swallowed a stage error"
+                assert ("start", "d") not in log, " Failed: Dependent of failed stage ran"
+
+    try:
+        PipelineDAG().add("x", lambda y: y, depends_on=("missing",))
+    except ValueError:
+        pass
+    else:
+        assert False, " Failed: Unknown dependency accepted"
+
+    print(" PASSED: Stages ran after their dependencies; errors propagated")
+
+
+def test_parallel_batch():
+    """Test 3: Process-pool analyze_batch keeps order and folds worker histories back"""
+    print("\n" + "="*60)
+    print("TEST 3: Parallel Batch Analysis")
+    print("="*60)
+
+    batch = make_batch(20)
+    # 3 workers -> shards of 2 rows: repeats far apart and across a boundary
+    batch[15]["utr"] = batch[2]["utr"]
+    batch[4]["utr"] = batch[3]["utr"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        serial_engine = MoneyFyiAI(utr_index=UTRIndex(db_path=os.path.join(tmp, "serial.db")), max_workers=1)
+        serial = serial_engine.analyze_batch(batch, HISTORY, VENDORS, 75000)
+
+        engine = MoneyFyiAI(utr_index=UTRIndex(db_path=os.path.join(tmp, "parallel.db")), max_workers=1)
+        parallel = engine.analyze_batch(batch, HISTORY, VENDORS, 75000, workers=3)
+
+        ids = [r["normalized_transaction"]["id"] for r in parallel["results"]]
+        assert ids == [txn["id"] for txn in batch], " Failed: Input order not preserved"
+
+        duplicates = [i for i, r in enumerate(parallel["results"])
+                      if "DUPLICATE_UTR" in r["fraud_analysis"].get("flags", [])]
+        assert duplicates == [4, 15], f" Failed: Repeats not flagged like a serial run: {duplicates}"
+
+        for i, (p, s) in enumerate(zip(parallel["results"], serial["results"])):
+            assert strip_timestamps(p) == strip_timestamps(s), f" Failed: Row {i} differs from the serial run"
+
+        # Worker timing cannot move the flag: run one-row shards last-first in-process
+        normalized = [engine.normalizer.normalize(txn) for txn in batch]
+        rows = list(zip(normalized, _batch_utr_repeats(normalized)))
+        _init_batch_worker(os.path.join(tmp, "reversed.db"), 1000, HISTORY, VENDORS, 75000, None)
+        try:
+            backwards = [_analyze_shard([row])[0][0] for row in reversed(rows)][::-1]
+        finally:
+            _worker_state.clear()
+        assert strip_timestamps(backwards) == strip_timestamps(serial["results"]), \
+            " Failed: Shard order changed the results"
+
+        # First occurrences are still checked against the store
+        again = engine.analyze_batch(batch, HISTORY, VENDORS, 75000, workers=3)
+        serial_again = serial_engine.analyze_batch(batch, HISTORY, VENDORS, 75000)
+        assert strip_timestamps(again["results"]) == strip_timestamps(serial_again["results"]), \
+            " Failed: Repeat batch differs from the serial run"
+        assert all("DUPLICATE_UTR" in r["fraud_analysis"]["flags"] for r in again["results"]), \
+            " Failed: UTRs from the previous batch not flagged"
+
+        assert len(engine.fraudguard.transaction_history) == 2 * len(batch), " Failed: FraudGuard history not folded"
+        assert len(engine.smartpayment.decision_history) == 2 * len(batch), " Failed: SmartPayment history not folded"
+        levels = [r["fraud_analysis"]["risk_level"] for r in parallel["results"] + again["results"]]
+        for level in ("low", "medium", "high"):
+            assert engine.fraudguard.transaction_history.count(level) == levels.count(level), \
+                f" Failed: {level} count not folded"
+        assert "normalize" in parallel["timings_ms"], " Failed: Worker timings not merged"
+
+    try:
+        MoneyFyiAI(max_workers=1).analyze_batch(batch, HISTORY, VENDORS, 75000, workers=2)
+    except ValueError as e:
+        assert "persistent UTR index" in str(e), " Failed: Unexpected error message"
+    else:
+        assert False, " Failed: workers > 1 accepted without a SQLite UTR store"
+
+    print(" PASSED: Parallel batch matches serial order and histories")
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_instrumentation():
+    """Test 4: Instrumentation sinks and the /metrics payload"""
+    print("\n" + "="*60)
+    print("TEST 4: Pipeline Instrumentation")
+    print("="*60)
+
+    # Disabled instrumentation is a no-op
+    disabled = Instrumentation()
+    assert not disabled.enabled, " Failed: No sinks should mean disabled"
+    with disabled.timer("normalize"):
+        pass
+
+    sink = HistogramSink(buckets_ms=(1, 10, 100))
+    for ms in (0.5, 5, 5, 50, 500):
+        sink.observe("fraudguard", ms)
+    sink.increment("transactions_analyzed", 3)
+    sink.increment("transactions_analyzed")
+
+    snapshot = sink.snapshot()
+    assert snapshot["stages"]["fraudguard"] == {"count": 5, "total_ms": 560.5, "mean_ms": 112.1}, \
+        " Failed: Snapshot"
+    assert snapshot["counters"] == {"transactions_analyzed": 4}, " Failed: Counters"
+    assert sink.percentile("fraudguard", 0.5) == 10, " Failed: Median bucket"
+    assert sink.percentile("fraudguard", 1.0) == float("inf"), " Failed: Overflow bucket"
+    assert sink.percentile("unknown", 0.5) is None, " Failed: Unseen stage"
+
+    text = sink.prometheus_text()
+    assert "# TYPE moneyfyi_ai_stage_duration_ms histogram" in text, " Failed: Histogram type"
+    assert 'moneyfyi_ai_stage_duration_ms_bucket{stage="fraudguard",le="10"} 3' in text, " Failed: Cumulative bucket"
+    assert 'moneyfyi_ai_stage_duration_ms_bucket{stage="fraudguard",le="+Inf"} 5' in text, " Failed: +Inf bucket"
+    assert 'moneyfyi_ai_stage_duration_ms_count{stage="fraudguard"} 5' in text, " Failed: Count"
+    assert "moneyfyi_ai_transactions_analyzed_total 4" in text, " Failed: Counter"
+    sink.reset()
+    assert sink.prometheus_text() == "", " Failed: Reset"
+
+    # Logging sink only formats when its level is enabled
+    logger = logging.getLogger("moneyfyi.tests.metrics")
+    handler = ListHandler()
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logging_sink = LoggingSink(logger)
+    logging_sink.observe("normalize", 1.5)
+    assert handler.messages == [], " Failed: DEBUG line logged at INFO"
+    logger.setLevel(logging.DEBUG)
+    logging_sink.observe("normalize", 1.5)
+    logging_sink.increment("batches_analyzed")
+    logger.removeHandler(handler)
+    assert handler.messages == ["stage=normalize duration_ms=1.500", "counter=batches_analyzed inc=1"], \
+        " Failed: Logging sink output"
+
+    # The engine reports per-stage timings and volumes to every sink
+    histogram = HistogramSink()
+    oracle = CashflowOracle()
+    engine = MoneyFyiAI(max_workers=1, instrumentation=Instrumentation([histogram]), cashflow_oracle=oracle)
+    engine.analyze_batch(make_batch(4), HISTORY, VENDORS, 75000)
+    stages = histogram.snapshot()["stages"]
+    for stage in ("normalize", "fraudguard", "compliance", "smartpayment", "insight", "cashflow", "batch"):
+        assert stage in stages, f" Failed: {stage} not observed"
+    assert stages["normalize"]["count"] == 4, " Failed: Per-transaction stage count"
+    assert histogram.counters == {"transactions_analyzed": 4, "batches_analyzed": 1}, " Failed: Engine counters"
+
+    # /metrics body: stage histograms followed by the forecast cache
+    oracle.predict(HISTORY, 75000, user_id="user-1")
+    oracle.predict(HISTORY, 75000, user_id="user-1")
+    payload = histogram.prometheus_text() + cache_prometheus_text("cashflow_cache", oracle.cache_stats())
+    assert payload.endswith("moneyfyi_ai_cashflow_cache_size 1\n"), " Failed: Cache gauge"
+    assert "# TYPE moneyfyi_ai_cashflow_cache_hits_total counter\nmoneyfyi_ai_cashflow_cache_hits_total 1\n" \
+        in payload, " Failed: Cache counters"
+    for line in payload.splitlines():
+        assert line.startswith("# ") or len(line.split(" ")) == 2, f" Failed: Malformed line {line!r}"
+
+    print(" PASSED: Sinks and metrics payload are consistent")
+
+
+def run_all_tests():
+    """Run all MoneyFyiAI pipeline tests"""
+    print("\n" + "="*60)
+    print("MONEYFYI AI PIPELINE - TEST SUITE")
+    print("="*60)
+
+    tests = [
+        test_shared_context_matches_per_transaction,
+        test_pipeline_dag,
+        test_parallel_batch,
+        test_instrumentation
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"\nTEST FAILED: {str(e)}")
+            failed += 1
+        except Exception as e:
+            print(f"\nTEST ERROR: {str(e)}")
+            failed += 1
+
+    print("\n" + "="*60)
+    print("TEST SUMMARY")
+    print("="*60)
+    print(f" Passed: {passed}")
+    print(f" Failed: {failed}")
+    print(f"Success Rate: {(passed/(passed+failed)*100):.1f}%")
+    print("="*60)
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,326 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import io
+import re
+import itertools
+from datetime import datetime
+
+from data_normalizer_agent import DataNormalizerAgent
+from text_scanner import TextScanner
+from date_parser import DateParser, DATE_FORMATS, _fast_parse
+
+
+OCR_SAMPLE = """TAX INVOICE
+Sold by: Bharat Steel Industries Pvt Ltd
+Invoice No: INV-2025-0042    Date: 16-11-2025
+Item: MS sheets 2mm  Qty 40  Rate 1,125.00
+Amount: Rs. 45,000
+UTR: UTR123ABC456
+Payment Mode: NEFT
+GST @ 18%: Rs. 8,100
+GSTIN: 27AABCU9603R1ZN"""
+
+PDF_SAMPLE = """Payment Advice
+M/s. Sharma Office Supplies
+Reference 2025/11/03 against bill 7781
+Paid INR 12,450.50 via IMPS on 2025-11-03
+Towards stationery and printer material
+GST: 1,899.23"""
+
+EMAIL_SAMPLE = """From: alerts@bank.example
+Subject: Credit alert
+Dear Customer, Rs 2,30,000 has been received in your account XX4521 on
+03 Nov 2025 from Payee: Orion Consulting LLP towards professional services.
+Ref no HDFC00012345678. Ünicode İstanbul branch."""
+
+SAMPLES = {"ocr": OCR_SAMPLE, "pdf": PDF_SAMPLE, "email": EMAIL_SAMPLE}
+
+
+class LegacyTextExtractor:
+    """The per-field `_extract_*_from_text` methods TextScanner replaced, verbatim"""
+
+    def __init__(self, supported_modes):
+        self.supported_modes = supported_modes
+        self.utr_pattern = re.compile(r'UTR[A-Za-z0-9]{6,}|[A-Z0-9]{12,}')
+        self.gstin_pattern = re.compile(r'\d{2}[A-Z]{5}\d{4}[A-Z]{1}[A-Z\d]{1}[Z]{1}[A-Z\d]{1}')
+        self.amount_pattern = re.compile(r'(?:Rs\.?|₹|INR)?\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)')
+
+    def extract(self, text):
+        return {
+            "vendor": self._extract_vendor_from_text(text),
+            "amount": self._extract_amount_from_text(text),
+            "utr": self._extract_utr_from_text(text),
+            "date": self._extract_date_from_text(text),
+            "mode": self._extract_mode_from_text(text),
+            "type": self._extract_type_from_text(text),
+            "gst": self._extract_gst_from_text(text),
+            "category": self._extract_category_from_text(text)
+        }
+
+    def _extract_vendor_from_text(self, text):
+        patterns = [
+            r"(?:to|payee|vendor|merchant)[:|\s]+([A-Za-z\s&.]+)",
+            r"M/s\.?\s+([A-Za-z\s&.]+)",
+            r"([A-Z][a-z]+(?:\s+[A-Z][a-z]+){1,3})\s+(?:Pvt|Ltd|LLP)",
+        ]
+        for pattern in patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                return match.group(1).strip()
+        return "Unknown Vendor"
+
+    def _extract_amount_from_text(self, text):
+        matches = self.amount_pattern.findall(text)
+        if matches:
+            try:
+                amounts = [float(m.replace(',', '')) for m in matches]
+                return max(amounts)
+            except:
+                pass
+        return 0.0
+
+    def _extract_utr_from_text(self, text):
+        match = self.utr_pattern.search(text)
+        return match.group(0) if match else None
+
+    def _extract_date_from_text(self, text):
+        # Raw match only: parsing moved to DateParser
+        date_patterns = [
+            r'\d{2}[-/]\d{2}[-/]\d{4}',
+            r'\d{4}[-/]\d{2}[-/]\d{2}',
+            r'\d{2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{4}',
+        ]
+        for pattern in date_patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                return match.group(0)
+        return None
+
+    def _extract_mode_from_text(self, text):
+        text_upper = text.upper()
+        for mode in self.supported_modes:
+            if mode in text_upper:
+                return mode
+        return "BANK_TRANSFER"
+
+    def _extract_type_from_text(self, text):
+        text_lower = text.lower()
+        if any(word in text_lower for word in ["received", "credit", "deposited", "cr"]):
+            return "credit"
+        if any(word in text_lower for word in ["paid", "debit", "withdrawn", "dr", "payment"]):
+            return "debit"
+        return "debit"
+
+    def _extract_gst_from_text(self, text):
+        gst_info = {}
+        gstin_match = self.gstin_pattern.search(text)
+        if gstin_match:
+            gst_info["gstin"] = gstin_match.group(0)
+        gst_rate_match = re.search(r'GST\s*[@:]\s*(\d+)%', text, re.IGNORECASE)
+        if gst_rate_match:
+            gst_info["rate"] = int(gst_rate_match.group(1))
+        gst_amount_match = re.search(r'GST[:\s]*(?:Rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)', text, re.IGNORECASE)
+        if gst_amount_match:
+            gst_info["amount"] = float(gst_amount_match.group(1).replace(',', ''))
+        return gst_info if gst_info else None
+
+    def _extract_category_from_text(self, text):
+        text_lower = text.lower()
+        categories = {
+            "supplies": ["supplies", "material", "goods", "inventory"],
+            "salary": ["salary", "wages", "payroll", "compensation"],
+            "rent": ["rent", "lease"],
+            "utilities": ["electricity", "water", "internet", "telecom"],
+            "services": ["service", "consulting", "professional"],
+            "equipment": ["equipment", "machinery", "tools"],
+        }
+        for category, keywords in categories.items():
+            if any(kw in text_lower for kw in keywords):
+                return category
+        return None
+
+
+def test_text_scanner_matches_legacy():
+    """Test 1: TextScanner matches the old per-field extractors on OCR, PDF and email text"""
+    print("\n" + "="*60)
+    print("TEST 1: TextScanner Parity")
+    print("="*60)
+
+    agent = DataNormalizerAgent()
+    scanner = TextScanner(agent.supported_modes)
+    legacy = LegacyTextExtractor(agent.supported_modes)
+
+    variants = {}
+    for name, text in SAMPLES.items():
+        variants[name] = text
+        variants[name + " (single line)"] = text.replace("\n", " ")
+        variants[name + " (upper)"] = text.upper()
+        variants[name + " (no anchors)"] = re.sub(r"(?i)to|payee|vendor|merchant|m/s|gst", "", text)
+
+    for name, text in variants.items():
+        assert scanner.scan(text) == legacy.extract(text), f" Failed: {name} differs from legacy extraction"
+
+    normalized = agent.normalize(OCR_SAMPLE, source_type="ocr")
+    assert normalized["vendor"] == "Bharat Steel Industries Pvt" and normalized["amount"] == 45000.0, \
+        " Failed: OCR vendor/amount"
+    assert normalized["date"] == "2025-11-16T00:00:00", " Failed: OCR date"
+    assert normalized["gst"] == {"gstin": "27AABCU9603R1ZN", "rate": 18}, " Failed: OCR GST"
+
+    print(" PASSED: TextScanner output identical to per-field extraction")
+    for name in SAMPLES:
+        print(f"   {name}: {scanner.scan(SAMPLES[name])['vendor']}")
+
+
+STATEMENT_CSV = """Account Statement
+Account No: XXXX4521,Branch: Pune
+Period: 01/02/2025 to 28/02/2025
+Date,Narration,Chq/Ref No,Withdrawal Amt,Deposit Amt,Closing Balance
+01/02/2025,UPI-ACME,UTR1234567,0.00,"5,000.00",15000.00
+02/02/2025,NEFT-BHARAT STEEL,UTR7654321,"1,200.50",0.00,13799.50
+03/02/2025,ATM CASH,,2000.00,,11799.50
+04/02/2025,SHORT ROW
+"""
+
+
+def test_statement_stream():
+    """Test 2: Statement CSVs: preamble, header mapping, zero-filled split columns, short rows"""
+    print("\n" + "="*60)
+    print("TEST 2: Streaming Statement Normalization")
+    print("="*60)
+
+    agent = DataNormalizerAgent()
+
+    # Binary and text input give the same rows; the binary file stays open
+    binary = io.BytesIO(STATEMENT_CSV.encode("utf-8-sig"))
+    rows = list(agent.normalize_stream(binary))
+    assert not binary.closed, " Failed: Caller's binary file was closed"
+    text_rows = list(agent.normalize_stream(io.StringIO(STATEMENT_CSV)))
+    strip_ids = lambda records: [{k: v for k, v in r.items() if k != "id"} for r in records]
+    assert strip_ids(rows) == strip_ids(text_rows), " Failed: Binary and text input differ"
+
+    # Preamble rows are skipped, not emitted as transactions
+    assert len(rows) == 4, f" Failed: Expected 4 rows, got {len(rows)}"
+
+    # The non-zero side of Withdrawal / Deposit gives both amount and direction
+    assert (rows[0]["amount"], rows[0]["type"]) == (5000.0, "credit"), " Failed: Zero-filled withdrawal"
+    assert (rows[1]["amount"], rows[1]["type"]) == (1200.5, "debit"), " Failed: Zero-filled deposit"
+    assert (rows[2]["amount"], rows[2]["type"]) == (2000.0, "debit"), " Failed: Empty deposit"
+    assert rows[0]["utr"] == "UTR1234567" and rows[0]["date"] == "2025-02-01T00:00:00", " Failed: Mapped columns"
+    assert rows[1]["category"] == "NEFT-BHARAT STEEL", " Failed: Narration"
+
+    # Short rows still normalize instead of being dropped
+    assert rows[3]["date"] == "2025-02-04T00:00:00" and rows[3]["amount"] == 0.0, " Failed: Short row"
+
+    # Single amount column with an explicit direction column
+    typed = "Txn Date,Description,Amount,Type\n05-03-2025,Office rent,25000,DR\n06-03-2025,Client payment,40000,CR\n"
+    typed_rows = list(agent.normalize_stream(io.StringIO(typed)))
+    assert [(r["amount"], r["type"]) for r in typed_rows] == [(25000.0, "debit"), (40000.0, "credit")], \
+        " Failed: Amount with Type column"
+
+    # No recognisable header: every row is a headerless CSV line
+    headerless = list(agent.normalize_stream(io.StringIO("Acme,1500\nBeta,2500\n")))
+    assert len(headerless) == 2 and all(r["id"].startswith("TXN_") for r in headerless), " Failed: Headerless CSV"
+
+    print(" PASSED: Statement rows normalized with correct amounts and directions")
+
+
+def strptime_reference(value):
+    """Try every format in order with strptime, as before DateParser"""
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def test_date_parser():
+    """Test 3: DateParser fast path, learned formats, cache and None contract"""
+    print("\n" + "="*60)
+    print("TEST 3: Date Parser")
+    print("="*60)
+
+    # Fast path agrees with strptime, including impossible dates
+    samples = ["2025-11-16", "16-11-2025", "31-02-2025", "29-02-2024", "29-02-2025", "2025-13-01",
+               "2025-00-10", "0000-01-01", "2025-1-05", "2025/11/16", "16/11/2025", "16-11-25",
+               "16 November 2025", "16 Nov 2025", "2025-11-16T10:30:00", "2025-11-16 10:30:00",
+               "２０２５-11-16", "20x5-11-16", "", "yesterday"]
+    samples += [f"{d:02d}-{m:02d}-{y}" for d, m, y in itertools.product((0, 1, 28, 30, 31, 32), (0, 2, 4, 12, 13), (2024, 2025))]
+    parser = DateParser()
+    for value in samples:
+        if _fast_parse(value) is not None:
+            assert _fast_parse(value) == strptime_reference(value), f" Failed: Fast path differs for {value!r}"
+        expected = strptime_reference(value) if value else None
+        assert parser.parse(value) == expected, f" Failed: parse differs for {value!r}"
+    assert _fast_parse("31-02-2025") is None and parser.parse("31-02-2025") is None, " Failed: 31-02-2025 accepted"
+
+    # A source learns the format that worked and tries it first next time
+    parser = DateParser()
+    assert parser.parse("03/11/2025", source="stmt-1") == "2025-11-03T00:00:00", " Failed: DD/MM/YYYY"
+    assert parser.learned_formats.get("stmt-1") == "%d/%m/%Y", " Failed: Format not learned"
+    assert parser.parse("04/11/2025", source="stmt-1") == "2025-11-04T00:00:00", " Failed: Learned format"
+    # A row in another format still parses and retrains the source
+    assert parser.parse("05 Nov 2025", source="stmt-1") == "2025-11-05T00:00:00", " Failed: Fallback after learned"
+    assert parser.learned_formats.get("stmt-1") == "%d %b %Y", " Failed: Format not relearned"
+    assert parser.learned_formats.get("stmt-2") is None, " Failed: Sources share formats"
+
+    # Unparseable strings are cached too, and still come back as None
+    parser = DateParser()
+    assert parser.parse("not a date") is None, " Failed: Unparseable"
+    misses = parser.stats()["cache"]["misses"]
+    assert parser.parse("not a date") is None, " Failed: Cached unparseable"
+    assert parser.stats()["cache"]["misses"] == misses, " Failed: Unparseable marker not cached"
+
+    # _parse_date returns None; callers that need a value use _date_or_now
+    agent = DataNormalizerAgent()
+    assert agent._parse_date("not a date") is None, " Failed: _parse_date fallback"
+    assert agent._parse_date(None) is None, " Failed: _parse_date empty"
+    assert agent._parse_date("16-11-2025") == "2025-11-16T00:00:00", " Failed: _parse_date"
+    before = datetime.now().isoformat()
+    fallback = agent._date_or_now("not a date")
+    assert before <= fallback <= datetime.now().isoformat(), " Failed: _date_or_now fallback"
+    record = agent.normalize({"vendor": "Acme", "amount": 100, "date": "31-02-2025"})
+    assert record["date"] >= before, " Failed: normalize must still fill an unparseable date"
+
+    print(" PASSED: Dates parse like strptime; learned formats and cache behave")
+
+
+def run_all_tests():
+    """Run all DataNormalizer tests"""
+    print("\n" + "="*60)
+    print("DATA NORMALIZER AGENT - TEST SUITE")
+    print("="*60)
+
+    tests = [
+        test_text_scanner_matches_legacy,
+        test_statement_stream,
+        test_date_parser
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"\nTEST FAILED: {str(e)}")
+            failed += 1
+        except Exception as e:
+            print(f"\nTEST ERROR: {str(e)}")
+            failed += 1
+
+    print("\n" + "="*60)
+    print("TEST SUMMARY")
+    print("="*60)
+    print(f" Passed: {passed}")
+    print(f" Failed: {failed}")
+    print(f"Success Rate: {(passed/(passed+failed)*100):.1f}%")
+    print("="*60)
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -338,6 +338,34 @@ def test_batch_summary():
     print(f"   Average Safety Score: {summary['average_safety_score']}")
 
 
+def test_bounded_decision_history():
+    """Test 8: Decision history is capped but the summary covers every decision"""
+    print("\n" + "="*60)
+    print("TEST 8: Bounded Decision History")
+    print("="*60)
+    
+    agent = SmartPaymentAgent(history_size=5)
+    
+    for i in range(20):
+        agent.recommend(
+            {"id": f"HIST_{i}", "vendor": "V1", "amount": 10000},
+            {"fraud_score": 10, "risk_level": "low", "flags": [], "reasoning": []},
+            {"current_balance": 100000, "cashflow_stress": "low", "net_weekly_change": 0, "7_day_forecast": []},
+            {"V1": {"trust_score": 90, "frequency": 10}}
+        )
+    
+    summary = agent.get_summary()
+    
+    assert len(agent.decision_history) == 5, f"Failed: History holds {len(agent.decision_history)} records"
+    assert agent.decision_history.recent()[-1]['transaction_id'] == "HIST_19", "Failed: Newest decision evicted"
+    assert summary['total_decisions'] == 20, f"Failed: Summary counted {summary['total_decisions']} decisions"
+    assert summary['pay_full_count'] == 20, "Failed: Recommendation counts lost on eviction"
+    
+    print(" PASSED: History bounded, aggregates complete")
+    print(f"   Records kept: {len(agent.decision_history)}")
+    print(f"   Total Decisions: {summary['total_decisions']}")
+
+
 def run_all_tests():
     """Run all SmartPayment tests"""
     print("\n" + "="*60)
@@ -351,7 +379,8 @@ def run_all_tests():
         test_cashflow_stress_blocking,
         test_duplicate_utr_override,
         test_alternative_actions_generation,
-        test_batch_summary
+        test_batch_summary,
+        test_bounded_decision_history
     ]
     
     passed = 0
@@ -1,9 +1,12 @@
 import sys
 import os
+import random
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from fraudguard_agent import FraudGuardAgent
+from utr_index import UTRIndex
 import json
+import tempfile
 
 
 def test_new_vendor_detection():
@@ -200,6 +203,10 @@ def test_batch_analysis():
     
     summary = agent.get_summary_stats(results)
     
+    running = agent.get_summary_stats()
+    assert running['total_analyzed'] == summary['total_analyzed'], "Failed: Running aggregates out of sync"
+    assert running['average_fraud_score'] == summary['average_fraud_score'], "Failed: Running mean out of sync"
+    
     print("PASSED: Batch analysis completed")
     print(f"   Total Analyzed: {summary['total_analyzed']}")
     print(f"   High Risk: {summary['high_risk_count']}")
@@ -208,6 +215,146 @@ def test_batch_analysis():
     print(f"   Average Score: {summary['average_fraud_score']}")
 
 
+def test_duplicate_utr_persistent_index():
+    """Test 7: Duplicate UTRs survive a restart and are scoped per tenant"""
+    print("\n" + "="*60)
+    print("TEST 7: Persistent, Tenant-Scoped UTR Index")
+    print("="*60)
+    
+    vendor_history = {"Vendor A": {"avg_amount": 10000, "frequency": 5}}
+    transaction = {
+        "id": "TEST_007",
+        "vendor": "Vendor A",
+        "amount": 10000,
+        "utr": "UTR_PERSIST_001",
+        "date": "2025-11-14T12:00:00Z"
+    }
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "utr_index.sqlite3")
+        
+        first_worker = FraudGuardAgent(utr_index=UTRIndex(db_path=db_path))
+        result1 = first_worker.analyze_transaction(transaction, vendor_history, tenant_id="user-a")
+        assert "DUPLICATE_UTR" not in result1['flags'], "Failed: False positive on first UTR"
+        first_worker.utr_index.close()
+        
+        # A fresh agent (new process / other worker) shares the same file
+        second_worker = FraudGuardAgent(utr_index=UTRIndex(db_path=db_path))
+        result2 = second_worker.analyze_transaction(transaction, vendor_history, tenant_id="user-a")
+        assert "DUPLICATE_UTR" in result2['flags'], "Failed: Duplicate lost across restart"
+        
+        result3 = second_worker.analyze_transaction(transaction, vendor_history, tenant_id="user-b")
+        assert "DUPLICATE_UTR" not in result3['flags'], "Failed: UTR leaked across tenants"
+        second_worker.utr_index.close()
+    
+    print("PASSED: UTR index is persistent and tenant-scoped")
+    print(f"   Restarted worker flags: {result2['flags']}")
+
+
+def test_velocity_window():
+    """Test 8: Bursts to one vendor are counted within the 1-hour window"""
+    print("\n" + "="*60)
+    print("TEST 8: Velocity Window")
+    print("="*60)
+    
+    agent = FraudGuardAgent()
+    
+    transactions = [
+        {"id": f"VEL_{i}", "vendor": "Burst Vendor", "amount": 1000 + i, "utr": f"UTR_VEL_{i}",
+         "date": f"2025-11-14T10:{i * 5:02d}:00Z"}
+        for i in range(7)
+    ]
+    transactions.append(
+        {"id": "VEL_LATE", "vendor": "Burst Vendor", "amount": 1000, "utr": "UTR_VEL_LATE",
+         "date": "2025-11-14T12:00:00Z"}
+    )
+    
+    vendor_history = {"Burst Vendor": {"avg_amount": 1000, "frequency": 20}}
+    
+    results = agent.analyze_batch(transactions, vendor_history)
+    
+    assert "HIGH_VELOCITY" in results[6]['flags'], "Failed: 7th payment in an hour not flagged"
+    assert "ELEVATED_VELOCITY" in results[4]['flags'], "Failed: 5th payment in an hour not flagged"
+    assert not any("VELOCITY" in f for f in results[7]['flags']), "Failed: Payment outside window flagged"
+    
+    print("PASSED: Velocity window counted correctly")
+    print(f"   Flags on 7th payment: {results[6]['flags']}")
+
+
+def test_columnar_matches_row_path():
+    """Test 9: Columnar batch scoring agrees with analyze_batch"""
+    print("\n" + "="*60)
+    print("TEST 9: Columnar Batch Scoring")
+    print("="*60)
+    
+    transactions = [
+        {"id": "COL_001", "vendor": "Vendor A", "amount": 10000, "utr": "UTR_C1", "date": "2025-11-14T10:00:00Z"},
+        {"id": "COL_002", "vendor": "Vendor A", "amount": 45000, "utr": "UTR_C2", "date": "2025-11-14T10:05:00Z"},
+        {"id": "COL_003", "vendor": "New Corp", "amount": 150000, "utr": "UTR_C3", "date": "2025-11-15T23:30:00Z"},
+        {"id": "COL_004", "vendor": "Vendor B", "amount": 25000, "utr": "UTR_C1", "date": "2025-11-14T14:00:00Z"},
+        {"id": "COL_005", "vendor": "Vendor B", "amount": 60000, "utr": "", "date": "2025-11-16T03:00:00Z"},
+    ]
+    vendor_history = {
+        "Vendor A": {"avg_amount": 12000, "frequency": 10},
+        "Vendor B": {"avg_amount": 10000, "frequency": 4}
+    }
+    
+    row_results = FraudGuardAgent().analyze_batch(transactions, vendor_history)
+    
+    columns = FraudGuardAgent.to_columns(transactions)
+    columnar = FraudGuardAgent().analyze_batch_columnar(vendor_history=vendor_history, **columns)
+    flagged = {r['index']: r for r in columnar['flagged']}
+    
+    for i, expected in enumerate(row_results):
+        assert columnar['fraud_score'][i] == expected['fraud_score'], f"Failed: Score mismatch on row {i}"
+        assert columnar['risk_level'][i] == expected['risk_level'], f"Failed: Risk mismatch on row {i}"
+        actual_flags = flagged[i]['flags'] if i in flagged else []
+        assert actual_flags == expected['flags'], f"Failed: Flags {actual_flags} != {expected['flags']}"
+    
+    print("PASSED: Columnar scoring matches the row-by-row path")
+    print(f"   Flagged rows: {len(columnar['flagged'])}/{len(transactions)}")
+
+
+def test_columnar_offset_dates():
+    """Test 10: Columnar weekend/late-night flags follow each row's own offset"""
+    print("\n" + "="*60)
+    print("TEST 10: Columnar Scoring With Offset-Aware Dates")
+    print("="*60)
+    
+    rng = random.Random(7)
+    offsets = ["+05:30", "-08:00", "+14:00", "-03:30", "Z", ""]
+    vendors = ["Vendor A", "Vendor B", "Vendor C"]
+    transactions = []
+    for i in range(600):
+        day = rng.randint(1, 28)
+        hour, minute = rng.randint(0, 23), rng.randint(0, 59)
+        transactions.append({
+            "id": f"OFF_{i:04d}",
+            "vendor": rng.choice(vendors),
+            "amount": rng.choice([12000, 25000, 50000, 150000]),
+            "utr": f"UTR_OFF_{rng.randint(0, 700)}",
+            # One batch mixes offsets, as statements from several banks do
+            "date": f"2025-11-{day:02d}T{hour:02d}:{minute:02d}:00{rng.choice(offsets)}"
+        })
+    vendor_history = {"Vendor A": {"avg_amount": 12000, "frequency": 10}, "Vendor B": {"avg_amount": 20000, "frequency": 3}}
+    
+    row_results = FraudGuardAgent().analyze_batch(transactions, vendor_history)
+    columnar = FraudGuardAgent().analyze_batch_columnar(
+        vendor_history=vendor_history, **FraudGuardAgent.to_columns(transactions)
+    )
+    flagged = {r['index']: r for r in columnar['flagged']}
+    
+    timing_flags = 0
+    for i, expected in enumerate(row_results):
+        actual_flags = flagged[i]['flags'] if i in flagged else []
+        assert actual_flags == expected['flags'], f"Failed: Row {i} ({transactions[i]['date']}) {actual_flags} != {expected['flags']}"
+        assert columnar['fraud_score'][i] == expected['fraud_score'], f"Failed: Score mismatch on row {i}"
+        timing_flags += bool({"WEEKEND_TRANSACTION", "LATE_NIGHT_TRANSACTION"} & set(expected['flags']))
+    
+    print("PASSED: Offset-aware dates score identically on both paths")
+    print(f"   Rows with timing flags: {timing_flags}/{len(transactions)}")
+
+
 def run_all_tests():
     """Run all FraudGuard tests"""
     print("\n" + "="*60)
@@ -220,7 +367,11 @@ def run_all_tests():
         test_duplicate_utr,
         test_high_risk_scenario,
         test_low_risk_normal_transaction,
-        test_batch_analysis
+        test_batch_analysis,
+        test_duplicate_utr_persistent_index,
+        test_velocity_window,
+        test_columnar_matches_row_path,
+        test_columnar_offset_dates
     ]
     
     passed = 0